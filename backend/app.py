@@ -1,18 +1,199 @@
 import os
+import atexit
+import base64
+import hashlib
+import hmac
 import json
+import logging
+import threading
+import time
 import uuid
-from datetime import date, datetime, timedelta
-from functools import wraps
-from typing import Any, Dict, List, Optional, TypedDict
-
-from flask import Flask, jsonify, request
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache, wraps
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypedDict,
+)
+
+import click
+from flask import (
+    Flask,
+    Request,
+    abort,
+    jsonify,
+    make_response,
+    request,
+    stream_with_context,
+)
+from flask.cli import AppGroup
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, inspect, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import selectinload
 import jwt
 from werkzeug.security import check_password_hash, generate_password_hash
 
+from catalog_io import (
+    CatalogRecordError,
+    chunked,
+    detect_format,
+    iter_raw_records,
+    normalize_record,
+    serialize_records,
+)
+import encoding
+import instrumentation
+from cache import Cache, cache_metric_lines, store_from_env, version_check_seconds
+from dbconfig import configure_engine, engine_options, pool_metric_lines
+from leaderboard import Leaderboard
+from jobs import Job, JobContext, Scheduler, job_status, run_job, settings_from_env
+from metrics import render_registry
+from ratelimit import RateLimited, client_address, limiter_from_env, retry_after_header
+from writebehind import AppendLog, WriteBehind
+
 
 db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+XP_PER_VIDEO = 10
+
+DEFAULT_DASHBOARD = {
+    "hero_name": "Nome do Herói",
+    "level": 7,
+    "flow_today": 78,
+    "practice_of_the_day": {"title": "Comunicação com o Coração", "duration_minutes": 8},
+    "bodies": [
+        {"id": "fisico", "label": "Físico", "value": 85},
+        {"id": "emocional", "label": "Emocional", "value": 72},
+        {"id": "energetico", "label": "Energético", "value": 80},
+        {"id": "mental_inferior", "label": "Mental Inferior", "value": 88},
+        {"id": "mente_superior", "label": "Mente Superior", "value": 65},
+        {"id": "intuitivo", "label": "Intuitivo", "value": 58},
+        {"id": "atmico", "label": "Átmico", "value": 75},
+    ],
+    "achievements": [
+        {"id": "escuta_ativa", "title": "Mestre da Escuta Ativa"},
+        {"id": "flow_7_dias", "title": "7 dias em Estado de Flow"},
+    ],
+}
+
+SEED_TRAILS = [
+    {
+        "id": "protagonismo-lideranca",
+        "icon": "🎭",
+        "title": "Trilha 1: Protagonismo e Liderança",
+        "modules": [
+            "Comunicação Eficaz",
+            "Delegação e Conflitos",
+            "Trabalho em Equipe",
+            "Liderança 2025",
+        ],
+        "duration_weeks_min": 4,
+        "duration_weeks_max": 8,
+        "format": "Microlearning diário (5-10 min)",
+        "videos": [
+            {
+                "title": "Introdução ao Protagonismo",
+                "provider": "youtube",
+                "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                "duration_minutes": 10,
+            },
+            {
+                "title": "Comunicação com o Coração",
+                "provider": "youtube",
+                "url": "https://www.youtube.com/watch?v=ysz5P8qQr6I",
+                "duration_minutes": 8,
+            },
+        ],
+    },
+    {
+        "id": "nr1-cultura-organizacional",
+        "icon": "🏢",
+        "title": "Trilha 2: NR1 e Cultura Organizacional",
+        "modules": [
+            "Conhecer o Negócio",
+            "Valores",
+            "Propósito",
+            "Working Capital",
+        ],
+        "duration_weeks_min": 4,
+        "duration_weeks_max": 4,
+        "format": "Cases empresariais e reflexões diárias",
+        "videos": [
+            {
+                "title": "Cultura Organizacional na Prática",
+                "provider": "youtube",
+                "url": "https://www.youtube.com/watch?v=jNQXAC9IVRw",
+                "duration_minutes": 12,
+            }
+        ],
+    },
+    {
+        "id": "cuidado-humanizado",
+        "icon": "❤️",
+        "title": "Trilha 3: Cuidado Humanizado",
+        "modules": [
+            "Equilíbrio dos Corpos",
+            "Ética do Cuidado",
+            "Empatia Tripla",
+            "Compaixão em Ação",
+        ],
+        "duration_weeks_min": 6,
+        "duration_weeks_max": 6,
+        "format": "Meditações guiadas e práticas contemplativas",
+        "videos": [
+            {
+                "title": "Meditação: Equilíbrio dos Corpos",
+                "provider": "youtube",
+                "url": "https://www.youtube.com/watch?v=2OEL4P1Rz04",
+                "duration_minutes": 15,
+            }
+        ],
+    },
+    {
+        "id": "jornada-heroi-rocky",
+        "icon": "⚡",
+        "title": "Trilha 4: Jornada do Herói (Rocky Balboa)",
+        "modules": ["Do Ambiente ao Legado"],
+        "duration_weeks_min": 12,
+        "duration_weeks_max": 12,
+        "format": "Storytelling imersivo e desafios progressivos",
+        "videos": [
+            {
+                "title": "Introdução à Jornada do Herói",
+                "provider": "youtube",
+                "url": "https://www.youtube.com/watch?v=gbRDCWKqvEc",
+                "duration_minutes": 14,
+            }
+        ],
+    },
+]
+MAX_BATCH_COMPLETIONS = 500
+MAX_HISTORY_RANGE_DAYS = 5 * 366
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_CHUNK_SIZE = 10000
+MAX_IMPORT_ERRORS = 1000
+MAX_LEADERBOARD_LIMIT = 100
+MAX_VIDEO_PAGE_SIZE = 200
+VIDEO_STREAM_CHUNK = 500
+LEADERBOARD_LOAD_CHUNK = 10000
+# Completion bitmaps ignore lessons beyond this position (8 KiB per trail).
+MAX_SNAPSHOT_POSITION = 65535
 
 
 class UserPublic(TypedDict):
@@ -32,6 +213,7 @@ class TrailPublic(TypedDict):
     duration_weeks_min: int
     duration_weeks_max: int
     format: str
+    video_count: int
     enrolled: bool
 
 
@@ -41,6 +223,7 @@ class VideoLessonPublic(TypedDict):
     provider: str
     url: str
     duration_minutes: int
+    position: int
     completed: bool
 
 
@@ -56,6 +239,26 @@ class ProgressResponse(TypedDict):
     per_trail: Dict[str, ProgressTrailStats]
 
 
+class BootstrapTrailStats(ProgressTrailStats):
+    # Base64 bitmap; bit (position % 8) of byte (position // 8) is set when
+    # the lesson at that position is completed.
+    completed_bitmap: str
+
+
+class BootstrapResponse(TypedDict):
+    user: UserPublic
+    enrolled_trails: List[str]
+    completed_videos: int
+    per_trail: Dict[str, BootstrapTrailStats]
+    trails: List[TrailPublic]
+
+
+class CatalogEntry(NamedTuple):
+    items: List[Dict[str, Any]]
+    body: bytes
+    etag: str
+
+
 class User(db.Model):
     __tablename__ = "users"
 
@@ -65,9 +268,11 @@ class User(db.Model):
     password_hash = db.Column(db.String, nullable=False)
     is_admin = db.Column(db.Boolean, nullable=False, default=False)
 
-    xp = db.Column(db.Integer, nullable=False, default=0)
+    xp = db.Column(db.Integer, nullable=False, default=0, index=True)
     streak = db.Column(db.Integer, nullable=False, default=0)
     last_activity_date = db.Column(db.Date, nullable=True)
+    # Bumping this revokes every token issued for the user.
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     enrollments = db.relationship(
         "Enrollment", backref="user", lazy=True, cascade="all, delete-orphan"
@@ -94,24 +299,32 @@ class Trail(db.Model):
     format = db.Column(db.String, nullable=False)
     duration_weeks_min = db.Column(db.Integer, nullable=False)
     duration_weeks_max = db.Column(db.Integer, nullable=False)
+    # Maintained in the same transaction as every VideoLesson write so
+    # progress totals and new positions need no aggregate over the lessons.
+    video_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    next_position = db.Column(db.Integer, nullable=False, default=1, server_default="1")
 
     modules = db.relationship(
-        "TrailModule", backref="trail", lazy=True, cascade="all, delete-orphan"
+        "TrailModule",
+        backref="trail",
+        lazy=True,
+        cascade="all, delete-orphan",
+        order_by="TrailModule.position",
     )
     videos = db.relationship(
         "VideoLesson", backref="trail", lazy=True, cascade="all, delete-orphan"
     )
 
     def to_dict(self):
-        ordered_modules = sorted(self.modules, key=lambda m: m.position)
         return {
             "id": self.id,
             "icon": self.icon,
             "title": self.title,
-            "modules": [m.name for m in ordered_modules],
+            "modules": [m.name for m in self.modules],
             "duration_weeks_min": self.duration_weeks_min,
             "duration_weeks_max": self.duration_weeks_max,
             "format": self.format,
+            "video_count": self.video_count,
         }
 
 
@@ -121,6 +334,10 @@ class TrailModule(db.Model):
     name = db.Column(db.String, nullable=False)
     position = db.Column(db.Integer, nullable=False, default=0)
 
+    __table_args__ = (
+        db.Index("uq_trail_module_position", "trail_id", "position", unique=True),
+    )
+
 
 class VideoLesson(db.Model):
     id = db.Column(db.String, primary_key=True)
@@ -132,6 +349,13 @@ class VideoLesson(db.Model):
     position = db.Column(db.Integer, nullable=False, default=0)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Serves the keyset listing order (see ordered_videos) from the index.
+        db.Index(
+            "ix_video_lesson_trail_order", "trail_id", "position", "created_at", "id"
+        ),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -139,6 +363,7 @@ class VideoLesson(db.Model):
             "provider": self.provider,
             "url": self.url,
             "duration_minutes": self.duration_minutes,
+            "position": self.position,
         }
 
 
@@ -169,13 +394,1231 @@ class VideoProgress(db.Model):
 class DailyCheckIn(db.Model):
     id = db.Column(db.String, primary_key=True)
     user_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=True, index=True)
-    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True
+    )
     data_json = db.Column(db.Text, nullable=False)
+    # True once the body scores have been added to BodyScoreRollup.
+    rolled_up = db.Column(
+        db.Boolean, nullable=False, default=False, server_default=db.false()
+    )
+
+    __table_args__ = (
+        db.Index("ix_daily_check_in_user_created", "user_id", "created_at"),
+    )
+
+
+class BodyScoreRollup(db.Model):
+    """Per-user body score sums for one day or one week (starting Monday)."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=False)
+    period = db.Column(db.String, nullable=False)
+    period_start = db.Column(db.Date, nullable=False)
+    body_id = db.Column(db.String, nullable=False)
+    label = db.Column(db.String, nullable=False, default="")
+    total = db.Column(db.Float, nullable=False, default=0)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "user_id", "period", "period_start", "body_id", name="uq_body_score_rollup"
+        ),
+    )
+
+
+class LatestCheckIn(db.Model):
+    """Copy of each user's most recent DailyCheckIn, read by /api/dashboard."""
+
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), primary_key=True)
+    checkin_id = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    data_json = db.Column(db.Text, nullable=False)
+
+
+class UserSnapshot(db.Model):
+    """Each user's public fields, enrollments and completions in one blob.
+
+    Written in the same transaction as every enrollment and completion (see
+    update_user_snapshot) and read by /api/bootstrap with one primary-key
+    lookup. A missing row is rebuilt from the tables on demand.
+    """
+
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), primary_key=True)
+    data_json = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class TTLCache:
+    """Small thread-safe LRU mapping whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+@lru_cache(maxsize=8)
+def _password_hash_prefix(method: str) -> str:
+    # Werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"), so derive
+    # the stored prefix from a real hash instead of parsing the method.
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+class PasswordHasher:
+    """Hashes passwords inline or in a bounded process pool.
+
+    With ``workers`` > 0 the CPU-bound work runs outside the request thread
+    and at most ``max_pending`` hashes may be queued or running; beyond that
+    PasswordHasherBusy is raised so the caller can shed load.
+    """
+
+    def __init__(
+        self, method: str, workers: int = 0, max_pending: int = 0, timeout: float = 10
+    ):
+        self.method = method
+        self.workers = max(0, workers)
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(
+            max_pending or max(1, self.workers) * 4
+        )
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        return pwhash.split("$", 1)[0] != _password_hash_prefix(self.method)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Created on first use so each forked server worker owns its pool.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        # A worker died (OOM kill, segfault): the pool refuses all further
+        # work, so the next call starts a fresh one.
+        with self._executor_lock:
+            if self._executor is pool:
+                self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        pool = self._pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard_pool(pool)
+            raise PasswordHasherBusy()
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job finishes, not until the caller
+        # gives up waiting, so timed-out hashes still count as pending.
+        future.add_done_callback(lambda _future: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise PasswordHasherBusy()
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise PasswordHasherBusy()
+
+
+class AuthPrincipal:
+    """Identity taken from a verified token; the User row loads on first use."""
+
+    def __init__(self, user_id: str, is_admin: bool, user: Optional[User] = None):
+        self.id = user_id
+        self.is_admin = is_admin
+        self._user = user
+
+    @property
+    def user(self) -> User:
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+            if self._user is None:
+                abort(make_response(jsonify(error="Não autorizado"), 401))
+        return self._user
+
+
+class AppRequest(Request):
+    principal: Optional[AuthPrincipal] = None
+
+    @property
+    def current_user(self) -> Optional[User]:
+        return self.principal.user if self.principal else None
+
+
+def _upgrade_schema():
+    """Add columns and indexes that db.create_all() skips on existing tables."""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = (
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                    f"{column.type.compile(dialect=conn.dialect)}"
+                )
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    if not isinstance(default, str):
+                        default = default.compile(dialect=conn.dialect)
+                    ddl += f" DEFAULT {default}"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def _dialect_insert(model):
+    """INSERT for the bound dialect, which exposes the on_conflict_* clauses."""
+    if db.engine.dialect.name == "postgresql":
+        return postgresql_insert(model.__table__)
+    return sqlite_insert(model.__table__)
+
+
+def _activity_values(today: date, xp_awarded: int) -> Dict[str, Any]:
+    # Evaluated by the database against the row's current values, so
+    # concurrent completions cannot lose an XP increment or a streak day.
+    return {
+        "xp": db.func.coalesce(User.xp, 0) + xp_awarded,
+        "streak": case(
+            (User.last_activity_date == today, db.func.coalesce(User.streak, 0)),
+            (
+                User.last_activity_date == today - timedelta(days=1),
+                db.func.coalesce(User.streak, 0) + 1,
+            ),
+            else_=1,
+        ),
+        "last_activity_date": today,
+    }
+
+
+def _set_position_bit(bitmap: str, position: int) -> str:
+    if position < 0 or position > MAX_SNAPSHOT_POSITION:
+        return bitmap
+    bits = bytearray(base64.b64decode(bitmap))
+    if len(bits) <= position // 8:
+        bits.extend(bytes(position // 8 + 1 - len(bits)))
+    bits[position // 8] |= 1 << (position % 8)
+    return base64.b64encode(bytes(bits)).decode("ascii")
+
+
+def _add_completions(
+    snapshot: Dict[str, Any], completed: Iterable[Tuple[str, int]]
+) -> None:
+    for trail_id, position in completed:
+        stats = snapshot["completed"].setdefault(trail_id, {"count": 0, "bitmap": ""})
+        stats["count"] += 1
+        stats["bitmap"] = _set_position_bit(stats["bitmap"], int(position or 0))
+
+
+def update_user_snapshot(
+    user_id: str, enrolled: Iterable[str] = (), completed: Iterable[str] = ()
+) -> Optional[Dict[str, Any]]:
+    """Fold new enrollments and completions into the user's UserSnapshot.
+
+    ``enrolled`` are trail ids and ``completed`` video ids written in the
+    current transaction; only newly recorded ones may be passed. Locks the
+    user row first, so concurrent updates for one user apply in turn. A
+    missing snapshot is rebuilt from the tables instead. Returns the stored
+    snapshot (None for an unknown user); the caller commits.
+    """
+    user = (
+        db.session.query(
+            User.id,
+            User.email,
+            User.name,
+            User.is_admin,
+            User.xp,
+            User.streak,
+            User.last_activity_date,
+        )
+        .filter(User.id == user_id)
+        .with_for_update()
+        .one_or_none()
+    )
+    if user is None:
+        return None
+
+    data_json = (
+        db.session.query(UserSnapshot.data_json).filter_by(user_id=user_id).scalar()
+    )
+    if data_json is None:
+        snapshot: Dict[str, Any] = {
+            "enrolled": sorted(
+                trail_id
+                for (trail_id,) in db.session.query(Enrollment.trail_id).filter_by(
+                    user_id=user_id
+                )
+            ),
+            "completed": {},
+        }
+        _add_completions(
+            snapshot,
+            db.session.query(VideoProgress.trail_id, VideoLesson.position)
+            .join(VideoLesson, VideoLesson.id == VideoProgress.video_id)
+            .filter(VideoProgress.user_id == user_id),
+        )
+    else:
+        snapshot = json.loads(data_json)
+        snapshot["enrolled"] = sorted(set(snapshot["enrolled"]) | set(enrolled))
+        completed = list(completed)
+        if completed:
+            _add_completions(
+                snapshot,
+                db.session.query(VideoLesson.trail_id, VideoLesson.position).filter(
+                    VideoLesson.id.in_(completed)
+                ),
+            )
+
+    snapshot["user"] = {
+        "id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "is_admin": user.is_admin,
+        "xp": user.xp,
+        "streak": user.streak,
+    }
+    snapshot["last_activity_date"] = (
+        user.last_activity_date.isoformat() if user.last_activity_date else None
+    )
+    values = {
+        "data_json": json.dumps(snapshot, separators=(",", ":")),
+        "updated_at": datetime.utcnow(),
+    }
+    stmt = _dialect_insert(UserSnapshot).values(user_id=user_id, **values)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=["user_id"], set_=values))
+    return snapshot
+
+
+def invalidate_user_snapshots(trail_ids: Iterable[str]) -> None:
+    """Drop snapshots whose bitmaps may cover lessons that moved in these trails.
+
+    They are rebuilt on the next read. The caller commits.
+    """
+    trail_ids = list(trail_ids)
+    if not trail_ids:
+        return
+    db.session.execute(
+        UserSnapshot.__table__.delete().where(
+            UserSnapshot.user_id.in_(
+                select(VideoProgress.user_id)
+                .where(VideoProgress.trail_id.in_(trail_ids))
+                .distinct()
+            )
+        )
+    )
+
+
+def record_video_completion(
+    user_id: str,
+    video_id: str,
+    trail_id: str,
+    today: date,
+    xp_awarded: int = XP_PER_VIDEO,
+) -> bool:
+    """Store a completion and award XP in the current transaction.
+
+    Returns False without touching the user when the video was already
+    completed. The caller commits.
+    """
+    inserted = db.session.execute(
+        _dialect_insert(VideoProgress)
+        .values(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            video_id=video_id,
+            trail_id=trail_id,
+            xp_awarded=xp_awarded,
+            completed_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "video_id"])
+    ).rowcount
+    if not inserted:
+        return False
+
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(**_activity_values(today, xp_awarded))
+        .execution_options(synchronize_session=False)
+    )
+    update_user_snapshot(user_id, completed=[video_id])
+    return True
+
+
+def _parse_client_timestamp(value: Any, now: datetime) -> datetime:
+    """Naive UTC datetime from a client ISO timestamp, never in the future."""
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return now
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(parsed, now)
+
+
+def _advance_streak(
+    last_activity: Optional[date], streak: int, days: List[date]
+) -> Tuple[Optional[date], int]:
+    for day in sorted(set(days)):
+        if last_activity is not None and day <= last_activity:
+            continue
+        if last_activity == day - timedelta(days=1):
+            streak += 1
+        else:
+            streak = 1
+        last_activity = day
+    return last_activity, streak
+
+
+def revoke_user_tokens(user_id: str) -> bool:
+    """Invalidate every token issued to ``user_id`` so far.
+
+    Bumps User.token_version in the current transaction; the caller commits
+    and then drops the cached auth state. Returns False for unknown users.
+    """
+    updated = (
+        db.session.query(User)
+        .filter_by(id=user_id)
+        .update({User.token_version: User.token_version + 1}, synchronize_session=False)
+    )
+    return bool(updated)
+
+
+def pending_completions(write_behind, user_id: str) -> Dict[str, Dict[str, Any]]:
+    """Buffered, not yet flushed completions of ``user_id`` by video id."""
+    if write_behind is None:
+        return {}
+    return {
+        key[1]: record
+        for key, record in write_behind.pending_for(user_id).items()
+        if key[0] == "completion"
+    }
+
+
+def public_user_with_pending(user, pending: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """user.to_public_dict() with buffered completions applied to XP and streak."""
+    data = user.to_public_dict()
+    if pending:
+        data["xp"] = int(data["xp"] or 0) + XP_PER_VIDEO * len(pending)
+        _, data["streak"] = _advance_streak(
+            user.last_activity_date,
+            int(user.streak or 0),
+            [
+                datetime.fromisoformat(r["completed_at"])
+                .replace(tzinfo=timezone.utc)
+                .astimezone()
+                .date()
+                for r in pending.values()
+            ],
+        )
+    return data
+
+
+def record_video_completions(
+    user_id: str, completed_at_by_video: Dict[str, datetime]
+) -> Tuple[Dict[str, str], List[str], List[str]]:
+    """Store many completions for one user in the current transaction.
+
+    Validates the ids and skips existing completions with one query each,
+    inserts the new rows in one statement and advances the streak using the
+    completion timestamps in order. Returns the recorded video ids mapped to
+    their trail, plus the already completed and unknown ids. The caller
+    commits.
+    """
+    video_ids = list(completed_at_by_video)
+    if not video_ids:
+        return {}, [], []
+
+    trail_by_video = dict(
+        db.session.query(VideoLesson.id, VideoLesson.trail_id).filter(
+            VideoLesson.id.in_(video_ids)
+        )
+    )
+    unknown = [v for v in video_ids if v not in trail_by_video]
+    done = {
+        video_id
+        for (video_id,) in db.session.query(VideoProgress.video_id).filter(
+            VideoProgress.user_id == user_id,
+            VideoProgress.video_id.in_(list(trail_by_video)),
+        )
+    }
+    already_completed = [v for v in trail_by_video if v in done]
+    pending = [v for v in trail_by_video if v not in done]
+    if not pending:
+        return {}, already_completed, unknown
+
+    # RETURNING names the rows actually inserted: a concurrent request may
+    # have recorded some of ``pending`` since the lookup above.
+    inserted = set(
+        db.session.scalars(
+            _dialect_insert(VideoProgress)
+            .values(
+                [
+                    {
+                        "id": uuid.uuid4().hex,
+                        "user_id": user_id,
+                        "video_id": video_id,
+                        "trail_id": trail_by_video[video_id],
+                        "xp_awarded": XP_PER_VIDEO,
+                        "completed_at": completed_at_by_video[video_id],
+                    }
+                    for video_id in pending
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["user_id", "video_id"])
+            .returning(VideoProgress.video_id)
+        )
+    )
+    recorded = [v for v in pending if v in inserted]
+    already_completed = already_completed + [v for v in pending if v not in inserted]
+    if not recorded:
+        return {}, already_completed, unknown
+
+    user = (
+        db.session.query(User.last_activity_date, User.streak)
+        .filter(User.id == user_id)
+        .with_for_update()
+        .one()
+    )
+    last_activity, streak = _advance_streak(
+        user.last_activity_date,
+        int(user.streak or 0),
+        [
+            completed_at_by_video[v].replace(tzinfo=timezone.utc).astimezone().date()
+            for v in recorded
+        ],
+    )
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            xp=db.func.coalesce(User.xp, 0) + len(recorded) * XP_PER_VIDEO,
+            streak=streak,
+            last_activity_date=last_activity,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    update_user_snapshot(user_id, completed=recorded)
+    return {v: trail_by_video[v] for v in recorded}, already_completed, unknown
+
+
+def _body_scores(payload: Any) -> List[Tuple[str, str, float]]:
+    """(body_id, label, value) for every numeric entry in a check-in's bodies."""
+    if not isinstance(payload, dict) or not isinstance(payload.get("bodies"), list):
+        return []
+    scores = []
+    for body in payload["bodies"]:
+        if not isinstance(body, dict):
+            continue
+        body_id, value = body.get("id"), body.get("value")
+        if not body_id or isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        scores.append((str(body_id), str(body.get("label") or body_id), float(value)))
+    return scores
+
+
+def accumulate_body_scores(
+    user_id: str, day: date, scores: List[Tuple[str, str, float]]
+) -> None:
+    """Add one check-in's scores to its day and week rollups. The caller commits."""
+    rows: Dict[Tuple[str, date, str], Dict[str, Any]] = {}
+    for period, start in (("day", day), ("week", day - timedelta(days=day.weekday()))):
+        for body_id, label, value in scores:
+            row = rows.setdefault(
+                (period, start, body_id),
+                {
+                    "user_id": user_id,
+                    "period": period,
+                    "period_start": start,
+                    "body_id": body_id,
+                    "label": label,
+                    "total": 0.0,
+                    "samples": 0,
+                },
+            )
+            row["total"] += value
+            row["samples"] += 1
+    if not rows:
+        return
+
+    stmt = _dialect_insert(BodyScoreRollup).values(list(rows.values()))
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["user_id", "period", "period_start", "body_id"],
+            set_={
+                "label": stmt.excluded.label,
+                "total": BodyScoreRollup.total + stmt.excluded.total,
+                "samples": BodyScoreRollup.samples + stmt.excluded.samples,
+            },
+        )
+    )
+
+
+def apply_buffered_writes(records: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Apply write-behind check-ins and completions in the current transaction.
+
+    Safe to replay: check-ins whose id is already stored are skipped (so
+    their scores are not rolled up twice) and completions go through
+    record_video_completions, which ignores existing ones. Returns the
+    (user_id, trail_id) of every newly recorded completion. The caller
+    commits.
+    """
+    checkins = [r for r in records if r.get("kind") == "checkin"]
+    completions: Dict[str, Dict[str, datetime]] = {}
+    for record in records:
+        if record.get("kind") == "completion":
+            by_video = completions.setdefault(record["user_id"], {})
+            completed_at = datetime.fromisoformat(record["completed_at"])
+            previous = by_video.get(record["video_id"])
+            if previous is None or completed_at < previous:
+                by_video[record["video_id"]] = completed_at
+
+    if checkins:
+        stored = set(
+            db.session.scalars(
+                select(DailyCheckIn.id).where(DailyCheckIn.id.in_([r["id"] for r in checkins]))
+            )
+        )
+        latest: Dict[str, Dict[str, Any]] = {}
+        for record in checkins:
+            if record["id"] in stored:
+                continue
+            stored.add(record["id"])
+            created_at = datetime.fromisoformat(record["created_at"])
+            db.session.add(
+                DailyCheckIn(
+                    id=record["id"],
+                    user_id=record["user_id"],
+                    created_at=created_at,
+                    data_json=record["data_json"],
+                    rolled_up=True,
+                )
+            )
+            accumulate_body_scores(
+                record["user_id"],
+                created_at.date(),
+                _body_scores(json.loads(record["data_json"])),
+            )
+            current = latest.get(record["user_id"])
+            if current is None or created_at > current["created_at"]:
+                latest[record["user_id"]] = {
+                    "checkin_id": record["id"],
+                    "created_at": created_at,
+                    "data_json": record["data_json"],
+                }
+        for user_id, snapshot in latest.items():
+            stmt = _dialect_insert(LatestCheckIn).values(user_id=user_id, **snapshot)
+            db.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["user_id"],
+                    set_=snapshot,
+                    where=LatestCheckIn.__table__.c.created_at
+                    <= stmt.excluded.created_at,
+                )
+            )
+
+    recorded = []
+    for user_id, by_video in completions.items():
+        trails, _already, _unknown = record_video_completions(user_id, by_video)
+        recorded.extend((user_id, trail_id) for trail_id in trails.values())
+    return recorded
+
+
+def compact_checkins(
+    raw_retention_days: int = 30,
+    daily_retention_days: int = 180,
+    batch_size: int = 1000,
+    today: Optional[date] = None,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> Dict[str, int]:
+    """Fold raw check-ins into rollups and drop data past its retention.
+
+    Check-ins not yet rolled up (those written before the rollup table
+    existed) are added to their day and week rollups, and users without a
+    LatestCheckIn get one. Raw rows older than ``raw_retention_days`` and
+    day rollups older than ``daily_retention_days`` are then deleted; week
+    rollups are kept. Work is committed every ``batch_size`` rows so no
+    transaction stays open for long, and ``on_batch`` (if given) is called
+    with the row count after each commit. Requires an app context.
+    """
+    today = today or datetime.utcnow().date()
+    stats = {"rolled_up": 0, "latest_backfilled": 0, "raw_deleted": 0, "daily_deleted": 0}
+
+    while True:
+        batch = (
+            DailyCheckIn.query.filter(
+                DailyCheckIn.rolled_up.is_(False), DailyCheckIn.user_id.isnot(None)
+            )
+            .order_by(DailyCheckIn.created_at.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        for checkin in batch:
+            try:
+                payload = json.loads(checkin.data_json)
+            except ValueError:
+                payload = None
+            accumulate_body_scores(
+                checkin.user_id, checkin.created_at.date(), _body_scores(payload)
+            )
+            checkin.rolled_up = True
+        db.session.commit()
+        stats["rolled_up"] += len(batch)
+        if on_batch is not None:
+            on_batch(len(batch))
+
+    # /api/dashboard falls back to the newest raw row when a user has no
+    # LatestCheckIn, so copy it over before the raw rows can be deleted.
+    stats["latest_backfilled"] = backfill_latest_checkins(batch_size, on_batch)
+
+    raw_cutoff = datetime.combine(
+        today - timedelta(days=raw_retention_days), datetime.min.time()
+    )
+    stats["raw_deleted"] = _delete_in_batches(
+        DailyCheckIn,
+        (DailyCheckIn.created_at < raw_cutoff)
+        & (DailyCheckIn.rolled_up.is_(True) | DailyCheckIn.user_id.is_(None)),
+        batch_size,
+        on_batch,
+    )
+    stats["daily_deleted"] = _delete_in_batches(
+        BodyScoreRollup,
+        (BodyScoreRollup.period == "day")
+        & (BodyScoreRollup.period_start < today - timedelta(days=daily_retention_days)),
+        batch_size,
+        on_batch,
+    )
+    return stats
+
+
+def backfill_latest_checkins(
+    batch_size: int = 1000, on_batch: Optional[Callable[[int], None]] = None
+) -> int:
+    """Create LatestCheckIn for users whose check-ins predate that table.
+
+    Each such user gets a copy of their newest DailyCheckIn. Returns the
+    number of users backfilled. Requires an app context.
+    """
+    backfilled = 0
+    while True:
+        user_ids = [
+            user_id
+            for (user_id,) in db.session.query(DailyCheckIn.user_id)
+            .filter(
+                DailyCheckIn.user_id.isnot(None),
+                ~db.session.query(LatestCheckIn.user_id)
+                .filter(LatestCheckIn.user_id == DailyCheckIn.user_id)
+                .exists(),
+            )
+            .distinct()
+            .limit(batch_size)
+        ]
+        if not user_ids:
+            return backfilled
+        ranked = (
+            select(
+                DailyCheckIn.user_id,
+                DailyCheckIn.id.label("checkin_id"),
+                DailyCheckIn.created_at,
+                DailyCheckIn.data_json,
+                db.func.row_number()
+                .over(
+                    partition_by=DailyCheckIn.user_id,
+                    order_by=(DailyCheckIn.created_at.desc(), DailyCheckIn.id.desc()),
+                )
+                .label("rank"),
+            )
+            .where(DailyCheckIn.user_id.in_(user_ids))
+            .subquery()
+        )
+        db.session.execute(
+            _dialect_insert(LatestCheckIn)
+            .from_select(
+                ["user_id", "checkin_id", "created_at", "data_json"],
+                select(
+                    ranked.c.user_id,
+                    ranked.c.checkin_id,
+                    ranked.c.created_at,
+                    ranked.c.data_json,
+                ).where(ranked.c.rank == 1),
+            )
+            .on_conflict_do_nothing(index_elements=["user_id"])
+        )
+        db.session.commit()
+        backfilled += len(user_ids)
+        if on_batch is not None:
+            on_batch(len(user_ids))
+
+
+def _delete_in_batches(
+    model, condition, batch_size: int, on_batch: Optional[Callable[[int], None]] = None
+) -> int:
+    deleted = 0
+    while True:
+        ids = [
+            row_id
+            for (row_id,) in db.session.query(model.id)
+            .filter(condition)
+            .limit(batch_size)
+        ]
+        if not ids:
+            return deleted
+        db.session.query(model).filter(model.id.in_(ids)).delete(
+            synchronize_session=False
+        )
+        db.session.commit()
+        deleted += len(ids)
+        if on_batch is not None:
+            on_batch(len(ids))
+
+
+def _user_id_batch(after: Optional[str], limit: int) -> List[str]:
+    stmt = select(User.id).order_by(User.id).limit(limit)
+    if after is not None:
+        stmt = stmt.where(User.id > after)
+    return list(db.session.scalars(stmt))
+
+
+def expire_streaks(context: JobContext, today: Optional[date] = None) -> None:
+    """Reset the streak of users with no activity yesterday or today.
+
+    Uses the server-local date, like the completion handlers. The WHERE
+    clause is re-checked by the UPDATE, so a completion racing with the job
+    keeps its streak. Affected snapshots are dropped and rebuilt on demand.
+    """
+    cutoff = (today or date.today()) - timedelta(days=1)
+    stale = (User.streak > 0) & (
+        User.last_activity_date.is_(None) | (User.last_activity_date < cutoff)
+    )
+    for user_ids in context.keyset_batches(_user_id_batch):
+        expired = list(
+            db.session.scalars(select(User.id).where(User.id.in_(user_ids), stale))
+        )
+        if expired:
+            db.session.execute(
+                update(User)
+                .where(User.id.in_(expired), stale)
+                .values(streak=0)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                UserSnapshot.__table__.delete().where(UserSnapshot.user_id.in_(expired))
+            )
+        db.session.commit()
+        context.stats["expired"] = context.stats.get("expired", 0) + len(expired)
+
+
+def audit_xp(context: JobContext, fix: bool = False) -> None:
+    """Compare User.xp with the sum of the user's VideoProgress.xp_awarded.
+
+    Mismatches are counted and logged; with ``fix`` the XP is reset to the
+    sum in one UPDATE per batch and the user's snapshot is dropped.
+    """
+    awarded = (
+        select(db.func.coalesce(db.func.sum(VideoProgress.xp_awarded), 0))
+        .where(VideoProgress.user_id == User.id)
+        .scalar_subquery()
+    )
+    for user_ids in context.keyset_batches(_user_id_batch):
+        mismatched = [
+            (user_id, xp, expected)
+            for user_id, xp, expected in db.session.execute(
+                select(User.id, User.xp, awarded).where(User.id.in_(user_ids))
+            )
+            if int(xp or 0) != int(expected)
+        ]
+        for user_id, xp, expected in mismatched[:10]:
+            logger.warning(
+                "xp audit: user %s has %s xp, completions award %s", user_id, xp, expected
+            )
+        if mismatched and fix:
+            ids = [user_id for user_id, _, _ in mismatched]
+            db.session.execute(
+                update(User)
+                .where(User.id.in_(ids))
+                .values(xp=awarded)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                UserSnapshot.__table__.delete().where(UserSnapshot.user_id.in_(ids))
+            )
+        db.session.commit()
+        context.stats["mismatched"] = context.stats.get("mismatched", 0) + len(mismatched)
+
+
+def optimize_database(context: JobContext, vacuum: bool = False) -> None:
+    """Refresh planner statistics and reclaim space without long locks.
+
+    PostgreSQL: VACUUM (ANALYZE) one table per checkpoint; plain VACUUM
+    does not block reads or writes. SQLite: PRAGMA optimize, a passive WAL
+    checkpoint and, when auto_vacuum is incremental, freeing pages in small
+    steps. A full SQLite VACUUM locks the whole database, so it only runs
+    with ``vacuum``.
+    """
+    engine = db.engine
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if engine.dialect.name == "postgresql":
+            quote = engine.dialect.identifier_preparer.quote
+            for table in db.metadata.sorted_tables:
+                conn.execute(text(f"VACUUM (ANALYZE) {quote(table.name)}"))
+                context.checkpoint(tables=1)
+            return
+        if engine.dialect.name != "sqlite":
+            conn.execute(text("ANALYZE"))
+            return
+        conn.execute(text("PRAGMA optimize"))
+        conn.execute(text("PRAGMA wal_checkpoint(PASSIVE)"))
+        context.checkpoint(tables=len(db.metadata.sorted_tables))
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+            while conn.execute(text("PRAGMA freelist_count")).scalar():
+                # Each returned row is one freed page; fetching runs them.
+                conn.execute(text("PRAGMA incremental_vacuum(1000)")).fetchall()
+                context.checkpoint(pages=1000)
+        if vacuum:
+            conn.execute(text("VACUUM"))
+
+
+def _catalog_upsert(model, keys: List[str], columns: Iterable[str]):
+    # Executed with a list of parameter sets, so the statement is compiled
+    # once and cached instead of rendering a VALUES clause per chunk.
+    stmt = _dialect_insert(model)
+    return stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={column: stmt.excluded[column] for column in columns if column not in keys},
+    )
+
+
+# (record type, model, conflict keys), in foreign-key order.
+CATALOG_TABLES = (
+    ("trail", Trail, ["id"]),
+    ("module", TrailModule, ["trail_id", "position"]),
+    ("video", VideoLesson, ["id"]),
+)
+
+
+def import_catalog(
+    records: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]],
+    chunk_size: int = 1000,
+) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+    """Upsert trails, modules and videos from parsed catalog records.
+
+    Records are validated one by one and written with one multi-row upsert
+    per table and chunk, committed per chunk. Invalid rows are reported and
+    skipped; if a chunk fails in the database it is retried row by row so
+    only the offending rows are rejected. Requires an app context.
+    """
+    stats = {"processed": 0, "trails": 0, "modules": 0, "videos": 0, "error_count": 0}
+    errors: List[Dict[str, Any]] = []
+    known_trails = {trail_id for (trail_id,) in db.session.query(Trail.id)}
+    next_positions: Dict[str, int] = {}
+
+    def fail(line, message):
+        stats["error_count"] += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append({"line": line, "error": message})
+
+    for chunk in chunked(records, max(1, chunk_size)):
+        rows: Dict[str, Dict[Any, Tuple[int, Dict[str, Any]]]] = {
+            kind: {} for kind, _, _ in CATALOG_TABLES
+        }
+        for line, raw, error in chunk:
+            stats["processed"] += 1
+            if error:
+                fail(line, error)
+                continue
+            try:
+                kind, values = normalize_record(raw)
+            except CatalogRecordError as exc:
+                fail(line, str(exc))
+                continue
+            if kind == "trail":
+                known_trails.add(values["id"])
+            elif values["trail_id"] not in known_trails:
+                fail(line, "Trilha não encontrada")
+                continue
+            keys = next(k for t, _, k in CATALOG_TABLES if t == kind)
+            # A repeated key inside one statement is an error on PostgreSQL,
+            # so the last occurrence in the chunk wins.
+            rows[kind][tuple(values[k] for k in keys)] = (line, values)
+
+        unpositioned = [v for _, v in rows["video"].values() if v["position"] is None]
+        if unpositioned:
+            # Existing lessons keep their place; new ones go after the last.
+            existing = dict(
+                db.session.query(VideoLesson.id, VideoLesson.position).filter(
+                    VideoLesson.id.in_([v["id"] for v in unpositioned])
+                )
+            )
+            missing = {v["trail_id"] for v in unpositioned} - set(next_positions)
+            if missing:
+                next_positions.update(
+                    db.session.query(Trail.id, Trail.next_position).filter(
+                        Trail.id.in_(missing)
+                    )
+                )
+            for values in unpositioned:
+                trail_id = values["trail_id"]
+                if values["id"] in existing:
+                    values["position"] = existing[values["id"]]
+                    continue
+                values["position"] = next_positions.get(trail_id) or 1
+                next_positions[trail_id] = values["position"] + 1
+
+        # Upserts can add lessons or move them between trails, so the
+        # counters of every trail a lesson may have left are refreshed too.
+        touched_trails = {v["trail_id"] for _, v in rows["video"].values()}
+        if rows["video"]:
+            touched_trails.update(
+                trail_id
+                for (trail_id,) in db.session.query(VideoLesson.trail_id)
+                .filter(VideoLesson.id.in_([v["id"] for _, v in rows["video"].values()]))
+                .distinct()
+            )
+        try:
+            for kind, model, keys in CATALOG_TABLES:
+                params = [values for _, values in rows[kind].values()]
+                if params:
+                    db.session.execute(_catalog_upsert(model, keys, params[0]), params)
+            refresh_trail_video_stats(touched_trails)
+            invalidate_user_snapshots(touched_trails)
+            db.session.commit()
+            # Refreshed counters may differ from the positions handed out.
+            for trail_id in touched_trails:
+                next_positions.pop(trail_id, None)
+            for kind, _, _ in CATALOG_TABLES:
+                stats[f"{kind}s"] += len(rows[kind])
+        except (SQLAlchemyError, OverflowError, ValueError):
+            # sqlite3 raises OverflowError for out-of-range integers before
+            # SQLAlchemy can wrap it.
+            db.session.rollback()
+            for trail_id in touched_trails:
+                next_positions.pop(trail_id, None)
+            for kind, model, keys in CATALOG_TABLES:
+                for line, values in rows[kind].values():
+                    try:
+                        db.session.execute(_catalog_upsert(model, keys, values), values)
+                        if kind == "video":
+                            refresh_trail_video_stats(touched_trails)
+                            invalidate_user_snapshots(touched_trails)
+                        db.session.commit()
+                        stats[f"{kind}s"] += 1
+                    except (SQLAlchemyError, OverflowError, ValueError) as exc:
+                        db.session.rollback()
+                        fail(line, f"Erro ao gravar: {exc.__class__.__name__}")
+    return stats, errors
+
+
+def iter_catalog_records(chunk: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Every trail, module and video as typed export records, streamed."""
+    for trail in Trail.query.order_by(Trail.id).yield_per(chunk):
+        yield {
+            "type": "trail",
+            "id": trail.id,
+            "title": trail.title,
+            "icon": trail.icon,
+            "format": trail.format,
+            "duration_weeks_min": trail.duration_weeks_min,
+            "duration_weeks_max": trail.duration_weeks_max,
+        }
+    modules = TrailModule.query.order_by(TrailModule.trail_id, TrailModule.position)
+    for module in modules.yield_per(chunk):
+        yield {
+            "type": "module",
+            "trail_id": module.trail_id,
+            "name": module.name,
+            "position": module.position,
+        }
+    videos = VideoLesson.query.order_by(
+        VideoLesson.trail_id, VideoLesson.position, VideoLesson.created_at, VideoLesson.id
+    )
+    for video in videos.yield_per(chunk):
+        yield {
+            "type": "video",
+            "id": video.id,
+            "trail_id": video.trail_id,
+            "title": video.title,
+            "provider": video.provider,
+            "url": video.url,
+            "duration_minutes": video.duration_minutes,
+            "position": video.position,
+        }
+
+
+def encode_video_cursor(video: VideoLesson) -> str:
+    raw = json.dumps([video.position, video.created_at.isoformat(), video.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_video_cursor(cursor: str) -> Tuple[int, datetime, str]:
+    position, created_at, video_id = json.loads(base64.urlsafe_b64decode(cursor))
+    return int(position), datetime.fromisoformat(created_at), str(video_id)
+
+
+def ordered_videos(trail_id: str, after: Optional[Tuple[Any, ...]] = None):
+    # Keyset order; (position, created_at, id) is unique, so a cursor
+    # made of the last row's values resumes exactly after it.
+    stmt = select(VideoLesson).filter_by(trail_id=trail_id)
+    if after is not None:
+        stmt = stmt.where(
+            tuple_(VideoLesson.position, VideoLesson.created_at, VideoLesson.id)
+            > tuple_(*after)
+        )
+    return stmt.order_by(
+        VideoLesson.position.asc(),
+        VideoLesson.created_at.asc(),
+        VideoLesson.id.asc(),
+    )
+
+
+def overlay_etag(base_etag: str, ids: Iterable[str]) -> str:
+    """ETag of a shared catalog body plus one user's enrolled/completed ids."""
+    overlay = ",".join(sorted(ids))
+    return hashlib.sha1(f"{base_etag}:user:{overlay}".encode("utf-8")).hexdigest()
+
+
+def refresh_trail_video_stats(trail_ids: Optional[Iterable[str]] = None) -> None:
+    """Recompute Trail.video_count/next_position from the lessons.
+
+    Limited to ``trail_ids`` when given. Runs in the current transaction;
+    the caller commits.
+    """
+    lessons = VideoLesson.__table__
+    count = (
+        select(db.func.count())
+        .where(lessons.c.trail_id == Trail.__table__.c.id)
+        .scalar_subquery()
+    )
+    last = (
+        select(db.func.max(lessons.c.position))
+        .where(lessons.c.trail_id == Trail.__table__.c.id)
+        .scalar_subquery()
+    )
+    stmt = update(Trail.__table__).values(
+        video_count=count, next_position=db.func.coalesce(last + 1, 1)
+    )
+    if trail_ids is not None:
+        trail_ids = list(trail_ids)
+        if not trail_ids:
+            return
+        stmt = stmt.where(Trail.__table__.c.id.in_(trail_ids))
+    db.session.execute(stmt)
+
+
+def migrate_schema() -> None:
+    """Create missing tables, then add columns and indexes to existing ones."""
+    db.create_all()
+    _upgrade_schema()
+    # Backfills the denormalized counters when their columns were just added.
+    refresh_trail_video_stats()
+    db.session.commit()
+    backfill_latest_checkins()
+
+
+def seed_catalog() -> bool:
+    """Insert SEED_TRAILS if there are no trails yet. Requires an app context."""
+    if db.session.query(Trail.id).limit(1).first() is not None:
+        return False
+
+    for seed in SEED_TRAILS:
+        trail = Trail(
+            id=seed["id"],
+            icon=seed["icon"],
+            title=seed["title"],
+            format=seed["format"],
+            duration_weeks_min=seed["duration_weeks_min"],
+            duration_weeks_max=seed["duration_weeks_max"],
+            video_count=len(seed["videos"]),
+            next_position=len(seed["videos"]) or 1,
+        )
+        db.session.add(trail)
+
+        for idx, module_name in enumerate(seed["modules"]):
+            db.session.add(
+                TrailModule(
+                    trail_id=trail.id,
+                    name=module_name,
+                    position=idx,
+                )
+            )
+
+        for idx, video in enumerate(seed["videos"]):
+            db.session.add(
+                VideoLesson(
+                    id=uuid.uuid4().hex,
+                    trail_id=trail.id,
+                    title=video["title"],
+                    provider=video.get("provider") or "external",
+                    url=video["url"],
+                    duration_minutes=int(video.get("duration_minutes") or 0),
+                    position=idx,
+                )
+            )
+
+    db.session.commit()
+    return True
 
 
 def create_app():
     app = Flask(__name__)
-    CORS(app)
+    app.request_class = AppRequest
+    app.json = encoding.json_provider_class()(app)
+    # ETag is exposed so the service worker can revalidate catalog copies.
+    CORS(app, expose_headers=["ETag"])
 
     app.config["SECRET_KEY"] = (
         os.environ.get("SECRET_KEY") or os.environ.get("JWT_SECRET") or "dev-secret"
@@ -187,41 +1630,148 @@ def create_app():
 
     app.config["SQLALCHEMY_DATABASE_URI"] = database_url or "sqlite:///app.db"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"]
+    )
     db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+    instrumentation.init_app(app, db)
+    encoding.init_app(app)
+
+    app.config["AUTH_MODE"] = (os.environ.get("AUTH_MODE") or "db").strip().lower()
+    auth_stateless = app.config["AUTH_MODE"] == "stateless"
+    token_cache = TTLCache(
+        maxsize=int(os.environ.get("AUTH_TOKEN_CACHE_SIZE") or 4096),
+        ttl=float(os.environ.get("AUTH_TOKEN_CACHE_TTL_SECONDS") or 300),
+    )
+    cache_store = store_from_env(
+        app.config["SQLALCHEMY_DATABASE_URI"], os.path.join(app.instance_path, "cache")
+    )
+    app.extensions["cache_store"] = cache_store
+    token_version_cache = Cache(
+        cache_store,
+        "token_version",
+        ttl=float(os.environ.get("AUTH_VERSION_CACHE_TTL_SECONDS") or 30),
+        version_check=version_check_seconds(),
+    )
+    app.extensions["token_version_cache"] = token_version_cache
+
+    password_hasher = PasswordHasher(
+        method=os.environ.get("PASSWORD_HASH_METHOD") or "scrypt",
+        workers=int(os.environ.get("PASSWORD_HASH_WORKERS") or 0),
+        max_pending=int(os.environ.get("PASSWORD_HASH_MAX_PENDING") or 0),
+        timeout=float(os.environ.get("PASSWORD_HASH_TIMEOUT_SECONDS") or 10),
+    )
+    app.extensions["password_hasher"] = password_hasher
+
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(_error):
+        response = jsonify(error="Servidor ocupado, tente novamente em instantes")
+        response.status_code = 503
+        response.headers["Retry-After"] = (
+            os.environ.get("PASSWORD_HASH_RETRY_AFTER") or "1"
+        )
+        return response
+
+    rate_limiter = limiter_from_env()
+    trusted_proxies = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES") or 0)
+
+    @app.errorhandler(RateLimited)
+    def rate_limited(error):
+        response = jsonify(error="Muitas tentativas, tente novamente mais tarde")
+        response.status_code = 429
+        response.headers["Retry-After"] = retry_after_header(error.retry_after)
+        return response
+
+    def _throttle(rule, key):
+        if rate_limiter is not None:
+            rate_limiter.hit(rule, key)
 
     def _make_token(user):
         payload = {
             "sub": user.id,
+            "adm": bool(user.is_admin),
+            "ver": int(user.token_version or 0),
             "exp": datetime.utcnow() + timedelta(days=30),
             "iat": datetime.utcnow(),
         }
         return jwt.encode(payload, app.config["SECRET_KEY"], algorithm="HS256")
 
-    def _current_user(optional=False):
+    def _decode_token(token):
+        now = time.time()
+        claims = token_cache.get(token)
+        if claims is not None:
+            return claims if claims.get("exp", 0) > now else None
+        try:
+            claims = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
+        except Exception:
+            return None
+        if not claims.get("sub"):
+            return None
+        token_cache.set(
+            token, claims, ttl=min(token_cache.ttl, claims.get("exp", now) - now)
+        )
+        return claims
+
+    def _auth_state(user_id):
+        """(token_version, is_admin) from the database, cached briefly."""
+        state = token_version_cache.get(str(user_id))
+        if state is None:
+            row = (
+                db.session.query(User.token_version, User.is_admin)
+                .filter_by(id=user_id)
+                .first()
+            )
+            if row is None:
+                return None
+            state = (int(row.token_version or 0), bool(row.is_admin))
+            token_version_cache.set(str(user_id), state)
+        return state
+
+    def _revoke_tokens(user_id):
+        if not revoke_user_tokens(user_id):
+            return False
+        db.session.commit()
+        # The namespace is bumped rather than the one key deleted so that
+        # workers with a per-process store drop their copy too.
+        token_version_cache.invalidate()
+        return True
+
+    def _current_principal():
         auth_header = request.headers.get("authorization") or ""
         if not auth_header.lower().startswith("bearer "):
-            return None if optional else None
+            return None
         token = auth_header.split(" ", 1)[1].strip()
         if not token:
-            return None if optional else None
-        try:
-            payload = jwt.decode(
-                token, app.config["SECRET_KEY"], algorithms=["HS256"]
-            )
-            user_id = payload.get("sub")
-            if not user_id:
-                return None if optional else None
-            return User.query.filter_by(id=user_id).first()
-        except Exception:
-            return None if optional else None
+            return None
+        claims = _decode_token(token)
+        if not claims:
+            return None
+
+        user_id = claims["sub"]
+        token_version = int(claims.get("ver") or 0)
+        if auth_stateless and "adm" in claims:
+            # Trust the signature; the revocation version and the admin flag
+            # come from the (briefly cached) User row, and the full row is
+            # loaded only if a handler needs it.
+            state = _auth_state(user_id)
+            if state is None or state[0] != token_version:
+                return None
+            return AuthPrincipal(user_id, state[1])
+
+        user = User.query.filter_by(id=user_id).first()
+        if not user or int(user.token_version or 0) != token_version:
+            return None
+        return AuthPrincipal(user.id, user.is_admin, user)
 
     def require_auth(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            user = _current_user(optional=False)
-            if not user:
+            principal = _current_principal()
+            if not principal:
                 return jsonify(error="Não autorizado"), 401
-            request.current_user = user
+            request.principal = principal
             return fn(*args, **kwargs)
 
         return wrapper
@@ -229,153 +1779,347 @@ def create_app():
     def require_admin(fn):
         @wraps(fn)
         def wrapper(*args, **kwargs):
-            user = _current_user(optional=False)
-            if not user:
+            principal = _current_principal()
+            if not principal:
                 return jsonify(error="Não autorizado"), 401
-            if not user.is_admin:
+            if not principal.is_admin:
                 return jsonify(error="Acesso negado"), 403
-            request.current_user = user
+            request.principal = principal
             return fn(*args, **kwargs)
 
         return wrapper
 
-    with app.app_context():
-        db.create_all()
+    def _load_global_scores():
+        return (
+            db.session.query(User.id, User.xp)
+            .order_by(User.xp.desc())
+            .execution_options(yield_per=LEADERBOARD_LOAD_CHUNK)
+        )
 
-        if Trail.query.count() == 0:
-            seeds = [
-                {
-                    "id": "protagonismo-lideranca",
-                    "icon": "🎭",
-                    "title": "Trilha 1: Protagonismo e Liderança",
-                    "modules": [
-                        "Comunicação Eficaz",
-                        "Delegação e Conflitos",
-                        "Trabalho em Equipe",
-                        "Liderança 2025",
-                    ],
-                    "duration_weeks_min": 4,
-                    "duration_weeks_max": 8,
-                    "format": "Microlearning diário (5-10 min)",
-                    "videos": [
-                        {
-                            "title": "Introdução ao Protagonismo",
-                            "provider": "youtube",
-                            "url": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
-                            "duration_minutes": 10,
-                        },
-                        {
-                            "title": "Comunicação com o Coração",
-                            "provider": "youtube",
-                            "url": "https://www.youtube.com/watch?v=ysz5P8qQr6I",
-                            "duration_minutes": 8,
-                        },
-                    ],
-                },
-                {
-                    "id": "nr1-cultura-organizacional",
-                    "icon": "🏢",
-                    "title": "Trilha 2: NR1 e Cultura Organizacional",
-                    "modules": [
-                        "Conhecer o Negócio",
-                        "Valores",
-                        "Propósito",
-                        "Working Capital",
-                    ],
-                    "duration_weeks_min": 4,
-                    "duration_weeks_max": 4,
-                    "format": "Cases empresariais e reflexões diárias",
-                    "videos": [
-                        {
-                            "title": "Cultura Organizacional na Prática",
-                            "provider": "youtube",
-                            "url": "https://www.youtube.com/watch?v=jNQXAC9IVRw",
-                            "duration_minutes": 12,
-                        }
-                    ],
-                },
-                {
-                    "id": "cuidado-humanizado",
-                    "icon": "❤️",
-                    "title": "Trilha 3: Cuidado Humanizado",
-                    "modules": [
-                        "Equilíbrio dos Corpos",
-                        "Ética do Cuidado",
-                        "Empatia Tripla",
-                        "Compaixão em Ação",
-                    ],
-                    "duration_weeks_min": 6,
-                    "duration_weeks_max": 6,
-                    "format": "Meditações guiadas e práticas contemplativas",
-                    "videos": [
-                        {
-                            "title": "Meditação: Equilíbrio dos Corpos",
-                            "provider": "youtube",
-                            "url": "https://www.youtube.com/watch?v=2OEL4P1Rz04",
-                            "duration_minutes": 15,
-                        }
-                    ],
-                },
-                {
-                    "id": "jornada-heroi-rocky",
-                    "icon": "⚡",
-                    "title": "Trilha 4: Jornada do Herói (Rocky Balboa)",
-                    "modules": ["Do Ambiente ao Legado"],
-                    "duration_weeks_min": 12,
-                    "duration_weeks_max": 12,
-                    "format": "Storytelling imersivo e desafios progressivos",
-                    "videos": [
-                        {
-                            "title": "Introdução à Jornada do Herói",
-                            "provider": "youtube",
-                            "url": "https://www.youtube.com/watch?v=gbRDCWKqvEc",
-                            "duration_minutes": 14,
-                        }
-                    ],
-                },
-            ]
-
-            for seed in seeds:
-                trail = Trail(
-                    id=seed["id"],
-                    icon=seed["icon"],
-                    title=seed["title"],
-                    format=seed["format"],
-                    duration_weeks_min=seed["duration_weeks_min"],
-                    duration_weeks_max=seed["duration_weeks_max"],
-                )
-                db.session.add(trail)
-
-                for idx, module_name in enumerate(seed["modules"]):
-                    db.session.add(
-                        TrailModule(
-                            trail_id=trail.id,
-                            name=module_name,
-                            position=idx,
-                        )
-                    )
+    def _load_trail_scores(trail_id):
+        return (
+            db.session.query(
+                VideoProgress.user_id, db.func.sum(VideoProgress.xp_awarded)
+            )
+            .filter_by(trail_id=trail_id)
+            .group_by(VideoProgress.user_id)
+            .all()
+        )
 
-                for idx, video in enumerate(seed["videos"]):
-                    db.session.add(
-                        VideoLesson(
-                            id=uuid.uuid4().hex,
-                            trail_id=trail.id,
-                            title=video["title"],
-                            provider=video.get("provider") or "external",
-                            url=video["url"],
-                            duration_minutes=int(video.get("duration_minutes") or 0),
-                            position=idx,
-                        )
-                    )
+    def _run_in_app_context(fn):
+        with app.app_context():
+            fn()
 
-            db.session.commit()
+    leaderboard = Leaderboard(
+        load_global=_load_global_scores,
+        load_trail=_load_trail_scores,
+        refresh_seconds=float(os.environ.get("LEADERBOARD_REFRESH_SECONDS") or 300),
+        run_in_context=_run_in_app_context,
+        max_trails=int(os.environ.get("LEADERBOARD_MAX_TRAILS") or 256),
+    )
+    app.extensions["leaderboard"] = leaderboard
+    if os.environ.get("LEADERBOARD_WARM") == "1":
+        # Opt-in: the load queries the database while the app is being
+        # created (and so on import, and in CLI commands such as migrate).
+        # Without it the first leaderboard request builds the index.
+        leaderboard.warm()
+
+    def _leaderboard_index(trail_id):
+        """The index of a trail in the catalog (or the global one), else None."""
+        if trail_id is not None and (
+            db.session.query(Trail.id).filter_by(id=trail_id).scalar() is None
+        ):
+            return None
+        return leaderboard.index(trail_id)
+
+    def _apply_buffered_writes(records):
+        recorded = apply_buffered_writes(records)
+        # Leaves the pending index as the rows become visible, so reads
+        # that merge the two never count a record twice.
+        write_behind.commit_applied(records, db.session.commit)
+        for user_id, trail_id in recorded:
+            leaderboard.record(user_id, trail_id, XP_PER_VIDEO)
+
+    # Opt-in: check-ins and single completions are acknowledged once they
+    # are in a local fsync'd log and reach the database in batches.
+    write_behind = None
+    if os.environ.get("WRITE_BEHIND"):
+        write_behind = WriteBehind(
+            AppendLog(
+                os.environ.get("WRITE_BEHIND_DIR")
+                or os.path.join(app.instance_path, "write-behind"),
+                fsync=os.environ.get("WRITE_BEHIND_FSYNC", "1") != "0",
+            ),
+            apply_batch=_apply_buffered_writes,
+            run_in_context=_run_in_app_context,
+            interval=float(os.environ.get("WRITE_BEHIND_FLUSH_MS") or 200) / 1000,
+            max_pending=int(os.environ.get("WRITE_BEHIND_MAX_PENDING") or 1000),
+            max_attempts=int(os.environ.get("WRITE_BEHIND_MAX_ATTEMPTS") or 5),
+        )
+        app.extensions["write_behind"] = write_behind
+        atexit.register(write_behind.close)
+
+    def _pending_completions(user_id):
+        return pending_completions(write_behind, user_id)
+
+    def _public_user(user):
+        """to_public_dict() including this process's buffered completions."""
+        return public_user_with_pending(user, _pending_completions(user.id))
+
+    def _bounded_int_arg(name, default, maximum):
+        try:
+            value = int(request.args.get(name) or default)
+        except ValueError:
+            value = default
+        return max(0, min(value, maximum))
+
+    def _leaderboard_entries(ranked, me=None):
+        if not ranked:
+            return []
+        names = dict(
+            db.session.query(User.id, User.name).filter(
+                User.id.in_([user_id for _, user_id, _ in ranked])
+            )
+        )
+        entries = []
+        for rank, user_id, xp in ranked:
+            entry = {
+                "rank": rank,
+                "user_id": user_id,
+                "name": names.get(user_id, ""),
+                "xp": xp,
+            }
+            if me is not None:
+                entry["is_me"] = user_id == me
+            entries.append(entry)
+        return entries
+
+    def _load_catalog_trails():
+        # Modules are fetched with one IN query for all trails instead of a
+        # lazy SELECT per trail inside Trail.to_dict().
+        return Trail.query.options(selectinload(Trail.modules)).all()
+
+    # Catalog responses only change through the admin write routes, which
+    # invalidate the namespace for every worker (see cache.py). The TTL only
+    # bounds staleness for writes made behind the app's back, or on other
+    # hosts when the cache store is not shared between them.
+    catalog_cache = Cache(
+        cache_store,
+        "catalog",
+        ttl=float(os.environ.get("CATALOG_CACHE_TTL_SECONDS") or 300),
+        version_check=version_check_seconds(),
+    )
+    app.extensions["catalog_cache"] = catalog_cache
+
+    def _dump_json(payload):
+        return app.json.dumps(payload).encode("utf-8")
+
+    def _bump_catalog_version():
+        catalog_cache.invalidate()
+
+    def _catalog_entry(key, build_items, wrap):
+        cached = catalog_cache.get(key)
+        if cached is not None:
+            return CatalogEntry(*cached)
+
+        version = catalog_cache.version()
+        items = build_items()
+        body = _dump_json(wrap(items))
+        entry = CatalogEntry(items=items, body=body, etag=hashlib.sha1(body).hexdigest())
+        # Stored as a plain tuple so any worker can unpickle it.
+        catalog_cache.set(key, tuple(entry), version=version)
+        return entry
+
+    def _catalog_response(etag, build_body, private):
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(build_body(), mimetype="application/json")
+            if not private:
+                # Lets the compressor reuse one compressed copy per ETag.
+                # Per-user overlays are compressed per request instead, so
+                # they neither churn that cache nor pay for the best level.
+                response.cache_key = etag
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = (
+            "private, no-cache" if private else "public, no-cache"
+        )
+        response.vary.add("Authorization")
+        return response
+
+    default_dashboard_body = _dump_json(DEFAULT_DASHBOARD)
+    anonymous_dashboard_cache = TTLCache(
+        maxsize=1, ttl=float(os.environ.get("DASHBOARD_ANON_CACHE_TTL_SECONDS") or 10)
+    )
+
+    @app.cli.command("compact-checkins")
+    def compact_checkins_command():
+        """Roll up old check-ins and apply the retention windows."""
+        stats = compact_checkins(
+            raw_retention_days=int(os.environ.get("CHECKIN_RAW_RETENTION_DAYS") or 30),
+            daily_retention_days=int(
+                os.environ.get("CHECKIN_DAILY_RETENTION_DAYS") or 180
+            ),
+        )
+        print(json.dumps(stats))
+
+    def _job_interval(name, default):
+        return float(os.environ.get(f"JOBS_INTERVAL_{name.upper()}") or default)
+
+    def _audit_xp_job(context):
+        fix = os.environ.get("JOBS_XP_AUDIT_FIX") == "1"
+        audit_xp(context, fix=fix)
+        if fix and context.stats.get("mismatched"):
+            leaderboard.invalidate()
+
+    def _compact_checkins_job(context):
+        context.stats.update(
+            compact_checkins(
+                raw_retention_days=int(os.environ.get("CHECKIN_RAW_RETENTION_DAYS") or 30),
+                daily_retention_days=int(
+                    os.environ.get("CHECKIN_DAILY_RETENTION_DAYS") or 180
+                ),
+                batch_size=context.batch_size,
+                on_batch=context.checkpoint,
+            )
+        )
+
+    def _optimize_database_job(context):
+        optimize_database(context, vacuum=os.environ.get("JOBS_SQLITE_VACUUM") == "1")
+
+    maintenance_jobs = [
+        Job(
+            "expire_streaks",
+            expire_streaks,
+            _job_interval("expire_streaks", 3600),
+            "Reset the streak of users idle since before yesterday.",
+        ),
+        Job(
+            "audit_xp",
+            _audit_xp_job,
+            _job_interval("audit_xp", 86400),
+            "Check User.xp against completions (JOBS_XP_AUDIT_FIX=1 repairs).",
+        ),
+        Job(
+            "compact_checkins",
+            _compact_checkins_job,
+            _job_interval("compact_checkins", 86400),
+            "Roll up old check-ins and apply the retention windows.",
+        ),
+        Job(
+            "optimize_database",
+            _optimize_database_job,
+            _job_interval("optimize_database", 86400),
+            "ANALYZE/VACUUM without long locks.",
+        ),
+    ]
+    jobs_dir = os.environ.get("JOBS_STATE_DIR") or os.path.join(app.instance_path, "jobs")
+    job_settings = settings_from_env()
+    app.extensions["jobs"] = maintenance_jobs
+
+    # Opt-in for single-host setups; otherwise run 'flask --app app jobs
+    # schedule' as its own process. Either way the state files make sure
+    # only one process runs a given job at a time.
+    if os.environ.get("JOBS_SCHEDULER") == "1":
+        scheduler = Scheduler(
+            maintenance_jobs,
+            jobs_dir,
+            _run_in_app_context,
+            job_settings,
+            tick=float(os.environ.get("JOBS_TICK_SECONDS") or 30),
+        )
+        scheduler.start()
+        atexit.register(scheduler.close)
+
+    jobs_cli = AppGroup("jobs", help="Background maintenance jobs.")
+
+    @jobs_cli.command("run")
+    @click.argument("names", nargs=-1)
+    @click.option("--if-due", is_flag=True, help="Skip jobs whose interval has not passed.")
+    def jobs_run_command(names, if_due):
+        """Run the named jobs (default: all) in this process."""
+        unknown = set(names) - {job.name for job in maintenance_jobs}
+        if unknown:
+            raise click.BadParameter(", ".join(sorted(unknown)), param_hint="NAMES")
+        for job in maintenance_jobs:
+            if names and job.name not in names:
+                continue
+            state = run_job(
+                job, jobs_dir, _run_in_app_context, job_settings, force=not if_due
+            )
+            print(json.dumps({job.name: state or "skipped"}, default=str))
+
+    @jobs_cli.command("schedule")
+    def jobs_schedule_command():
+        """Run due jobs until interrupted."""
+        Scheduler(
+            maintenance_jobs,
+            jobs_dir,
+            _run_in_app_context,
+            job_settings,
+            tick=float(os.environ.get("JOBS_TICK_SECONDS") or 30),
+        ).run_forever()
+
+    @jobs_cli.command("status")
+    def jobs_status_command():
+        """Print each job's last run and progress."""
+        print(json.dumps(job_status(maintenance_jobs, jobs_dir), indent=2, default=str))
+
+    app.cli.add_command(jobs_cli)
+
+    if os.environ.get("DB_AUTO_MIGRATE"):
+        # Opt-in for single-process setups; production runs
+        # 'flask --app app migrate' and 'seed' once per deploy instead of
+        # every worker touching the database at import.
+        with app.app_context():
+            migrate_schema()
+            seed_catalog()
+
+    @app.cli.command("migrate")
+    def migrate_command():
+        """Create missing tables, columns and indexes."""
+        migrate_schema()
+        print("schema up to date")
+
+    @app.cli.command("seed")
+    def seed_command():
+        """Insert the default trails when the catalog is empty."""
+        print("seeded" if seed_catalog() else "catalog already populated")
+
+    @app.cli.command("revoke-tokens")
+    @click.argument("email")
+    def revoke_tokens_command(email):
+        """Log EMAIL out everywhere by revoking all of its tokens."""
+        user_id = (
+            db.session.query(User.id).filter_by(email=email.strip().lower()).scalar()
+        )
+        if user_id is None or not _revoke_tokens(user_id):
+            raise click.ClickException(f"no user with email {email}")
+        print(f"tokens of {email} revoked")
 
     @app.route("/api/health", methods=["GET"])
     def health():
         return jsonify(status="ok")
 
+    metrics_token = os.environ.get("METRICS_TOKEN") or ""
+
+    @app.route("/api/metrics", methods=["GET"])
+    def metrics():
+        if metrics_token:
+            expected = f"Bearer {metrics_token}"
+            if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+                abort(401)
+        lines = (
+            render_registry()
+            + pool_metric_lines(db.engine)
+            + cache_metric_lines(cache_store)
+        )
+        body = "\n".join(lines) + "\n"
+        return app.response_class(body, mimetype="text/plain; version=0.0.4")
+
     @app.route("/api/auth/signup", methods=["POST"])
     def signup():
+        _throttle("signup_ip", client_address(request, trusted_proxies))
         payload = request.get_json(silent=True) or {}
         email = (payload.get("email") or "").strip().lower()
         password = payload.get("password") or ""
@@ -385,15 +2129,15 @@ def create_app():
             return jsonify(error="Email é obrigatório"), 400
         if not password or len(password) < 8:
             return jsonify(error="Senha precisa ter pelo menos 8 caracteres"), 400
-        if User.query.filter_by(email=email).first():
+        if db.session.query(User.id).filter_by(email=email).first():
             return jsonify(error="Email já cadastrado"), 409
 
-        is_first_user = User.query.count() == 0
+        is_first_user = db.session.query(User.id).limit(1).scalar() is None
         user = User(
             id=uuid.uuid4().hex,
             email=email,
             name=name or email.split("@")[0],
-            password_hash=generate_password_hash(password),
+            password_hash=password_hasher.hash(password),
             is_admin=is_first_user,
         )
         db.session.add(user)
@@ -411,89 +2155,198 @@ def create_app():
         if not email or not password:
             return jsonify(error="Email e senha são obrigatórios"), 400
 
+        # Both buckets are charged before the lookup and the hash check.
+        _throttle("login_ip", client_address(request, trusted_proxies))
+        _throttle("login_email", email)
+
         user = User.query.filter_by(email=email).first()
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not password_hasher.verify(user.password_hash, password):
             return jsonify(error="Credenciais inválidas"), 401
 
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+
         token = _make_token(user)
-        return jsonify(token=token, user=user.to_public_dict())
+        return jsonify(token=token, user=_public_user(user))
+
+    @app.route("/api/auth/logout-all", methods=["POST"])
+    @require_auth
+    def logout_all():
+        """Revoke every token of the caller, including the one used here."""
+        _revoke_tokens(request.principal.id)
+        return jsonify(status="ok")
 
     @app.route("/api/me", methods=["GET"])
     @require_auth
     def me():
         user = request.current_user
-        return jsonify(user=user.to_public_dict())
+        return jsonify(user=_public_user(user))
 
     @app.route("/api/dashboard", methods=["GET"])
     def dashboard():
-        user = _current_user(optional=True)
-        query = DailyCheckIn.query
-        if user:
-            query = query.filter_by(user_id=user.id)
-        latest = query.order_by(DailyCheckIn.created_at.desc()).first()
-        if latest:
-            try:
-                payload = json.loads(latest.data_json)
-                return jsonify(payload)
-            except Exception:
-                pass
-
-        return jsonify(
-            hero_name="Nome do Herói",
-            level=7,
-            flow_today=78,
-            practice_of_the_day={"title": "Comunicação com o Coração", "duration_minutes": 8},
-            bodies=[
-                {"id": "fisico", "label": "Físico", "value": 85},
-                {"id": "emocional", "label": "Emocional", "value": 72},
-                {"id": "energetico", "label": "Energético", "value": 80},
-                {"id": "mental_inferior", "label": "Mental Inferior", "value": 88},
-                {"id": "mente_superior", "label": "Mente Superior", "value": 65},
-                {"id": "intuitivo", "label": "Intuitivo", "value": 58},
-                {"id": "atmico", "label": "Átmico", "value": 75},
-            ],
-            achievements=[
-                {"id": "escuta_ativa", "title": "Mestre da Escuta Ativa"},
-                {"id": "flow_7_dias", "title": "7 dias em Estado de Flow"},
-            ],
+        principal = _current_principal()
+        pending = write_behind.pending_for(principal.id) if principal and write_behind else {}
+        if ("checkin",) in pending:
+            body = pending[("checkin",)]["data_json"]
+        elif principal:
+            body = (
+                db.session.query(LatestCheckIn.data_json)
+                .filter_by(user_id=principal.id)
+                .scalar()
+            )
+            if body is None:
+                # Users whose last check-in predates the snapshot table.
+                body = (
+                    db.session.query(DailyCheckIn.data_json)
+                    .filter_by(user_id=principal.id)
+                    .order_by(DailyCheckIn.created_at.desc())
+                    .limit(1)
+                    .scalar()
+                )
+        else:
+            body = anonymous_dashboard_cache.get("latest")
+            if body is None:
+                body = (
+                    db.session.query(DailyCheckIn.data_json)
+                    .order_by(DailyCheckIn.created_at.desc())
+                    .limit(1)
+                    .scalar()
+                ) or ""
+                anonymous_dashboard_cache.set("latest", body)
+
+        # Stored check-ins are already serialized JSON, so they are returned
+        # as-is instead of being decoded and re-encoded.
+        return app.response_class(
+            body or default_dashboard_body, mimetype="application/json"
         )
 
     @app.route("/api/checkins", methods=["POST"])
     @require_auth
     def create_checkin():
-        user = request.current_user
+        user = request.principal
         payload = request.get_json(silent=True) or {}
-        db.session.add(
-            DailyCheckIn(
-                id=uuid.uuid4().hex,
-                user_id=user.id,
-                data_json=json.dumps(payload, ensure_ascii=False),
-            )
+        if write_behind is not None:
+            record = {
+                "kind": "checkin",
+                "id": uuid.uuid4().hex,
+                "user_id": user.id,
+                "created_at": datetime.utcnow().isoformat(),
+                "data_json": json.dumps(payload, ensure_ascii=False),
+            }
+            write_behind.submit(record, key=("checkin",))
+            return jsonify(status="ok")
+
+        checkin = DailyCheckIn(
+            id=uuid.uuid4().hex,
+            user_id=user.id,
+            created_at=datetime.utcnow(),
+            data_json=json.dumps(payload, ensure_ascii=False),
+            rolled_up=True,
+        )
+        db.session.add(checkin)
+        accumulate_body_scores(user.id, checkin.created_at.date(), _body_scores(payload))
+        snapshot = {
+            "checkin_id": checkin.id,
+            "created_at": checkin.created_at,
+            "data_json": checkin.data_json,
+        }
+        db.session.execute(
+            _dialect_insert(LatestCheckIn)
+            .values(user_id=user.id, **snapshot)
+            .on_conflict_do_update(index_elements=["user_id"], set_=snapshot)
         )
         db.session.commit()
         return jsonify(status="ok")
 
+    @app.route("/api/checkins/history", methods=["GET"])
+    @require_auth
+    def checkin_history():
+        principal = request.principal
+        granularity = (request.args.get("granularity") or "day").strip().lower()
+        if granularity not in ("day", "week"):
+            return jsonify(error="Granularidade inválida"), 400
+        try:
+            end = date.fromisoformat(request.args.get("to") or date.today().isoformat())
+            start = date.fromisoformat(
+                request.args.get("from") or (end - timedelta(days=29)).isoformat()
+            )
+        except ValueError:
+            return jsonify(error="Datas devem estar no formato AAAA-MM-DD"), 400
+        if start > end or (end - start).days > MAX_HISTORY_RANGE_DAYS:
+            return jsonify(error="Intervalo de datas inválido"), 400
+        if granularity == "week":
+            start -= timedelta(days=start.weekday())
+
+        rows = (
+            db.session.query(
+                BodyScoreRollup.body_id,
+                BodyScoreRollup.label,
+                BodyScoreRollup.period_start,
+                BodyScoreRollup.total,
+                BodyScoreRollup.samples,
+            )
+            .filter(
+                BodyScoreRollup.user_id == principal.id,
+                BodyScoreRollup.period == granularity,
+                BodyScoreRollup.period_start >= start,
+                BodyScoreRollup.period_start <= end,
+            )
+            .order_by(BodyScoreRollup.period_start.asc())
+            .all()
+        )
+        series = {}
+        for body_id, label, period_start, total, samples in rows:
+            item = series.setdefault(body_id, {"id": body_id, "points": []})
+            item["label"] = label
+            item["points"].append(
+                {
+                    "date": period_start.isoformat(),
+                    "value": round(total / samples, 2) if samples else None,
+                    "samples": samples,
+                }
+            )
+        return jsonify(
+            granularity=granularity,
+            start=start.isoformat(),
+            end=end.isoformat(),
+            series=list(series.values()),
+        )
+
     @app.route("/api/trails", methods=["GET"])
     def list_trails():
-        trails = Trail.query.all()
-        user = _current_user(optional=True)
-        enrolled_by_trail = set()
-        if user:
-            enrolled_by_trail = {
-                e.trail_id for e in Enrollment.query.filter_by(user_id=user.id).all()
-            }
-        result = []
-        for t in trails:
-            item = t.to_dict()
-            if user:
-                item["enrolled"] = t.id in enrolled_by_trail
-            result.append(item)
-        return jsonify(trails=result)
+        entry = _catalog_entry(
+            "trails",
+            lambda: [t.to_dict() for t in _load_catalog_trails()],
+            lambda items: {"trails": items},
+        )
+        user = _current_principal()
+        if not user:
+            return _catalog_response(entry.etag, lambda: entry.body, private=False)
+
+        enrolled_by_trail = {
+            trail_id
+            for (trail_id,) in db.session.query(Enrollment.trail_id).filter_by(
+                user_id=user.id
+            )
+        }
+        return _catalog_response(
+            overlay_etag(entry.etag, enrolled_by_trail),
+            lambda: _dump_json(
+                {
+                    "trails": [
+                        dict(item, enrolled=item["id"] in enrolled_by_trail)
+                        for item in entry.items
+                    ]
+                }
+            ),
+            private=True,
+        )
 
     @app.route("/api/trails/<trail_id>/enroll", methods=["POST"])
     @require_auth
     def enroll_trail(trail_id):
-        user = request.current_user
+        user = request.principal
         trail = Trail.query.filter_by(id=trail_id).first()
         if not trail:
             return jsonify(error="Trilha não encontrada"), 404
@@ -508,38 +2361,133 @@ def create_app():
             trail_id=trail_id,
         )
         db.session.add(enrollment)
+        db.session.flush()
+        update_user_snapshot(user.id, enrolled=[trail_id])
         db.session.commit()
         return jsonify(status="ok", enrollment_id=enrollment.id), 201
 
+    def _completed_among(user_id, video_ids):
+        if not user_id or not video_ids:
+            return set()
+        return {
+            video_id
+            for (video_id,) in db.session.query(VideoProgress.video_id).filter(
+                VideoProgress.user_id == user_id, VideoProgress.video_id.in_(video_ids)
+            )
+        }
+
+    def _trail_videos_page(trail_id, principal):
+        limit = _bounded_int_arg("limit", default=50, maximum=MAX_VIDEO_PAGE_SIZE) or 1
+        after = None
+        if request.args.get("cursor"):
+            try:
+                after = decode_video_cursor(request.args["cursor"])
+            except (TypeError, ValueError):
+                return jsonify(error="Cursor inválido"), 400
+        stmt = ordered_videos(trail_id, after).limit(limit + 1)
+        videos = db.session.scalars(stmt).all()
+        has_more = len(videos) > limit
+        videos = videos[:limit]
+        page = {
+            "trail_id": trail_id,
+            "videos": [v.to_dict() for v in videos],
+            "next_cursor": encode_video_cursor(videos[-1]) if has_more else None,
+        }
+        # The ETag covers this page's rows and completions only, so a page
+        # costs the same (and can be revalidated with a 304) however long
+        # the trail is.
+        body = _dump_json(page)
+        etag = hashlib.sha1(body).hexdigest()
+        if not principal:
+            return _catalog_response(etag, lambda: body, private=False)
+
+        completed_ids = _completed_among(principal.id, [v.id for v in videos])
+        return _catalog_response(
+            overlay_etag(etag, completed_ids),
+            lambda: _dump_json(
+                dict(
+                    page,
+                    videos=[
+                        dict(item, completed=item["id"] in completed_ids)
+                        for item in page["videos"]
+                    ],
+                )
+            ),
+            private=True,
+        )
+
+    def _trail_videos_entry(trail_id):
+        return _catalog_entry(
+            f"videos:{trail_id}",
+            lambda: [
+                v.to_dict() for v in db.session.scalars(ordered_videos(trail_id))
+            ],
+            lambda items: {"trail_id": trail_id, "videos": items},
+        )
+
+    def _completed_in_trail(user_id, trail_id):
+        return {
+            video_id
+            for (video_id,) in db.session.query(VideoProgress.video_id).filter_by(
+                user_id=user_id, trail_id=trail_id
+            )
+        }
+
+    def _stream_trail_videos(trail_id, principal):
+        user_id = principal.id if principal else None
+
+        def generate():
+            result = db.session.scalars(
+                ordered_videos(trail_id).execution_options(yield_per=VIDEO_STREAM_CHUNK)
+            )
+            for chunk in result.partitions():
+                completed_ids = _completed_among(user_id, [v.id for v in chunk])
+                lines = []
+                for v in chunk:
+                    item = v.to_dict()
+                    if user_id:
+                        item["completed"] = v.id in completed_ids
+                    lines.append(_dump_json(item) + b"\n")
+                yield b"".join(lines)
+
+        return app.response_class(
+            stream_with_context(generate()), mimetype="application/x-ndjson"
+        )
+
     @app.route("/api/trails/<trail_id>/videos", methods=["GET"])
     def list_trail_videos(trail_id):
-        user = _current_user(optional=True)
-        videos = (
-            VideoLesson.query.filter_by(trail_id=trail_id)
-            .order_by(VideoLesson.position.asc(), VideoLesson.created_at.asc())
-            .all()
+        if (
+            request.args.get("format") == "ndjson"
+            or request.accept_mimetypes.best == "application/x-ndjson"
+        ):
+            return _stream_trail_videos(trail_id, _current_principal())
+        if "limit" in request.args or "cursor" in request.args:
+            return _trail_videos_page(trail_id, _current_principal())
+
+        entry = _trail_videos_entry(trail_id)
+        user = _current_principal()
+        if not user:
+            return _catalog_response(entry.etag, lambda: entry.body, private=False)
+
+        completed_ids = _completed_in_trail(user.id, trail_id)
+        return _catalog_response(
+            overlay_etag(entry.etag, completed_ids),
+            lambda: _dump_json(
+                {
+                    "trail_id": trail_id,
+                    "videos": [
+                        dict(item, completed=item["id"] in completed_ids)
+                        for item in entry.items
+                    ],
+                }
+            ),
+            private=True,
         )
-        completed_ids = set()
-        if user:
-            completed_ids = {
-                vp.video_id
-                for vp in VideoProgress.query.filter_by(
-                    user_id=user.id, trail_id=trail_id
-                ).all()
-            }
-        payload_videos = []
-        for v in videos:
-            item = v.to_dict()
-            if user:
-                item["completed"] = v.id in completed_ids
-            payload_videos.append(item)
-        return jsonify(trail_id=trail_id, videos=payload_videos)
 
     @app.route("/api/trails/<trail_id>/videos", methods=["POST"])
     @require_admin
     def create_trail_video(trail_id):
-        trail = Trail.query.filter_by(id=trail_id).first()
-        if not trail:
+        if db.session.query(Trail.id).filter_by(id=trail_id).first() is None:
             return jsonify(error="Trilha não encontrada"), 404
 
         payload = request.get_json(silent=True) or {}
@@ -559,12 +2507,18 @@ def create_app():
             else:
                 provider = "external"
 
-        max_position = (
-            db.session.query(db.func.max(VideoLesson.position))
-            .filter_by(trail_id=trail_id)
-            .scalar()
-        )
-        next_position = int(max_position or 0) + 1
+        # Claims the position and counts the lesson in one row update, which
+        # also serializes concurrent inserts into the same trail.
+        next_position = db.session.execute(
+            update(Trail)
+            .where(Trail.id == trail_id)
+            .values(
+                next_position=Trail.next_position + 1,
+                video_count=Trail.video_count + 1,
+            )
+            .returning(Trail.next_position)
+            .execution_options(synchronize_session=False)
+        ).scalar_one() - 1
 
         video = VideoLesson(
             id=uuid.uuid4().hex,
@@ -577,73 +2531,232 @@ def create_app():
         )
         db.session.add(video)
         db.session.commit()
+        _bump_catalog_version()
 
         return jsonify(video=video.to_dict()), 201
 
     @app.route("/api/videos/<video_id>/complete", methods=["POST"])
     @require_auth
     def complete_video(video_id):
-        user = request.current_user
-        video = VideoLesson.query.filter_by(id=video_id).first()
-        if not video:
+        principal = request.principal
+        trail_id = (
+            db.session.query(VideoLesson.trail_id).filter_by(id=video_id).scalar()
+        )
+        if trail_id is None:
             return jsonify(error="Vídeo não encontrado"), 404
 
-        existing = VideoProgress.query.filter_by(user_id=user.id, video_id=video_id).first()
-        if existing:
-            return jsonify(status="ok", user=user.to_public_dict())
+        if write_behind is not None:
+            already_done = video_id in _pending_completions(principal.id) or (
+                db.session.query(VideoProgress.id)
+                .filter_by(user_id=principal.id, video_id=video_id)
+                .first()
+                is not None
+            )
+            if not already_done:
+                record = {
+                    "kind": "completion",
+                    "id": uuid.uuid4().hex,
+                    "user_id": principal.id,
+                    "video_id": video_id,
+                    "trail_id": trail_id,
+                    "completed_at": datetime.utcnow().isoformat(),
+                }
+                write_behind.submit(record, key=("completion", video_id))
+        elif record_video_completion(principal.id, video_id, trail_id, date.today()):
+            db.session.commit()
+            leaderboard.record(principal.id, trail_id, XP_PER_VIDEO)
+        else:
+            db.session.rollback()
 
-        xp_awarded = 10
-        progress = VideoProgress(
-            id=uuid.uuid4().hex,
-            user_id=user.id,
-            video_id=video_id,
-            trail_id=video.trail_id,
-            xp_awarded=xp_awarded,
+        user = request.current_user
+        return jsonify(status="ok", user=_public_user(user))
+
+    @app.route("/api/videos/completions", methods=["POST"])
+    @require_auth
+    def complete_videos_batch():
+        principal = request.principal
+        payload = request.get_json(silent=True) or {}
+        items = payload.get("completions")
+        if not isinstance(items, list):
+            return jsonify(error="Lista de conclusões é obrigatória"), 400
+        if len(items) > MAX_BATCH_COMPLETIONS:
+            message = f"Máximo de {MAX_BATCH_COMPLETIONS} conclusões por envio"
+            return jsonify(error=message), 400
+
+        now = datetime.utcnow()
+        completed_at_by_video = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            video_id = str(item.get("video_id") or "").strip()
+            if not video_id:
+                continue
+            completed_at = _parse_client_timestamp(item.get("completed_at"), now)
+            previous = completed_at_by_video.get(video_id)
+            if previous is None or completed_at < previous:
+                completed_at_by_video[video_id] = completed_at
+
+        recorded, already_completed, unknown = record_video_completions(
+            principal.id, completed_at_by_video
         )
-        db.session.add(progress)
+        db.session.commit()
+        for trail_id in recorded.values():
+            leaderboard.record(principal.id, trail_id, XP_PER_VIDEO)
 
-        today = date.today()
-        if user.last_activity_date == today:
-            pass
-        elif user.last_activity_date == (today - timedelta(days=1)):
-            user.streak = int(user.streak or 0) + 1
-        else:
-            user.streak = 1
-        user.last_activity_date = today
-        user.xp = int(user.xp or 0) + xp_awarded
+        user = request.current_user
+        return jsonify(
+            status="ok",
+            recorded=list(recorded),
+            already_completed=already_completed,
+            unknown=unknown,
+            user=_public_user(user),
+        )
 
-        db.session.add(user)
-        db.session.commit()
+    @app.route("/api/leaderboard", methods=["GET"])
+    def leaderboard_top():
+        trail_id = (request.args.get("trail_id") or "").strip() or None
+        limit = _bounded_int_arg("limit", default=10, maximum=MAX_LEADERBOARD_LIMIT)
+        index = _leaderboard_index(trail_id)
+        if index is None:
+            return jsonify(error="Trilha não encontrada"), 404
+        return jsonify(
+            scope=trail_id or "global",
+            total=len(index),
+            entries=_leaderboard_entries(index.top(limit)),
+        )
 
-        return jsonify(status="ok", user=user.to_public_dict())
+    @app.route("/api/leaderboard/me", methods=["GET"])
+    @require_auth
+    def leaderboard_me():
+        principal = request.principal
+        trail_id = (request.args.get("trail_id") or "").strip() or None
+        neighbors = _bounded_int_arg("neighbors", default=2, maximum=25)
+        index = _leaderboard_index(trail_id)
+        if index is None:
+            return jsonify(error="Trilha não encontrada"), 404
+        return jsonify(
+            scope=trail_id or "global",
+            total=len(index),
+            rank=index.rank(principal.id),
+            xp=index.score(principal.id) or 0,
+            entries=_leaderboard_entries(
+                index.around(principal.id, neighbors), me=principal.id
+            ),
+        )
 
     @app.route("/api/progress", methods=["GET"])
     @require_auth
     def progress():
         user = request.current_user
-        enrollments = Enrollment.query.filter_by(user_id=user.id).all()
-        enrolled_trails = [e.trail_id for e in enrollments]
+        enrolled_trails = [
+            trail_id
+            for (trail_id,) in db.session.query(Enrollment.trail_id).filter_by(
+                user_id=user.id
+            )
+        ]
+
+        completed_by_trail = dict(
+            db.session.query(VideoProgress.trail_id, db.func.count(VideoProgress.id))
+            .filter_by(user_id=user.id)
+            .group_by(VideoProgress.trail_id)
+            .all()
+        )
+        for record in _pending_completions(user.id).values():
+            completed_by_trail[record["trail_id"]] = (
+                completed_by_trail.get(record["trail_id"], 0) + 1
+            )
+        total_completed = sum(completed_by_trail.values())
 
-        total_completed = VideoProgress.query.filter_by(user_id=user.id).count()
+        totals_by_trail = {}
+        if enrolled_trails:
+            totals_by_trail = dict(
+                db.session.query(Trail.id, Trail.video_count).filter(
+                    Trail.id.in_(enrolled_trails)
+                )
+            )
 
         per_trail = {}
         for trail_id in enrolled_trails:
-            total_videos = VideoLesson.query.filter_by(trail_id=trail_id).count()
-            completed_videos = VideoProgress.query.filter_by(
-                user_id=user.id, trail_id=trail_id
-            ).count()
             per_trail[trail_id] = {
-                "total_videos": total_videos,
-                "completed_videos": completed_videos,
+                "total_videos": int(totals_by_trail.get(trail_id, 0)),
+                "completed_videos": int(completed_by_trail.get(trail_id, 0)),
             }
 
         return jsonify(
-            user=user.to_public_dict(),
+            user=_public_user(user),
             enrolled_trails=enrolled_trails,
             completed_videos=total_completed,
             per_trail=per_trail,
         )
 
+    @app.route("/api/bootstrap", methods=["GET"])
+    @require_auth
+    def bootstrap():
+        """User, progress and trails for app launch, from the user's snapshot."""
+        principal = request.principal
+        data_json = (
+            db.session.query(UserSnapshot.data_json)
+            .filter_by(user_id=principal.id)
+            .scalar()
+        )
+        if data_json is not None:
+            snapshot = json.loads(data_json)
+        else:
+            snapshot = update_user_snapshot(principal.id)
+            if snapshot is None:
+                # The token's user no longer exists.
+                return jsonify(error="Não autorizado"), 401
+            db.session.commit()
+
+        user = snapshot["user"]
+        pending = _pending_completions(principal.id)
+        if pending:
+            user["xp"] = int(user["xp"] or 0) + XP_PER_VIDEO * len(pending)
+            last_activity = snapshot["last_activity_date"]
+            _, user["streak"] = _advance_streak(
+                date.fromisoformat(last_activity) if last_activity else None,
+                int(user["streak"] or 0),
+                [
+                    datetime.fromisoformat(r["completed_at"])
+                    .replace(tzinfo=timezone.utc)
+                    .astimezone()
+                    .date()
+                    for r in pending.values()
+                ],
+            )
+            _add_completions(
+                snapshot,
+                db.session.query(VideoLesson.trail_id, VideoLesson.position).filter(
+                    VideoLesson.id.in_(list(pending))
+                ),
+            )
+
+        entry = _catalog_entry(
+            "trails",
+            lambda: [t.to_dict() for t in _load_catalog_trails()],
+            lambda items: {"trails": items},
+        )
+        enrolled = set(snapshot["enrolled"])
+        totals = {item["id"]: item["video_count"] for item in entry.items}
+        completed = snapshot["completed"]
+        per_trail = {}
+        for trail_id in snapshot["enrolled"]:
+            stats = completed.get(trail_id) or {"count": 0, "bitmap": ""}
+            per_trail[trail_id] = {
+                "total_videos": int(totals.get(trail_id, 0)),
+                "completed_videos": stats["count"],
+                "completed_bitmap": stats["bitmap"],
+            }
+
+        response: BootstrapResponse = {
+            "user": user,
+            "enrolled_trails": snapshot["enrolled"],
+            "completed_videos": sum(s["count"] for s in completed.values()),
+            "per_trail": per_trail,
+            "trails": [dict(item, enrolled=item["id"] in enrolled) for item in entry.items],
+        }
+        return jsonify(response)
+
     @app.route("/api/admin/trails", methods=["POST"])
     @require_admin
     def admin_create_trail():
@@ -690,8 +2803,34 @@ def create_app():
                 )
 
         db.session.commit()
+        _bump_catalog_version()
         return jsonify(trail=trail.to_dict()), 201
 
+    @app.route("/api/admin/catalog/import", methods=["POST"])
+    @require_admin
+    def admin_import_catalog():
+        fmt = detect_format(request.args.get("format"), request.content_type)
+        chunk_size = _bounded_int_arg(
+            "chunk_size", default=IMPORT_CHUNK_SIZE, maximum=MAX_IMPORT_CHUNK_SIZE
+        )
+        stats, errors = import_catalog(
+            iter_raw_records(request.stream, fmt), chunk_size=chunk_size
+        )
+        _bump_catalog_version()
+        return jsonify(status="ok", **stats, errors=errors)
+
+    @app.route("/api/admin/catalog/export", methods=["GET"])
+    @require_admin
+    def admin_export_catalog():
+        fmt = detect_format(request.args.get("format"), None)
+        return app.response_class(
+            stream_with_context(serialize_records(iter_catalog_records(), fmt)),
+            mimetype="text/csv" if fmt == "csv" else "application/x-ndjson",
+            headers={
+                "Content-Disposition": f"attachment; filename=catalog.{fmt}",
+            },
+        )
+
     return app
 
 
@@ -699,5 +2838,8 @@ app = create_app()
 
 
 if __name__ == "__main__":
+    with app.app_context():
+        migrate_schema()
+        seed_catalog()
     port = int(os.environ.get("PORT", "8000"))
     app.run(host="0.0.0.0", port=port)
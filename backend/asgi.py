@@ -0,0 +1,519 @@
+"""ASGI entry point: async handlers for the read-heavy routes.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:application --workers 4
+
+GET /api/health, /api/me, /api/dashboard, /api/trails,
+/api/trails/<id>/videos (full list, ?limit/cursor pages and NDJSON) and
+/api/progress run as coroutines on an async engine, so a request waiting
+on the database holds no thread. They return the same bodies, status
+codes, caching headers and gzip/brotli encoding (the Flask app's
+Compressor, see encoding.py) as the Flask views in app.py. Lookups in the
+shared cache store (SQLite or Redis, both blocking) run in the thread
+pool. Every other route is passed to the Flask app through a WSGI
+adapter, so one process serves the whole API.
+
+REQUEST_INSTRUMENTATION and PROFILE_SLOW_REQUEST_MS (instrumentation.py)
+only cover the Flask routes; the native routes above are not timed,
+counted or profiled.
+
+The async engine uses DATABASE_URL with its async driver (asyncpg or
+aiosqlite; ASYNC_DATABASE_URL overrides) and the DB_* pool settings from
+dbconfig.
+"""
+
+import functools
+import hashlib
+import os
+import time
+
+try:
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.middleware import Middleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.responses import Response, StreamingResponse
+    from starlette.routing import Mount, Route
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+except ImportError as exc:  # pragma: no cover - optional dependency
+    raise ImportError(
+        "ASGI mode needs the packages in requirements-asgi.txt "
+        "(starlette, uvicorn, sqlalchemy[asyncio], asyncpg/aiosqlite)"
+    ) from exc
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # pragma: no cover - starlette's deprecated adapter
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import jwt
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+import app as flask_module
+from app import (
+    DEFAULT_DASHBOARD,
+    MAX_VIDEO_PAGE_SIZE,
+    VIDEO_STREAM_CHUNK,
+    CatalogEntry,
+    DailyCheckIn,
+    Enrollment,
+    LatestCheckIn,
+    TTLCache,
+    Trail,
+    User,
+    VideoProgress,
+    decode_video_cursor,
+    encode_video_cursor,
+    ordered_videos,
+    overlay_etag,
+    pending_completions,
+    public_user_with_pending,
+)
+from dbconfig import async_database_url, async_engine_options, configure_engine
+from encoding import COMPRESSIBLE_MIMETYPES
+
+flask_app = flask_module.app
+database_url = async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"])
+engine = create_async_engine(database_url, **async_engine_options(database_url))
+configure_engine(engine.sync_engine)
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+auth_stateless = flask_app.config["AUTH_MODE"] == "stateless"
+token_cache = TTLCache(
+    maxsize=int(os.environ.get("AUTH_TOKEN_CACHE_SIZE") or 4096),
+    ttl=float(os.environ.get("AUTH_TOKEN_CACHE_TTL_SECONDS") or 300),
+)
+# Shared with the mounted Flask app, and through the cache store with
+# every other worker (see cache.py).
+token_version_cache = flask_app.extensions["token_version_cache"]
+catalog_cache = flask_app.extensions["catalog_cache"]
+compressor = flask_app.extensions.get("compressor")
+# Writes go through the mounted Flask app, so with WRITE_BEHIND its buffer
+# holds this process's acknowledged but unflushed writes; reads merge them.
+write_behind = flask_app.extensions.get("write_behind")
+anonymous_dashboard_cache = TTLCache(
+    maxsize=1, ttl=float(os.environ.get("DASHBOARD_ANON_CACHE_TTL_SECONDS") or 10)
+)
+
+
+def _dump_json(payload):
+    return flask_app.json.dumps(payload).encode("utf-8")
+
+
+def json_response(payload, status_code=200):
+    # jsonify() appends a newline; keep byte-for-byte parity with it.
+    return Response(
+        _dump_json(payload) + b"\n", status_code=status_code, media_type="application/json"
+    )
+
+
+def unauthorized():
+    return json_response({"error": "Não autorizado"}, 401)
+
+
+default_dashboard_body = _dump_json(DEFAULT_DASHBOARD)
+
+
+class Principal:
+    __slots__ = ("id", "is_admin", "user")
+
+    def __init__(self, user_id, is_admin, user=None):
+        self.id = user_id
+        self.is_admin = is_admin
+        self.user = user
+
+
+def _decode_token(token):
+    now = time.time()
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims if claims.get("exp", 0) > now else None
+    try:
+        claims = jwt.decode(token, flask_app.config["SECRET_KEY"], algorithms=["HS256"])
+    except Exception:
+        return None
+    if not claims.get("sub"):
+        return None
+    token_cache.set(token, claims, ttl=min(token_cache.ttl, claims.get("exp", now) - now))
+    return claims
+
+
+async def current_principal(request, session, need_user=False):
+    auth_header = request.headers.get("authorization") or ""
+    if not auth_header.lower().startswith("bearer "):
+        return None
+    token = auth_header.split(" ", 1)[1].strip()
+    claims = _decode_token(token) if token else None
+    if not claims:
+        return None
+
+    user_id = claims["sub"]
+    token_version = int(claims.get("ver") or 0)
+    if auth_stateless and "adm" in claims and not need_user:
+        # Same (token_version, is_admin) entries as the Flask app's.
+        state = await run_in_threadpool(token_version_cache.get, str(user_id))
+        if state is None:
+            row = (
+                await session.execute(
+                    select(User.token_version, User.is_admin).where(User.id == user_id)
+                )
+            ).first()
+            if row is None:
+                return None
+            state = (int(row.token_version or 0), bool(row.is_admin))
+            await run_in_threadpool(token_version_cache.set, str(user_id), state)
+        if state[0] != token_version:
+            return None
+        return Principal(user_id, state[1])
+
+    user = await session.get(User, user_id)
+    if not user or int(user.token_version or 0) != token_version:
+        return None
+    return Principal(user.id, user.is_admin, user)
+
+
+async def _catalog_entry(session, key, build_items, wrap):
+    cached = await run_in_threadpool(catalog_cache.get, key)
+    if cached is not None:
+        return CatalogEntry(*cached)
+
+    version = await run_in_threadpool(catalog_cache.version)
+    items = await build_items(session)
+    body = _dump_json(wrap(items))
+    entry = CatalogEntry(items=items, body=body, etag=hashlib.sha1(body).hexdigest())
+    await run_in_threadpool(catalog_cache.set, key, tuple(entry), version=version)
+    return entry
+
+
+def _catalog_response(request, etag, build_body, private):
+    headers = {
+        "ETag": quote_etag(etag),
+        "Cache-Control": "private, no-cache" if private else "public, no-cache",
+        "Vary": "Authorization",
+    }
+    if parse_etags(request.headers.get("if-none-match")).contains_weak(etag):
+        return Response(status_code=304, headers=headers)
+    response = Response(build_body(), media_type="application/json", headers=headers)
+    if not private:
+        # As in app.py: shared bodies are compressed once per ETag.
+        response.cache_key = etag
+    return response
+
+
+def compressed(endpoint):
+    """Compress the endpoint's buffered responses like encoding.init_app."""
+    if compressor is None:
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        response = await endpoint(request)
+        if isinstance(response, StreamingResponse) or (
+            response.media_type not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+        response.headers.add_vary_header("Accept-Encoding")
+        if response.status_code != 200 or "content-encoding" in response.headers:
+            return response
+        encoding = compressor.choose(parse_accept_header(request.headers.get("accept-encoding")))
+        if encoding is None:
+            return response
+        body = await run_in_threadpool(
+            compressor.encode, response.body, encoding, getattr(response, "cache_key", None)
+        )
+        if body is None:
+            return response
+        response.body = body
+        response.headers["content-length"] = str(len(body))
+        response.headers["content-encoding"] = encoding
+        etag = response.headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # A different representation of the same entity.
+            response.headers["etag"] = "W/" + etag
+        return response
+
+    return wrapper
+
+
+async def _completed_among(session, user_id, video_ids):
+    if not user_id or not video_ids:
+        return set()
+    rows = await session.scalars(
+        select(VideoProgress.video_id).where(
+            VideoProgress.user_id == user_id, VideoProgress.video_id.in_(video_ids)
+        )
+    )
+    return set(rows)
+
+
+async def health(request):
+    return json_response({"status": "ok"})
+
+
+async def me(request):
+    async with Session() as session:
+        principal = await current_principal(request, session, need_user=True)
+        if not principal:
+            return unauthorized()
+        user = principal.user
+        pending = pending_completions(write_behind, user.id)
+        return json_response({"user": public_user_with_pending(user, pending)})
+
+
+async def dashboard(request):
+    async with Session() as session:
+        principal = await current_principal(request, session)
+        pending = write_behind.pending_for(principal.id) if principal and write_behind else {}
+        if ("checkin",) in pending:
+            body = pending[("checkin",)]["data_json"]
+        elif principal:
+            body = await session.scalar(
+                select(LatestCheckIn.data_json).where(LatestCheckIn.user_id == principal.id)
+            )
+            if body is None:
+                body = await session.scalar(
+                    select(DailyCheckIn.data_json)
+                    .where(DailyCheckIn.user_id == principal.id)
+                    .order_by(DailyCheckIn.created_at.desc())
+                    .limit(1)
+                )
+        else:
+            body = anonymous_dashboard_cache.get("latest")
+            if body is None:
+                body = (
+                    await session.scalar(
+                        select(DailyCheckIn.data_json)
+                        .order_by(DailyCheckIn.created_at.desc())
+                        .limit(1)
+                    )
+                ) or ""
+                anonymous_dashboard_cache.set("latest", body)
+    return Response(body or default_dashboard_body, media_type="application/json")
+
+
+async def _load_catalog_trails(session):
+    trails = await session.scalars(select(Trail).options(selectinload(Trail.modules)))
+    return [t.to_dict() for t in trails]
+
+
+async def list_trails(request):
+    async with Session() as session:
+        entry = await _catalog_entry(
+            session, "trails", _load_catalog_trails, lambda items: {"trails": items}
+        )
+        principal = await current_principal(request, session)
+        if not principal:
+            return _catalog_response(request, entry.etag, lambda: entry.body, private=False)
+        enrolled = set(
+            await session.scalars(
+                select(Enrollment.trail_id).where(Enrollment.user_id == principal.id)
+            )
+        )
+    return _catalog_response(
+        request,
+        overlay_etag(entry.etag, enrolled),
+        lambda: _dump_json(
+            {"trails": [dict(item, enrolled=item["id"] in enrolled) for item in entry.items]}
+        ),
+        private=True,
+    )
+
+
+def _bounded_int_arg(request, name, default, maximum):
+    try:
+        value = int(request.query_params.get(name) or default)
+    except ValueError:
+        value = default
+    return max(0, min(value, maximum))
+
+
+async def _trail_videos_page(request, session, trail_id, principal):
+    limit = _bounded_int_arg(request, "limit", default=50, maximum=MAX_VIDEO_PAGE_SIZE) or 1
+    after = None
+    if request.query_params.get("cursor"):
+        try:
+            after = decode_video_cursor(request.query_params["cursor"])
+        except (TypeError, ValueError):
+            return json_response({"error": "Cursor inválido"}, 400)
+    videos = (await session.scalars(ordered_videos(trail_id, after).limit(limit + 1))).all()
+    has_more = len(videos) > limit
+    videos = videos[:limit]
+    page = {
+        "next_cursor": encode_video_cursor(videos[-1]) if has_more else None,
+        "trail_id": trail_id,
+        "videos": [v.to_dict() for v in videos],
+    }
+    # Same page-scoped ETag as the Flask app.
+    body = _dump_json(page)
+    etag = hashlib.sha1(body).hexdigest()
+    if not principal:
+        return _catalog_response(request, etag, lambda: body, private=False)
+    completed_ids = await _completed_among(session, principal.id, [v.id for v in videos])
+    return _catalog_response(
+        request,
+        overlay_etag(etag, completed_ids),
+        lambda: _dump_json(
+            dict(
+                page,
+                videos=[
+                    dict(item, completed=item["id"] in completed_ids)
+                    for item in page["videos"]
+                ],
+            )
+        ),
+        private=True,
+    )
+
+
+async def _trail_videos_entry(session, trail_id):
+    async def build_items(session):
+        videos = await session.scalars(ordered_videos(trail_id))
+        return [v.to_dict() for v in videos]
+
+    return await _catalog_entry(
+        session,
+        f"videos:{trail_id}",
+        build_items,
+        lambda items: {"trail_id": trail_id, "videos": items},
+    )
+
+
+async def _completed_in_trail(session, user_id, trail_id):
+    return set(
+        await session.scalars(
+            select(VideoProgress.video_id).where(
+                VideoProgress.user_id == user_id, VideoProgress.trail_id == trail_id
+            )
+        )
+    )
+
+
+def _stream_trail_videos(trail_id, user_id):
+    async def generate():
+        async with Session() as session:
+            result = await session.stream_scalars(
+                ordered_videos(trail_id).execution_options(yield_per=VIDEO_STREAM_CHUNK)
+            )
+            async for chunk in result.partitions():
+                completed_ids = await _completed_among(session, user_id, [v.id for v in chunk])
+                lines = []
+                for v in chunk:
+                    item = v.to_dict()
+                    if user_id:
+                        item["completed"] = v.id in completed_ids
+                    lines.append(_dump_json(item) + b"\n")
+                yield b"".join(lines)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+async def list_trail_videos(request):
+    trail_id = request.path_params["trail_id"]
+    async with Session() as session:
+        principal = await current_principal(request, session)
+        if (
+            request.query_params.get("format") == "ndjson"
+            or request.headers.get("accept", "").startswith("application/x-ndjson")
+        ):
+            return _stream_trail_videos(trail_id, principal.id if principal else None)
+        if "limit" in request.query_params or "cursor" in request.query_params:
+            return await _trail_videos_page(request, session, trail_id, principal)
+
+        entry = await _trail_videos_entry(session, trail_id)
+        if not principal:
+            return _catalog_response(request, entry.etag, lambda: entry.body, private=False)
+        completed_ids = await _completed_in_trail(session, principal.id, trail_id)
+    return _catalog_response(
+        request,
+        overlay_etag(entry.etag, completed_ids),
+        lambda: _dump_json(
+            {
+                "trail_id": trail_id,
+                "videos": [
+                    dict(item, completed=item["id"] in completed_ids) for item in entry.items
+                ],
+            }
+        ),
+        private=True,
+    )
+
+
+async def progress(request):
+    async with Session() as session:
+        principal = await current_principal(request, session, need_user=True)
+        if not principal:
+            return unauthorized()
+        user = principal.user
+        enrolled_trails = list(
+            await session.scalars(
+                select(Enrollment.trail_id).where(Enrollment.user_id == user.id)
+            )
+        )
+        completed_by_trail = dict(
+            (
+                await session.execute(
+                    select(VideoProgress.trail_id, func.count(VideoProgress.id))
+                    .where(VideoProgress.user_id == user.id)
+                    .group_by(VideoProgress.trail_id)
+                )
+            ).all()
+        )
+        totals_by_trail = {}
+        if enrolled_trails:
+            totals_by_trail = dict(
+                (
+                    await session.execute(
+                        select(Trail.id, Trail.video_count).where(
+                            Trail.id.in_(enrolled_trails)
+                        )
+                    )
+                ).all()
+            )
+
+    pending = pending_completions(write_behind, user.id)
+    for record in pending.values():
+        completed_by_trail[record["trail_id"]] = completed_by_trail.get(record["trail_id"], 0) + 1
+    per_trail = {
+        trail_id: {
+            "total_videos": int(totals_by_trail.get(trail_id, 0)),
+            "completed_videos": int(completed_by_trail.get(trail_id, 0)),
+        }
+        for trail_id in enrolled_trails
+    }
+    return json_response(
+        {
+            "user": public_user_with_pending(user, pending),
+            "enrolled_trails": enrolled_trails,
+            "completed_videos": sum(completed_by_trail.values()),
+            "per_trail": per_trail,
+        }
+    )
+
+
+application = Starlette(
+    routes=[
+        Route("/api/health", compressed(health), methods=["GET"]),
+        Route("/api/me", compressed(me), methods=["GET"]),
+        Route("/api/dashboard", compressed(dashboard), methods=["GET"]),
+        Route("/api/trails", compressed(list_trails), methods=["GET"]),
+        Route(
+            "/api/trails/{trail_id}/videos", compressed(list_trail_videos), methods=["GET"]
+        ),
+        Route("/api/progress", compressed(progress), methods=["GET"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    # Same open policy as CORS(app) in create_app; for mounted Flask routes
+    # the headers flask-cors sets are simply overwritten with equal values.
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_methods=["*"],
+            allow_headers=["*"],
+            expose_headers=["ETag"],
+        )
+    ],
+    on_shutdown=[engine.dispose],
+)
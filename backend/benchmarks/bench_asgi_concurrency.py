@@ -0,0 +1,219 @@
+"""Compare the sync (gunicorn) and ASGI (uvicorn) serving modes under load.
+
+Usage (from backend/, with requirements-asgi.txt installed):
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/datagen.py --users 10000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/bench_asgi_concurrency.py \\
+        [--clients 1000] [--duration 30] [--workers 4] [--threads 8] [--output out.json]
+
+Starts each server in turn on the same database, then opens --clients
+keep-alive connections from an asyncio client. Every client loops over
+the read routes (dashboard, progress, me, trails) with its own token for
+--duration seconds. Reports requests/sec, p50/p99 latency and errors per
+mode; a mode whose server fails to start is reported as skipped.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import common
+import datagen
+import loadgen
+
+ROUTES = ("/api/dashboard", "/api/progress", "/api/me", "/api/trails")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url + "/api/health", timeout=2):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _server_command(mode, port, args):
+    if mode == "sync":
+        return [
+            sys.executable, "-m", "gunicorn", "app:app",
+            "--bind", f"127.0.0.1:{port}",
+            "--workers", str(args.workers),
+            "--threads", str(args.threads),
+            "--worker-class", "gthread",
+            "--backlog", str(max(2048, args.clients * 2)),
+        ]  # fmt: skip
+    return [
+        sys.executable, "-m", "uvicorn", "asgi:application",
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--workers", str(args.workers),
+        "--backlog", str(max(2048, args.clients * 2)),
+        "--no-access-log",
+    ]  # fmt: skip
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get("content-length") or 0))
+    return status, headers.get("connection", "").lower() == "close"
+
+
+async def _client(port, token, deadline, latencies, errors, index):
+    reader = writer = None
+    route_index = index
+    while time.monotonic() < deadline:
+        path = ROUTES[route_index % len(ROUTES)]
+        route_index += 1
+        request = (
+            f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+            f"Authorization: Bearer {token}\r\nConnection: keep-alive\r\n\r\n"
+        ).encode("ascii")
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            await writer.drain()
+            status, closed = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        if status >= 400:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+        if closed:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _drive(port, tokens, clients, duration):
+    latencies, errors = [], {}
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _client(port, tokens[i % len(tokens)], deadline, latencies, errors, i)
+            for i in range(clients)
+        )
+    )
+    wall = time.perf_counter() - start
+    latencies.sort()
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(latencies),
+        "requests_per_s": round(len(latencies) / wall, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+        "errors": errors,
+    }
+
+
+def run_mode(mode, args):
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, AUTH_MODE=os.environ.get("AUTH_MODE") or "stateless")
+    process = subprocess.Popen(
+        _server_command(mode, port, args),
+        cwd=common.BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        if not _wait_until_up(url, process):
+            process.kill()
+            message = process.stderr.read().decode("utf-8", "replace")[-500:]
+            return {"skipped": message.strip() or "server did not start"}
+        client = loadgen.Client(url)
+        count = min(args.clients, args.login_users)
+        tokens = [
+            loadgen.login(client, datagen.user_email(i)) for i in range(1, count + 1)
+        ]
+        # Warm caches and pools before measuring.
+        asyncio.run(_drive(port, tokens, min(args.clients, 50), 2))
+        return asyncio.run(_drive(port, tokens, args.clients, args.duration))
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--login-users", type=int, default=200)
+    parser.add_argument("--modes", default="sync,asgi")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = args.clients * 2 + 256
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+    # Schema and seed data; the load itself expects datagen.py to have run.
+    common.load_app_module()
+    results = {
+        "clients": args.clients,
+        "duration_s": args.duration,
+        "workers": args.workers,
+        "database": os.environ["DATABASE_URL"],
+    }
+    for mode in args.modes.split(","):
+        results[mode] = run_mode(mode, args)
+        print(mode, json.dumps(results[mode]), file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Bulk catalog import/export throughput and memory.
+
+Usage (from backend/):
+
+    python benchmarks/bench_catalog_import.py [--videos 100000] [--trails 100]
+        [--chunk-size 1000]
+
+Writes a JSON-lines catalog to a temporary file, streams it into
+POST /api/admin/catalog/import, then streams GET /api/admin/catalog/export
+back out. Reports wall time, rows/sec and the process's peak RSS, which
+should stay bounded by the chunk size rather than the file size.
+"""
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+import uuid
+
+from common import auth_headers, load_app_module
+
+
+def _write_catalog(path, trails, videos):
+    with open(path, "w", encoding="utf-8") as handle:
+        for t in range(trails):
+            handle.write(
+                json.dumps(
+                    {
+                        "type": "trail",
+                        "id": f"bulk-{t}",
+                        "title": f"Trilha em massa {t}",
+                        "format": "Microlearning",
+                        "duration_weeks_min": 1,
+                        "duration_weeks_max": 4,
+                    }
+                )
+                + "\n"
+            )
+            for position in range(4):
+                handle.write(
+                    json.dumps(
+                        {
+                            "type": "module",
+                            "trail_id": f"bulk-{t}",
+                            "name": f"Módulo {position}",
+                            "position": position,
+                        }
+                    )
+                    + "\n"
+                )
+        for v in range(videos):
+            handle.write(
+                json.dumps(
+                    {
+                        "type": "video",
+                        "trail_id": f"bulk-{v % trails}",
+                        "title": f"Aula {v}",
+                        "url": f"https://example.com/videos/{v}",
+                        "duration_minutes": 5,
+                        "position": v // trails,
+                    }
+                )
+                + "\n"
+            )
+
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux.
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=100_000)
+    parser.add_argument("--trails", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    app_module = load_app_module()
+    client = app_module.app.test_client()
+    body = client.post(
+        "/api/auth/signup",
+        json={"email": f"bulk-{uuid.uuid4().hex[:8]}@example.com", "password": "benchmark"},
+    ).get_json()
+    if not body["user"]["is_admin"]:
+        raise SystemExit("benchmark needs an empty database (first user is admin)")
+    headers = auth_headers(body["token"])
+
+    path = os.path.join(tempfile.mkdtemp(prefix="catalog-"), "catalog.jsonl")
+    _write_catalog(path, args.trails, args.videos)
+    size_mb = os.path.getsize(path) / 1_000_000
+    rss_before = _peak_rss_mb()
+
+    start = time.perf_counter()
+    with open(path, "rb") as handle:
+        response = client.post(
+            f"/api/admin/catalog/import?chunk_size={args.chunk_size}",
+            headers=headers,
+            data=handle,
+            content_type="application/x-ndjson",
+        )
+    import_s = time.perf_counter() - start
+    import_peak = _peak_rss_mb()
+    result = response.get_json()
+
+    start = time.perf_counter()
+    exported = 0
+    response = client.get("/api/admin/catalog/export", headers=headers, buffered=False)
+    for chunk in response.response:
+        exported += chunk.count(b"\n")
+    export_s = time.perf_counter() - start
+
+    print(
+        json.dumps(
+            {
+                "file_mb": round(size_mb, 1),
+                "processed": result["processed"],
+                "errors": result["error_count"],
+                "import_s": round(import_s, 2),
+                "import_rows_per_sec": round(result["processed"] / import_s),
+                "rss_before_mb": rss_before,
+                "rss_after_import_mb": import_peak,
+                "exported_rows": exported,
+                "export_s": round(export_s, 2),
+                "rss_after_export_mb": _peak_rss_mb(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Encode CPU time and bytes on the wire per endpoint, per encoder and codec.
+
+Usage (from backend/):
+
+    python benchmarks/bench_json_encoding.py [--users 2000] [--lessons 2000] [--repeat 200]
+
+Builds a throwaway data set with datagen.py, fetches each endpoint's
+payload once, then re-encodes it with the stdlib provider (the previous
+behaviour) and the orjson provider, reporting CPU microseconds per encode
+and the response size uncompressed, gzipped and (if the brotli package
+is installed) brotli-compressed.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import common
+import datagen
+
+
+def _cpu_us(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return round((time.process_time() - start) / repeat * 1_000_000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lessons", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    os.environ["COMPRESS_RESPONSES"] = "0"
+    app_module = common.load_app_module()
+    gen_args = argparse.Namespace(
+        users=args.users,
+        trails=10,
+        lessons=args.lessons,
+        progress=args.users * 20,
+        checkins=args.users,
+        enrollments_per_user=2,
+        seed=7,
+    )
+    with app_module.app.app_context():
+        datagen.generate(app_module, gen_args)
+
+    import encoding
+    from flask.json.provider import DefaultJSONProvider
+
+    flask_app = app_module.app
+    providers = {"stdlib": DefaultJSONProvider(flask_app)}
+    if encoding.orjson is not None:
+        providers["orjson"] = encoding.OrjsonProvider(flask_app)
+    codecs = ["gzip"] + (["br"] if encoding.brotli is not None else [])
+
+    client = flask_app.test_client()
+    token = client.post(
+        "/api/auth/login",
+        json={"email": datagen.user_email(1), "password": datagen.BENCH_PASSWORD},
+    ).get_json()["token"]
+    headers = common.auth_headers(token)
+    endpoints = [
+        "/api/me",
+        "/api/dashboard",
+        "/api/progress",
+        "/api/trails",
+        f"/api/trails/{datagen.trail_id(0)}/videos",
+        "/api/leaderboard?limit=100",
+    ]
+
+    results = {}
+    for path in endpoints:
+        payload = client.get(path, headers=headers).get_json()
+        row = {}
+        for name, provider in providers.items():
+            encode = lambda: provider.dumps(payload, separators=(",", ":"))  # noqa: E731
+            body = encode().encode("utf-8")
+            row[name] = {
+                "encode_cpu_us": _cpu_us(encode, args.repeat),
+                "bytes": len(body),
+            }
+            for codec in codecs:
+                row[name][f"{codec}_bytes"] = len(encoding.compress(body, codec))
+                row[name][f"{codec}_cpu_us"] = _cpu_us(
+                    lambda: encoding.compress(body, codec), max(1, args.repeat // 10)
+                )
+        results[path] = row
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
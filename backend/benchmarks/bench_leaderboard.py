@@ -0,0 +1,57 @@
+"""Rank lookup cost of the in-process leaderboard at scale.
+
+Usage (from backend/):
+
+    python benchmarks/bench_leaderboard.py [--users 1000000] [--lookups 20000]
+
+Builds a RankingIndex from synthetic (user_id, xp) pairs and times rank
+lookups, top-N, "me plus neighbors" windows and XP updates. Rank lookups
+are expected to stay well under a millisecond at 1M users.
+"""
+
+import argparse
+import json
+import random
+import time
+
+import common  # noqa: F401  (puts backend/ on sys.path)
+from leaderboard import RankingIndex
+
+
+def _per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter() - start) / calls * 1_000_000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    users = [f"user-{i:07d}" for i in range(args.users)]
+    scores = [(user_id, rng.randrange(0, 50_000, 10)) for user_id in users]
+
+    start = time.perf_counter()
+    index = RankingIndex(scores)
+    build_s = time.perf_counter() - start
+
+    sample = [rng.choice(users) for _ in range(args.lookups)]
+    it = iter(sample * 4)
+    results = {
+        "users": args.users,
+        "build_s": round(build_s, 3),
+        "rank_us": _per_call_us(lambda: index.rank(next(it)), args.lookups),
+        "top10_us": _per_call_us(lambda: index.top(10), 1000),
+        "around_2_us": _per_call_us(lambda: index.around(next(it), 2), args.lookups),
+        "add_xp_us": _per_call_us(lambda: index.add(next(it), 10), min(args.lookups, 5000)),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Login throughput against password hash cost.
+
+Usage (from backend/):
+
+    python benchmarks/bench_password_hash.py [--threads 8] [--seconds 5]
+        [--workers 0 4] [--methods pbkdf2:sha256:600000 scrypt:32768:8:1]
+
+For every hash method and pool size a user is created with that method
+and POST /api/auth/login is hammered from several threads. Reports
+logins/sec, p50/p99 latency and how many requests were shed with 503.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+
+from common import load_app_module
+
+DEFAULT_METHODS = [
+    "pbkdf2:sha256:100000",
+    "pbkdf2:sha256:600000",
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+]
+
+
+def _run_logins(app, email, password, threads, seconds):
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = client.post(
+                "/api/auth/login", json={"email": email, "password": password}
+            )
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "logins_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+        "status_counts": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--methods", nargs="+", default=DEFAULT_METHODS)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 2])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    app_module = load_app_module()
+    results = []
+    for method in args.methods:
+        for workers in args.workers:
+            os.environ["PASSWORD_HASH_METHOD"] = method
+            os.environ["PASSWORD_HASH_WORKERS"] = str(workers)
+            app = app_module.create_app()
+            email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+            password = "benchmark-password"
+            response = app.test_client().post(
+                "/api/auth/signup", json={"email": email, "password": password}
+            )
+            assert response.status_code == 201, response.get_json()
+            stats = _run_logins(app, email, password, args.threads, args.seconds)
+            results.append({"method": method, "pool_workers": workers, **stats})
+            print(json.dumps(results[-1]))
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Latency of GET /api/progress as a user enrolls in more trails.
+
+Usage (from backend/):
+
+    python benchmarks/bench_progress.py [--trails 1 10 50 100 200]
+
+The query count must stay constant and the latency roughly flat; the old
+implementation issued 2N+2 statements per request.
+"""
+
+import argparse
+import json
+import uuid
+
+from common import auth_headers, count_queries, load_app_module, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trails", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--videos-per-trail", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    app_module = load_app_module()
+    app, db = app_module.app, app_module.db
+    client = app.test_client()
+
+    response = client.post(
+        "/api/auth/signup",
+        json={"email": f"bench-{uuid.uuid4().hex[:8]}@example.com", "password": "benchmark"},
+    )
+    body = response.get_json()
+    token, user_id = body["token"], body["user"]["id"]
+    headers = auth_headers(token)
+
+    results = []
+    created = 0
+    with app.app_context():
+        for target in sorted(args.trails):
+            while created < target:
+                trail_id = f"bench-trail-{created}"
+                db.session.add(
+                    app_module.Trail(
+                        id=trail_id,
+                        icon="📌",
+                        title=f"Bench {created}",
+                        format="bench",
+                        duration_weeks_min=1,
+                        duration_weeks_max=1,
+                    )
+                )
+                db.session.add(
+                    app_module.Enrollment(
+                        id=uuid.uuid4().hex, user_id=user_id, trail_id=trail_id
+                    )
+                )
+                for position in range(args.videos_per_trail):
+                    video_id = uuid.uuid4().hex
+                    db.session.add(
+                        app_module.VideoLesson(
+                            id=video_id,
+                            trail_id=trail_id,
+                            title=f"Video {position}",
+                            url="https://example.com",
+                            position=position,
+                        )
+                    )
+                    if position % 2 == 0:
+                        db.session.add(
+                            app_module.VideoProgress(
+                                id=uuid.uuid4().hex,
+                                user_id=user_id,
+                                video_id=video_id,
+                                trail_id=trail_id,
+                            )
+                        )
+                created += 1
+            db.session.commit()
+
+            with count_queries(db.engine) as queries:
+                assert client.get("/api/progress", headers=headers).status_code == 200
+            stats = time_calls(
+                lambda: client.get("/api/progress", headers=headers), repeat=args.repeat
+            )
+            results.append({"enrolled_trails": target, "queries": queries["count"], **stats})
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Worker start-up cost: import-to-first-request.
+
+Usage (from backend/):
+
+    python benchmarks/bench_startup.py [--runs 5]
+
+Each run starts a fresh interpreter, imports ``app`` and serves
+GET /api/health and GET /api/trails through the test client, timing each
+phase. Runs are repeated with DB_AUTO_MIGRATE=1 to show what schema
+creation and seeding at import used to cost every worker.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import BACKEND_DIR, load_app_module
+
+CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+assert client.get("/api/health").status_code == 200
+t2 = time.perf_counter()
+assert client.get("/api/trails").status_code == 200
+t3 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "first_health_ms": (t2 - t1) * 1000,
+    "first_trails_ms": (t3 - t2) * 1000,
+    "import_to_first_request_ms": (t2 - t0) * 1000,
+}))
+"""
+
+
+def _run(env, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD],
+            cwd=BACKEND_DIR,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        key: round(statistics.median(s[key] for s in samples), 1) for key in samples[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="startup-"), "startup.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    load_app_module()  # migrate and seed once, as a deploy step would
+
+    env = dict(os.environ)
+    env.pop("DB_AUTO_MIGRATE", None)
+    results = {"lazy": _run(env, args.runs)}
+    results["auto_migrate"] = _run(dict(env, DB_AUTO_MIGRATE="1"), args.runs)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
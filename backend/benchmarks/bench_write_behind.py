@@ -0,0 +1,133 @@
+"""Database commits and latency for check-ins/completions with and without write-behind.
+
+Usage (from backend/):
+
+    python benchmarks/bench_write_behind.py [--threads 16] [--requests 200]
+
+Creates a throwaway database with datagen.py, then runs the same
+concurrent mix of POST /api/videos/<id>/complete and POST /api/checkins
+against the default app and one created with WRITE_BEHIND=1. Commits are
+counted on the engine, including the write-behind flushes, and reported
+per 1000 requests together with p50/p99 latency.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import common
+import datagen
+
+
+def run(app_module, flask_app, args, label, user_offset):
+    from sqlalchemy import event
+
+    client = flask_app.test_client()
+    with flask_app.app_context():
+        engine = app_module.db.engine
+        videos = [
+            video_id
+            for (video_id,) in app_module.db.session.query(app_module.VideoLesson.id)
+            .filter(app_module.VideoLesson.trail_id == datagen.trail_id(0))
+            .order_by(app_module.VideoLesson.position)
+        ]
+    tokens = []
+    for i in range(args.threads):
+        response = client.post(
+            "/api/auth/login",
+            json={
+                "email": datagen.user_email(user_offset + i),
+                "password": datagen.BENCH_PASSWORD,
+            },
+        )
+        tokens.append(response.get_json()["token"])
+
+    commits = {"count": 0}
+
+    def _count_commit(_conn):
+        commits["count"] += 1
+
+    event.listen(engine, "commit", _count_commit)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index):
+        headers = common.auth_headers(tokens[index])
+        samples = []
+        for n in range(args.requests):
+            start = time.perf_counter()
+            if n % 2:
+                client.post(
+                    "/api/checkins",
+                    headers=headers,
+                    json={"bodies": [{"id": "fisico", "value": n % 100}]},
+                )
+            else:
+                video_id = videos[(n // 2) % len(videos)]
+                client.post(f"/api/videos/{video_id}/complete", headers=headers)
+            samples.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(samples)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    write_behind = flask_app.extensions.get("write_behind")
+    if write_behind is not None:
+        write_behind.flush()
+    wall = time.perf_counter() - start
+    event.remove(engine, "commit", _count_commit)
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "mode": label,
+        "requests": total,
+        "requests_per_s": round(total / wall, 1),
+        "commits": commits["count"],
+        "commits_per_1000_requests": round(commits["count"] / total * 1000, 1),
+        "commits_per_s": round(commits["count"] / wall, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(latencies[min(total - 1, int(total * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="per thread")
+    args = parser.parse_args()
+
+    os.environ.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    app_module = common.load_app_module()
+    gen_args = argparse.Namespace(
+        users=args.threads * 2 + 1,
+        trails=1,
+        lessons=max(args.requests, 10),
+        progress=0,
+        checkins=0,
+        enrollments_per_user=1,
+        seed=1,
+    )
+    with app_module.app.app_context():
+        datagen.generate(app_module, gen_args)
+
+    results = [run(app_module, app_module.app, args, "sync", 1)]
+
+    os.environ["WRITE_BEHIND"] = "1"
+    os.environ["WRITE_BEHIND_DIR"] = tempfile.mkdtemp(prefix="write-behind-")
+    buffered_app = app_module.create_app()
+    results.append(run(app_module, buffered_app, args, "write-behind", 1 + args.threads))
+    buffered_app.extensions["write_behind"].close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Shared helpers for the backend benchmarks.
+
+Every benchmark runs against a throwaway SQLite database unless
+``DATABASE_URL`` is already set, so it can be pointed at a local
+PostgreSQL instance as well.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def load_app_module():
+    if not os.environ.get("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("SECRET_KEY", "bench-secret-" + "x" * 32)
+    # Every benchmark client logs in from 127.0.0.1.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    import app as app_module
+
+    with app_module.app.app_context():
+        app_module.migrate_schema()
+        app_module.seed_catalog()
+    return app_module
+
+
+@contextmanager
+def count_queries(engine):
+    from sqlalchemy import event
+
+    counter = {"count": 0}
+
+    def _before_cursor_execute(*_args, **_kwargs):
+        counter["count"] += 1
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+def time_calls(fn, repeat=50, warmup=5):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def auth_headers(token):
+    return {"authorization": f"Bearer {token}"}
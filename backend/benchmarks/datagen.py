@@ -0,0 +1,251 @@
+"""Fill the database with synthetic users, catalog, progress and check-ins.
+
+Usage (from backend/):
+
+    python benchmarks/datagen.py --users 100000 --trails 50 --lessons 5000 \\
+        --progress 10000000 [--checkins 300000] [--seed 42]
+
+Writes to DATABASE_URL (a throwaway SQLite file when unset) after
+creating the schema. Rows are generated deterministically from --seed and
+inserted in executemany batches, so the same arguments always produce the
+same data set. Every user's password is ``bench-password``; the first
+user (``bench-user-0000000``) is an admin.
+
+Each user enrolls in --enrollments-per-user trails and completes their
+share of --progress lessons in order, which keeps VideoProgress unique
+per (user, video) and makes XP/streak consistent with the completions.
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import common
+
+BENCH_PASSWORD = "bench-password"
+USER_BATCH_SIZE = 1000
+
+
+def user_id(index):
+    return f"bench-user-{index:07d}"
+
+
+def user_email(index):
+    return f"user{index}@bench.local"
+
+
+def trail_id(index):
+    return f"bench-trail-{index:04d}"
+
+
+class _Batcher:
+    def __init__(self, app_module, model):
+        self.app_module = app_module
+        self.model = model
+        self.rows = []
+        self.total = 0
+
+    def add(self, row):
+        self.rows.append(row)
+
+    def flush(self):
+        db = self.app_module.db
+        if self.rows:
+            db.session.execute(db.insert(self.model), self.rows)
+        db.session.commit()
+        self.total += len(self.rows)
+        self.rows = []
+
+
+def _checkin_body(rng, template):
+    body = dict(template)
+    body["flow_today"] = rng.randint(0, 100)
+    body["bodies"] = [dict(item, value=rng.randint(0, 100)) for item in body["bodies"]]
+    return json.dumps(body, ensure_ascii=False)
+
+
+def generate(app_module, args):
+    from werkzeug.security import generate_password_hash
+
+    m = app_module
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    today = now.date()
+    lessons_per_trail = max(1, args.lessons // max(1, args.trails))
+    counts = {}
+
+    start = time.perf_counter()
+    trails = _Batcher(m, m.Trail)
+    modules = _Batcher(m, m.TrailModule)
+    videos = _Batcher(m, m.VideoLesson)
+    trail_videos = []
+    for t in range(args.trails):
+        tid = trail_id(t)
+        trails.add(
+            {
+                "id": tid,
+                "icon": "📌",
+                "title": f"Trilha de benchmark {t}",
+                "format": "Online",
+                "duration_weeks_min": 4,
+                "duration_weeks_max": 8,
+                "video_count": lessons_per_trail,
+                "next_position": lessons_per_trail,
+            }
+        )
+        for position in range(4):
+            modules.add(
+                {"trail_id": tid, "name": f"Módulo {position + 1}", "position": position}
+            )
+        ids = []
+        for position in range(lessons_per_trail):
+            vid = f"{tid}-video-{position:05d}"
+            ids.append(vid)
+            videos.add(
+                {
+                    "id": vid,
+                    "trail_id": tid,
+                    "title": f"Aula {position + 1}",
+                    "provider": "youtube",
+                    "url": f"https://youtu.be/{vid}",
+                    "duration_minutes": rng.randint(3, 40),
+                    "position": position,
+                    "created_at": now,
+                }
+            )
+        trail_videos.append(ids)
+    trails.flush()
+    modules.flush()
+    videos.flush()
+    counts.update(trails=trails.total, modules=modules.total, videos=videos.total)
+
+    # A cheap hash keeps generation fast; logins rehash it to the configured
+    # method on first use, like any legacy hash.
+    password_hash = generate_password_hash(BENCH_PASSWORD, method="pbkdf2:sha256:1000")
+    users = _Batcher(m, m.User)
+    enrollments = _Batcher(m, m.Enrollment)
+    progress = _Batcher(m, m.VideoProgress)
+    checkins = _Batcher(m, m.DailyCheckIn)
+    latest = _Batcher(m, m.LatestCheckIn)
+    per_user_progress = args.progress // max(1, args.users)
+    extra_progress = args.progress % max(1, args.users)
+    per_user_checkins = args.checkins // max(1, args.users)
+    extra_checkins = args.checkins % max(1, args.users)
+    enrolled_count = min(args.enrollments_per_user, args.trails)
+
+    for u in range(args.users):
+        uid = user_id(u)
+        enrolled = rng.sample(range(args.trails), enrolled_count) if args.trails else []
+        for t in enrolled:
+            enrollments.add(
+                {
+                    "id": uuid.UUID(int=rng.getrandbits(128)).hex,
+                    "user_id": uid,
+                    "trail_id": trail_id(t),
+                    "created_at": now - timedelta(days=rng.randint(1, 365)),
+                }
+            )
+
+        wanted = per_user_progress + (1 if u < extra_progress else 0)
+        completed = 0
+        for t in enrolled:
+            for vid in trail_videos[t]:
+                if completed >= wanted:
+                    break
+                progress.add(
+                    {
+                        "id": uuid.UUID(int=rng.getrandbits(128)).hex,
+                        "user_id": uid,
+                        "video_id": vid,
+                        "trail_id": trail_id(t),
+                        "completed_at": now - timedelta(minutes=rng.randint(1, 525600)),
+                        "xp_awarded": m.XP_PER_VIDEO,
+                    }
+                )
+                completed += 1
+
+        last_checkin = None
+        for _ in range(per_user_checkins + (1 if u < extra_checkins else 0)):
+            created_at = now - timedelta(minutes=rng.randint(1, 525600))
+            row = {
+                "id": uuid.UUID(int=rng.getrandbits(128)).hex,
+                "user_id": uid,
+                "created_at": created_at,
+                "data_json": _checkin_body(rng, m.DEFAULT_DASHBOARD),
+                "rolled_up": False,
+            }
+            checkins.add(row)
+            if last_checkin is None or created_at > last_checkin["created_at"]:
+                last_checkin = row
+        if last_checkin is not None:
+            latest.add(
+                {
+                    "user_id": uid,
+                    "checkin_id": last_checkin["id"],
+                    "created_at": last_checkin["created_at"],
+                    "data_json": last_checkin["data_json"],
+                }
+            )
+
+        users.add(
+            {
+                "id": uid,
+                "email": user_email(u),
+                "name": f"Herói {u}",
+                "password_hash": password_hash,
+                "is_admin": u == 0,
+                "xp": completed * m.XP_PER_VIDEO,
+                "streak": rng.randint(0, 30) if completed else 0,
+                "last_activity_date": today - timedelta(days=rng.randint(0, 3))
+                if completed
+                else None,
+            }
+        )
+        # Users first so foreign keys hold on databases that enforce them.
+        if len(users.rows) >= USER_BATCH_SIZE:
+            users.flush()
+            for batch in (enrollments, progress, checkins, latest):
+                batch.flush()
+
+    users.flush()
+    for batch in (enrollments, progress, checkins, latest):
+        batch.flush()
+    counts.update(
+        users=users.total,
+        enrollments=enrollments.total,
+        progress=progress.total,
+        checkins=checkins.total,
+    )
+    counts["elapsed_s"] = round(time.perf_counter() - start, 2)
+    return counts
+
+
+def add_arguments(parser):
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--trails", type=int, default=20)
+    parser.add_argument("--lessons", type=int, default=1000)
+    parser.add_argument("--progress", type=int, default=20000)
+    parser.add_argument("--checkins", type=int, default=3000)
+    parser.add_argument("--enrollments-per-user", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    app_module = common.load_app_module()
+    with app_module.app.app_context():
+        if app_module.db.session.get(app_module.User, user_id(0)) is not None:
+            raise SystemExit("database already holds benchmark data; use a fresh DATABASE_URL")
+        counts = generate(app_module, args)
+        counts["database"] = app_module.db.engine.url.render_as_string(hide_password=True)
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
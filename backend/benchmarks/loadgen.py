@@ -0,0 +1,453 @@
+"""Drive every API route with concurrent HTTP requests and record latency.
+
+Usage (from backend/):
+
+    # populate a database, then load-test an in-process threaded server
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/datagen.py --users 100000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/loadgen.py \\
+        --requests 500 --concurrency 16 --output results/$(git rev-parse --short HEAD).json
+
+    # or point it at a server started separately (gunicorn, flask run, ...)
+    python benchmarks/loadgen.py --url http://127.0.0.1:5000 ...
+
+    # compare against an earlier run
+    python benchmarks/loadgen.py ... --compare results/abc1234.json
+
+The target database must hold data from datagen.py (pass --generate to
+create it first with datagen's options). Each route runs --requests times
+from --concurrency keep-alive connections, authenticated as --login-users
+different users; admin routes use the datagen admin. Results are p50, p90,
+p99, mean and max latency in milliseconds plus throughput per route,
+written as JSON together with the git commit and database backend.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+import common
+import datagen
+
+LOGIN_PASSWORD = datagen.BENCH_PASSWORD
+
+
+class Client:
+    """One keep-alive HTTP connection per thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(
+                self.host, self.port, timeout=60
+            )
+        return conn
+
+    def request(self, method, path, body=None, headers=None, content_type=None):
+        headers = dict(headers or {})
+        if body is not None and not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+            content_type = content_type or "application/json"
+        if content_type:
+            headers["Content-Type"] = content_type
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    self._local.conn = None
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+class Context:
+    def __init__(self, client, user_tokens, admin_token, trails, videos, seed):
+        self.client = client
+        self.user_tokens = user_tokens
+        self.admin_token = admin_token
+        self.trails = trails
+        self.videos = videos
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def pick(self, items):
+        with self.lock:
+            return self.rng.choice(items)
+
+    def user(self):
+        return _bearer(self.pick(self.user_tokens))
+
+    def admin(self):
+        return _bearer(self.admin_token)
+
+
+def _import_body(ctx):
+    trail = ctx.pick(ctx.trails)
+    lines = [
+        {
+            "type": "video",
+            "trail_id": trail,
+            "title": f"Aula importada {i}",
+            "url": f"https://youtu.be/load-{uuid.uuid4().hex}",
+        }
+        for i in range(20)
+    ]
+    return "\n".join(json.dumps(line) for line in lines)
+
+
+CHECKIN_BODIES = ("fisico", "emocional", "energetico", "mental_inferior", "intuitivo")
+
+
+def _checkin_body(ctx):
+    with ctx.lock:
+        values = [ctx.rng.randint(0, 100) for _ in CHECKIN_BODIES]
+    return {
+        "flow_today": values[0],
+        "bodies": [
+            {"id": body_id, "label": body_id, "value": value}
+            for body_id, value in zip(CHECKIN_BODIES, values)
+        ],
+    }
+
+
+# name -> (method, path(ctx), headers(ctx), body(ctx), content_type)
+SCENARIOS = {
+    "health": ("GET", lambda c: "/api/health", None, None, None),
+    "metrics": (
+        "GET",
+        lambda c: "/api/metrics",
+        lambda c: _bearer(os.environ.get("METRICS_TOKEN") or ""),
+        None,
+        None,
+    ),
+    "signup": (
+        "POST",
+        lambda c: "/api/auth/signup",
+        None,
+        lambda c: {
+            "email": f"load-{uuid.uuid4().hex}@bench.local",
+            "password": LOGIN_PASSWORD,
+            "name": "Carga",
+        },
+        None,
+    ),
+    "login": (
+        "POST",
+        lambda c: "/api/auth/login",
+        None,
+        lambda c: {
+            "email": datagen.user_email(c.pick(range(1, len(c.user_tokens) + 1))),
+            "password": LOGIN_PASSWORD,
+        },
+        None,
+    ),
+    "me": ("GET", lambda c: "/api/me", Context.user, None, None),
+    "dashboard": ("GET", lambda c: "/api/dashboard", Context.user, None, None),
+    "dashboard_anonymous": ("GET", lambda c: "/api/dashboard", None, None, None),
+    "checkin_create": ("POST", lambda c: "/api/checkins", Context.user, _checkin_body, None),
+    "checkin_history": (
+        "GET",
+        lambda c: "/api/checkins/history?granularity=week&from="
+        + (date.today() - timedelta(days=84)).isoformat(),
+        Context.user,
+        None,
+        None,
+    ),
+    "trails": ("GET", lambda c: "/api/trails", Context.user, None, None),
+    "trails_anonymous": ("GET", lambda c: "/api/trails", None, None, None),
+    "enroll": (
+        "POST",
+        lambda c: f"/api/trails/{c.pick(c.trails)}/enroll",
+        Context.user,
+        None,
+        None,
+    ),
+    "trail_videos": (
+        "GET",
+        lambda c: f"/api/trails/{c.pick(c.trails)}/videos",
+        Context.user,
+        None,
+        None,
+    ),
+    "trail_videos_page": (
+        "GET",
+        lambda c: f"/api/trails/{c.pick(c.trails)}/videos?limit=50",
+        Context.user,
+        None,
+        None,
+    ),
+    "trail_videos_ndjson": (
+        "GET",
+        lambda c: f"/api/trails/{c.pick(c.trails)}/videos?format=ndjson",
+        Context.user,
+        None,
+        None,
+    ),
+    "trail_video_create": (
+        "POST",
+        lambda c: f"/api/trails/{c.pick(c.trails)}/videos",
+        Context.admin,
+        lambda c: {"title": "Aula de carga", "url": f"https://youtu.be/{uuid.uuid4().hex}"},
+        None,
+    ),
+    "video_complete": (
+        "POST",
+        lambda c: f"/api/videos/{c.pick(c.videos)}/complete",
+        Context.user,
+        None,
+        None,
+    ),
+    "video_completions": (
+        "POST",
+        lambda c: "/api/videos/completions",
+        Context.user,
+        lambda c: {"completions": [{"video_id": c.pick(c.videos)} for _ in range(10)]},
+        None,
+    ),
+    "leaderboard": ("GET", lambda c: "/api/leaderboard", Context.user, None, None),
+    "leaderboard_me": ("GET", lambda c: "/api/leaderboard/me", Context.user, None, None),
+    "progress": ("GET", lambda c: "/api/progress", Context.user, None, None),
+    "bootstrap": ("GET", lambda c: "/api/bootstrap", Context.user, None, None),
+    "admin_trail_create": (
+        "POST",
+        lambda c: "/api/admin/trails",
+        Context.admin,
+        lambda c: {
+            "id": f"load-{uuid.uuid4().hex[:12]}",
+            "title": "Trilha de carga",
+            "format": "Online",
+            "duration_weeks_min": 1,
+            "duration_weeks_max": 2,
+            "modules": ["Um", "Dois"],
+        },
+        None,
+    ),
+    "admin_catalog_import": (
+        "POST",
+        lambda c: "/api/admin/catalog/import",
+        Context.admin,
+        _import_body,
+        "application/x-ndjson",
+    ),
+    "admin_catalog_export": (
+        "GET",
+        lambda c: "/api/admin/catalog/export",
+        Context.admin,
+        None,
+        None,
+    ),
+}
+
+
+def _percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(len(sorted_samples) * fraction))]
+
+
+def run_scenario(ctx, name, total, concurrency):
+    method, path_fn, headers_fn, body_fn, content_type = SCENARIOS[name]
+    latencies = []
+    failures = {}
+    remaining = iter(range(total))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            path = path_fn(ctx)
+            headers = headers_fn(ctx) if headers_fn else None
+            body = body_fn(ctx) if body_fn else None
+            start = time.perf_counter()
+            try:
+                status, _data = ctx.client.request(method, path, body, headers, content_type)
+            except Exception as exc:  # noqa: BLE001 - counted, not raised
+                status = type(exc).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if not isinstance(status, int) or status >= 400:
+                    failures[str(status)] = failures.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "p50_ms": round(_percentile(latencies, 0.50), 3),
+        "p90_ms": round(_percentile(latencies, 0.90), 3),
+        "p99_ms": round(_percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "max_ms": round(latencies[-1], 3),
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "errors": failures,
+    }
+
+
+def login(client, email):
+    status, data = client.request(
+        "POST", "/api/auth/login", {"email": email, "password": LOGIN_PASSWORD}
+    )
+    if status != 200:
+        raise SystemExit(f"login as {email} failed ({status}); run datagen.py first")
+    return json.loads(data)["token"]
+
+
+def build_context(client, login_users, seed):
+    admin_token = login(client, datagen.user_email(0))
+    tokens = [login(client, datagen.user_email(i)) for i in range(1, login_users + 1)]
+    _status, data = client.request("GET", "/api/trails")
+    trails = [t["id"] for t in json.loads(data)["trails"] if t["id"].startswith("bench-")]
+    if not trails:
+        raise SystemExit("no benchmark trails found; run datagen.py first")
+    videos = []
+    for trail in trails[:10]:
+        _status, data = client.request("GET", f"/api/trails/{trail}/videos?limit=200")
+        videos.extend(v["id"] for v in json.loads(data)["videos"])
+    return Context(client, tokens, admin_token, trails, videos, seed)
+
+
+def _start_local_server(app_module):
+    import logging
+
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    # Keep-alive needs HTTP/1.1; werkzeug defaults to 1.0.
+    server.RequestHandlerClass.protocol_version = "HTTP/1.1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=common.BACKEND_DIR,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = json.load(handle)["routes"]
+    print(f"{'route':24} {'p50 ms':>18} {'p99 ms':>18} {'rps':>16}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+
+        def delta(key):
+            old, new = before[key], current[key]
+            change = (new - old) / old * 100 if old else 0.0
+            return f"{new:>8} ({change:+5.1f}%)"
+
+        print(
+            f"{name:24} {delta('p50_ms'):>18} {delta('p99_ms'):>18} "
+            f"{delta('throughput_rps'):>16}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="target server; default starts one in-process")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--login-users", type=int, default=20)
+    parser.add_argument("--routes", help="comma-separated subset of: " + ",".join(SCENARIOS))
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    parser.add_argument("--generate", action="store_true", help="run datagen.py first")
+    datagen.add_arguments(parser)
+    args = parser.parse_args()
+
+    routes = args.routes.split(",") if args.routes else list(SCENARIOS)
+    unknown = [r for r in routes if r not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    database = os.environ.get("DATABASE_URL")
+    if args.generate or not args.url:
+        app_module = common.load_app_module()
+        with app_module.app.app_context():
+            if args.generate:
+                print(json.dumps(datagen.generate(app_module, args)), file=sys.stderr)
+            database = app_module.db.engine.url.render_as_string(hide_password=True)
+    base_url = args.url or _start_local_server(app_module)
+
+    client = Client(base_url)
+    ctx = build_context(client, args.login_users, args.seed)
+    results = {}
+    for name in routes:
+        results[name] = run_scenario(ctx, name, args.requests, args.concurrency)
+        stats = results[name]
+        print(
+            f"{name:24} p50={stats['p50_ms']:>9}ms p99={stats['p99_ms']:>9}ms "
+            f"{stats['throughput_rps']:>8} rps errors={stats['errors'] or 0}",
+            file=sys.stderr,
+        )
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "database": database,
+            "target": base_url if args.url else "in-process werkzeug (threaded)",
+            "python": sys.version.split()[0],
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "login_users": args.login_users,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "routes": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
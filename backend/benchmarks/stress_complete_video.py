@@ -0,0 +1,98 @@
+"""Concurrency stress check for POST /api/videos/<id>/complete.
+
+Usage (from backend/):
+
+    python benchmarks/stress_complete_video.py [--threads 16] [--videos 40]
+        [--repeats 5]
+
+Many threads complete the same videos for one user, each video several
+times, as double taps and retries would. Afterwards the user's XP must
+equal XP_PER_VIDEO times the number of distinct completions, and there
+must be exactly one VideoProgress row per video. Exits non-zero otherwise.
+"""
+
+import argparse
+import random
+import sys
+import threading
+import uuid
+
+from common import auth_headers, load_app_module
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--videos", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    app_module = load_app_module()
+    app, db = app_module.app, app_module.db
+    client = app.test_client()
+
+    body = client.post(
+        "/api/auth/signup",
+        json={"email": f"stress-{uuid.uuid4().hex[:8]}@example.com", "password": "benchmark"},
+    ).get_json()
+    headers = auth_headers(body["token"])
+    user_id = body["user"]["id"]
+
+    trail_id = "stress-trail"
+    with app.app_context():
+        db.session.add(
+            app_module.Trail(
+                id=trail_id,
+                icon="📌",
+                title="Stress",
+                format="stress",
+                duration_weeks_min=1,
+                duration_weeks_max=1,
+            )
+        )
+        video_ids = [uuid.uuid4().hex for _ in range(args.videos)]
+        for position, video_id in enumerate(video_ids):
+            db.session.add(
+                app_module.VideoLesson(
+                    id=video_id,
+                    trail_id=trail_id,
+                    title=f"Video {position}",
+                    url="https://example.com",
+                    position=position,
+                )
+            )
+        db.session.commit()
+
+    work = video_ids * args.repeats
+    random.shuffle(work)
+    chunks = [work[i :: args.threads] for i in range(args.threads)]
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(chunk):
+        thread_client = app.test_client()
+        for video_id in chunk:
+            response = thread_client.post(
+                f"/api/videos/{video_id}/complete", headers=headers
+            )
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        xp = db.session.get(app_module.User, user_id).xp
+        rows = app_module.VideoProgress.query.filter_by(user_id=user_id).count()
+
+    expected = app_module.XP_PER_VIDEO * rows
+    print(f"statuses={statuses} progress_rows={rows} xp={xp} expected_xp={expected}")
+    if rows != args.videos or xp != expected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+"""Cache layer shared by the Flask and ASGI apps.
+
+A Cache is a namespace ("catalog", "token_version", ...) over a store.
+Keys are stored as ``<namespace>:<version>:<key>``. Cache.invalidate bumps
+the namespace version in a place every worker reads, so one call drops the
+namespace everywhere. Old entries become unreachable and age out.
+
+CACHE_BACKEND selects the store:
+
+``local`` (default)
+    An LRU in each process, capped at CACHE_LOCAL_MAX_ENTRIES (4096). Its
+    namespace versions live in the shared-memory file below, so admin
+    writes invalidate every worker on the host.
+``shared``
+    A SQLite file memory-mapped by every worker on the host and capped at
+    CACHE_SHARED_MAX_BYTES (64 MiB). The least recently read entries are
+    evicted first. By default it lives in a 0700 directory of this user
+    under /dev/shm, or under the app's instance folder when that cannot be
+    made private; CACHE_SHARED_PATH overrides the file.
+``redis``
+    CACHE_REDIS_URL, for hosts that should share entries and versions.
+    Requires the ``redis`` package. Size limits are the server's
+    maxmemory policy. The shared store stands in while Redis is
+    unreachable, or when it is not installed.
+
+The shared and Redis stores pickle values, so only point them at storage
+this deployment controls; cache plain data (tuples, dicts, bytes). The
+shared store refuses a file, or a directory, that is not owned by this
+user or that other users can write, since whoever can write it can run
+code in the app. Reads
+and writes never raise: a store error counts as a miss, and while the
+version store is failing nothing is cached at all.
+
+Every worker re-reads a namespace version at most every
+CACHE_VERSION_CHECK_MS (250) milliseconds; invalidations reach other
+workers within that window.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import Counter, gauge_lines
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+cache_requests = Counter("cache_requests_total", "Cache lookups by namespace and result.")
+cache_evictions = Counter(
+    "cache_evictions_total", "Entries dropped by a store, by reason (capacity or expired)."
+)
+
+
+def check_private_path(path: str) -> None:
+    """Raise PermissionError unless only this user can write ``path``."""
+    uid = os.geteuid()
+    directory = os.path.dirname(os.path.abspath(path))
+    info = os.stat(directory)
+    if info.st_uid != uid or info.st_mode & 0o022:
+        raise PermissionError(f"{directory} is not private to this user")
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISREG(info.st_mode) or info.st_uid != uid or info.st_mode & 0o022:
+        raise PermissionError(f"{path} is not a private regular file")
+
+
+class SharedMemoryStore:
+    """SQLite file on tmpfs, shared by every process on the host."""
+
+    name = "shared"
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # One connection per thread and process; never reused after fork.
+            check_private_path(self.path)
+            conn = sqlite3.connect(self.path, timeout=0.05, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(f"PRAGMA mmap_size={self.max_bytes * 2}")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entry (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed
+                    ON cache_entry (accessed_at);
+                CREATE TABLE IF NOT EXISTS cache_version (
+                    namespace TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                );
+                """
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Any:
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM cache_entry WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            now = time.time()
+            if expires_at <= now:
+                conn.execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+                cache_evictions.inc(labels={"store": self.name, "reason": "expired"})
+                return None
+            if now - accessed_at > 1:
+                # LRU order at one-second resolution keeps hot reads read-only.
+                conn.execute(
+                    "UPDATE cache_entry SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+            return pickle.loads(value)
+        except Exception:
+            logger.debug("shared cache read failed", exc_info=True)
+            return None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(blob) > self.max_bytes // 4:
+                return
+            now = time.time()
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now + ttl, now),
+                )
+                self._evict(conn, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except Exception:
+            logger.debug("shared cache write failed", exc_info=True)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        (total,) = conn.execute("SELECT total(size) FROM cache_entry").fetchone()
+        if total <= self.max_bytes:
+            return
+        expired = conn.execute(
+            "DELETE FROM cache_entry WHERE expires_at <= ?", (now,)
+        ).rowcount
+        if expired:
+            cache_evictions.inc(expired, labels={"store": self.name, "reason": "expired"})
+            (total,) = conn.execute("SELECT total(size) FROM cache_entry").fetchone()
+        # Trim to 90% so the next few writes do not each pay for an eviction.
+        evicted = 0
+        for key, size in conn.execute(
+            "SELECT key, size FROM cache_entry ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes * 0.9:
+                break
+            conn.execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        if evicted:
+            cache_evictions.inc(evicted, labels={"store": self.name, "reason": "capacity"})
+
+    def delete(self, key: str) -> None:
+        try:
+            self._conn().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+        except (sqlite3.Error, OSError):
+            logger.debug("shared cache delete failed", exc_info=True)
+
+    def version(self, namespace: str) -> int:
+        try:
+            row = (
+                self._conn()
+                .execute("SELECT version FROM cache_version WHERE namespace = ?", (namespace,))
+                .fetchone()
+            )
+        except (sqlite3.Error, OSError):
+            logger.debug("shared cache version read failed", exc_info=True)
+            return -1
+        return row[0] if row else 0
+
+    def bump(self, namespace: str) -> int:
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO cache_version VALUES (?, 1) ON CONFLICT (namespace) "
+                "DO UPDATE SET version = version + 1",
+                (namespace,),
+            )
+            return self.version(namespace)
+        except (sqlite3.Error, OSError):
+            logger.warning("cache invalidation of %s failed", namespace, exc_info=True)
+            return -1
+
+    def usage(self) -> Tuple[int, int]:
+        try:
+            count, size = (
+                self._conn().execute("SELECT count(*), total(size) FROM cache_entry").fetchone()
+            )
+        except (sqlite3.Error, OSError):
+            return 0, 0
+        return int(count), int(size)
+
+
+class LocalLRUStore:
+    """Per-process LRU; namespace versions come from ``versions`` if given."""
+
+    name = "local"
+
+    def __init__(self, max_entries: int = 4096, versions: Optional[SharedMemoryStore] = None):
+        self.max_entries = max_entries
+        self.versions = versions
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._local_versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                cache_evictions.inc(labels={"store": self.name, "reason": "expired"})
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            cache_evictions.inc(evicted, labels={"store": self.name, "reason": "capacity"})
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def version(self, namespace: str) -> int:
+        if self.versions is not None:
+            return self.versions.version(namespace)
+        return self._local_versions.get(namespace, 0)
+
+    def bump(self, namespace: str) -> int:
+        if self.versions is not None:
+            return self.versions.bump(namespace)
+        with self._lock:
+            self._local_versions[namespace] = self._local_versions.get(namespace, 0) + 1
+            return self._local_versions[namespace]
+
+    def usage(self) -> Tuple[int, int]:
+        with self._lock:
+            return len(self._entries), 0
+
+
+class RedisStore:
+    """Entries and versions in Redis, with a local store as stand-in."""
+
+    name = "redis"
+
+    def __init__(self, url: str, fallback, prefix: str = "cache:"):
+        self._client = redis.Redis.from_url(url, socket_timeout=0.25)
+        self._fallback = fallback
+        self._prefix = prefix
+        self._retry_at = 0.0
+
+    def _call(self, fn, fallback):
+        if time.monotonic() >= self._retry_at:
+            try:
+                return fn()
+            except redis.RedisError:
+                logger.warning("cache store unavailable; using the local stand-in")
+                self._retry_at = time.monotonic() + 5
+        return fallback()
+
+    def get(self, key: str) -> Any:
+        def _get():
+            blob = self._client.get(self._prefix + key)
+            return pickle.loads(blob) if blob is not None else None
+
+        return self._call(_get, lambda: self._fallback.get(key))
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._call(
+            lambda: self._client.set(self._prefix + key, blob, px=max(1, int(ttl * 1000))),
+            lambda: self._fallback.set(key, value, ttl),
+        )
+
+    def delete(self, key: str) -> None:
+        self._call(
+            lambda: self._client.delete(self._prefix + key),
+            lambda: self._fallback.delete(key),
+        )
+
+    def version(self, namespace: str) -> int:
+        return self._call(
+            lambda: int(self._client.get(f"{self._prefix}version:{namespace}") or 0),
+            lambda: self._fallback.version(namespace),
+        )
+
+    def bump(self, namespace: str) -> int:
+        # The stand-in is bumped too, so workers that fell back to it drop
+        # their copies as well.
+        self._fallback.bump(namespace)
+        return self._call(
+            lambda: int(self._client.incr(f"{self._prefix}version:{namespace}")),
+            lambda: self._fallback.version(namespace),
+        )
+
+    def usage(self) -> Tuple[int, int]:
+        return self._fallback.usage()
+
+
+class Cache:
+    """One namespace of a store, with TTL and version-based invalidation."""
+
+    def __init__(self, store, namespace: str, ttl: float, version_check: float = 0.25):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+        self.version_check = version_check
+        self._version = 0
+        self._version_checked_at = float("-inf")
+
+    def version(self) -> int:
+        now = time.monotonic()
+        if now - self._version_checked_at >= self.version_check:
+            self._version = self.store.version(self.namespace)
+            self._version_checked_at = now
+        return self._version
+
+    def _key(self, key: str, version: Optional[int] = None) -> Optional[str]:
+        version = self.version() if version is None else version
+        # -1: the version store failed, so an invalidation could be missed.
+        return f"{self.namespace}:{version}:{key}" if version >= 0 else None
+
+    def get(self, key: str) -> Any:
+        store_key = self._key(key)
+        value = self.store.get(store_key) if store_key is not None else None
+        cache_requests.inc(
+            labels={"cache": self.namespace, "result": "miss" if value is None else "hit"}
+        )
+        return value
+
+    def set(
+        self, key: str, value: Any, ttl: Optional[float] = None, version: Optional[int] = None
+    ) -> None:
+        """Store ``value``; pass the ``version()`` read before computing it so a
+        value built from data an invalidation replaced is filed under the old
+        version and never served."""
+        ttl = self.ttl if ttl is None else ttl
+        store_key = self._key(key, version)
+        if ttl > 0 and store_key is not None:
+            self.store.set(store_key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        store_key = self._key(key)
+        if store_key is not None:
+            self.store.delete(store_key)
+
+    def invalidate(self) -> None:
+        """Drop every entry of this namespace, in every process."""
+        self._version = self.store.bump(self.namespace)
+        self._version_checked_at = time.monotonic()
+
+
+def _private_directory(fallback: str) -> str:
+    """This user's 0700 directory on tmpfs, else ``fallback`` (also 0700)."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    directory = os.path.join(base, f"jornada-cache-{os.geteuid()}")
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        directory = ""
+    if directory:
+        try:
+            check_private_path(os.path.join(directory, "probe"))
+            return directory
+        except OSError:
+            # Created by another user first; never trust its contents.
+            logger.warning("%s is not private; caching under %s", directory, fallback)
+    os.makedirs(fallback, mode=0o700, exist_ok=True)
+    return fallback
+
+
+def _shared_path(scope: str, fallback_directory: str) -> str:
+    digest = hashlib.sha1(scope.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(_private_directory(fallback_directory), f"{digest}.sqlite")
+
+
+def store_from_env(scope: str, fallback_directory: str):
+    """The store CACHE_BACKEND selects; ``scope`` (the database URL) keeps
+    apps on different databases from sharing a default shared file, and
+    ``fallback_directory`` holds it when /dev/shm cannot be used privately."""
+    backend = (os.environ.get("CACHE_BACKEND") or "local").strip().lower()
+    shared = SharedMemoryStore(
+        os.environ.get("CACHE_SHARED_PATH") or _shared_path(scope, fallback_directory),
+        max_bytes=int(os.environ.get("CACHE_SHARED_MAX_BYTES") or 64 * 1024 * 1024),
+    )
+    if backend == "redis":
+        if redis is None or not os.environ.get("CACHE_REDIS_URL"):
+            logger.warning("CACHE_BACKEND=redis needs CACHE_REDIS_URL and redis; using shared")
+            return shared
+        return RedisStore(os.environ["CACHE_REDIS_URL"], fallback=shared)
+    if backend == "shared":
+        return shared
+    return LocalLRUStore(
+        max_entries=int(os.environ.get("CACHE_LOCAL_MAX_ENTRIES") or 4096), versions=shared
+    )
+
+
+def version_check_seconds() -> float:
+    return float(os.environ.get("CACHE_VERSION_CHECK_MS") or 250) / 1000
+
+
+def cache_metric_lines(store) -> List[str]:
+    entries, size = store.usage()
+    labels = (("store", store.name),)
+    return gauge_lines(
+        "cache_store_entries", "Entries held by the cache store.", [(labels, entries)]
+    ) + gauge_lines(
+        "cache_store_bytes",
+        "Bytes held by the cache store (0 when not tracked).",
+        [(labels, size)],
+    )
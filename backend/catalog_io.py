@@ -0,0 +1,215 @@
+"""Parsing and serialization for bulk catalog import/export.
+
+A catalog file holds one record per line (JSON lines) or per row (CSV),
+each tagged with a ``type`` of ``trail``, ``module`` or ``video``. This
+module only turns raw lines into validated dicts and back; writing them
+to the database is done by the app.
+"""
+
+import codecs
+import csv
+import io
+import json
+import uuid
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+RECORD_TYPES = ("trail", "module", "video")
+
+ENCODING_ERROR = "Linha com codificação inválida (esperado UTF-8)"
+
+CSV_COLUMNS = [
+    "type",
+    "id",
+    "trail_id",
+    "title",
+    "icon",
+    "format",
+    "duration_weeks_min",
+    "duration_weeks_max",
+    "name",
+    "position",
+    "provider",
+    "url",
+    "duration_minutes",
+]
+
+
+# Integer columns are 32-bit on PostgreSQL; larger values would fail the
+# whole chunk in the database instead of one row here.
+INT_MIN, INT_MAX = -(2**31), 2**31 - 1
+
+
+class CatalogRecordError(ValueError):
+    pass
+
+
+def detect_format(requested: Optional[str], content_type: Optional[str]) -> str:
+    requested = (requested or "").strip().lower()
+    if requested in ("csv", "jsonl", "ndjson"):
+        return "csv" if requested == "csv" else "jsonl"
+    if content_type and "csv" in content_type.lower():
+        return "csv"
+    return "jsonl"
+
+
+def _decoded_lines(
+    stream: IO[bytes], bad_lines: List[int]
+) -> Iterator[Tuple[int, str]]:
+    """Yield (line_number, text); undecodable lines go to ``bad_lines``."""
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream)
+    for line_number, raw in enumerate(stream, start=1):
+        if line_number == 1 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        try:
+            yield line_number, raw.decode("utf-8")
+        except UnicodeDecodeError:
+            bad_lines.append(line_number)
+
+
+def iter_raw_records(
+    stream: IO[bytes], fmt: str
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Yield (line_number, record, error) without loading the whole file.
+
+    Lines are decoded one at a time, so invalid UTF-8 rejects only its line.
+    """
+    bad_lines: List[int] = []
+    lines = _decoded_lines(stream, bad_lines)
+    if fmt == "csv":
+        position = {"line": 0}
+
+        def text():
+            for line_number, line in lines:
+                position["line"] = line_number
+                yield line
+
+        reader = csv.DictReader(text())
+        for row in reader:
+            while bad_lines:
+                yield bad_lines.pop(0), None, ENCODING_ERROR
+            record = {k: v for k, v in row.items() if v not in (None, "")}
+            yield position["line"], record, None
+        while bad_lines:
+            yield bad_lines.pop(0), None, ENCODING_ERROR
+        return
+
+    for line_number, line in lines:
+        while bad_lines:
+            yield bad_lines.pop(0), None, ENCODING_ERROR
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f"JSON inválido: {exc.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Cada linha deve ser um objeto JSON"
+            continue
+        yield line_number, record, None
+    while bad_lines:
+        yield bad_lines.pop(0), None, ENCODING_ERROR
+
+
+def _text(record: Dict[str, Any], key: str, required: bool = True) -> str:
+    value = str(record.get(key) or "").strip()
+    if required and not value:
+        raise CatalogRecordError(f"Campo '{key}' é obrigatório")
+    return value
+
+
+def _int(
+    record: Dict[str, Any], key: str, default: Optional[int] = None
+) -> Optional[int]:
+    value = record.get(key)
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise CatalogRecordError(f"Campo '{key}' deve ser um número inteiro")
+    if not INT_MIN <= number <= INT_MAX:
+        raise CatalogRecordError(f"Campo '{key}' está fora do intervalo permitido")
+    return number
+
+
+def normalize_record(record: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Validate a raw record and return (type, column values)."""
+    record_type = str(record.get("type") or "").strip().lower()
+    if record_type not in RECORD_TYPES:
+        raise CatalogRecordError("Campo 'type' deve ser trail, module ou video")
+
+    if record_type == "trail":
+        values = {
+            "id": _text(record, "id"),
+            "title": _text(record, "title"),
+            "icon": _text(record, "icon", required=False) or "📌",
+            "format": _text(record, "format"),
+            "duration_weeks_min": _int(record, "duration_weeks_min", 0),
+            "duration_weeks_max": _int(record, "duration_weeks_max", 0),
+        }
+        if values["duration_weeks_min"] <= 0 or values["duration_weeks_max"] <= 0:
+            raise CatalogRecordError("Durações devem ser maiores que zero")
+        return record_type, values
+
+    if record_type == "module":
+        position = _int(record, "position")
+        if position is None:
+            raise CatalogRecordError("Campo 'position' é obrigatório")
+        return record_type, {
+            "trail_id": _text(record, "trail_id"),
+            "name": _text(record, "name"),
+            "position": position,
+        }
+
+    trail_id = _text(record, "trail_id")
+    url = _text(record, "url")
+    provider = _text(record, "provider", required=False).lower()
+    if not provider:
+        if "youtube.com" in url or "youtu.be" in url:
+            provider = "youtube"
+        else:
+            provider = "external"
+    return record_type, {
+        # Without an explicit id the same (trail, url) pair always maps to the
+        # same lesson, so re-importing a file updates instead of duplicating.
+        "id": _text(record, "id", required=False)
+        or uuid.uuid5(uuid.NAMESPACE_URL, f"{trail_id}|{url}").hex,
+        "trail_id": trail_id,
+        "title": _text(record, "title"),
+        "provider": provider,
+        "url": url,
+        "duration_minutes": _int(record, "duration_minutes", 0),
+        "position": _int(record, "position"),
+    }
+
+
+def serialize_records(records: Iterable[Dict[str, Any]], fmt: str) -> Iterator[bytes]:
+    """Encode typed records as JSON lines or CSV rows, one chunk at a time."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        yield buffer.getvalue().encode("utf-8")
+        for record in records:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow(record)
+            yield buffer.getvalue().encode("utf-8")
+        return
+
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
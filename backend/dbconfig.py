@@ -0,0 +1,182 @@
+"""Environment-driven engine and connection pool settings.
+
+``engine_options(url)`` returns SQLALCHEMY_ENGINE_OPTIONS for the
+configured database, using a production profile per backend that every
+value can override:
+
+PostgreSQL
+    DB_POOL_SIZE (5), DB_MAX_OVERFLOW (10), DB_POOL_TIMEOUT seconds (30),
+    DB_POOL_RECYCLE seconds (1800), DB_POOL_PRE_PING (1) and
+    DB_STATEMENT_TIMEOUT_MS (15000, 0 disables).
+
+SQLite (file databases)
+    DB_BUSY_TIMEOUT_MS (5000), DB_SQLITE_JOURNAL_MODE (WAL),
+    DB_SQLITE_SYNCHRONOUS (NORMAL) and DB_SQLITE_MMAP_BYTES (256 MiB),
+    applied as PRAGMAs on every new connection.
+
+Pools are InstrumentedQueuePool, which records how long each checkout
+waited; see ``pool_metric_lines``.
+"""
+
+import os
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from metrics import Counter, Histogram, gauge_lines
+
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+    POOL_WAIT_BUCKETS,
+)
+pool_checkout_timeouts = Counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT.",
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long callers wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_checkout_timeouts.inc()
+            raise
+        pool_checkout_wait.observe(time.perf_counter() - start)
+        return connection
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    if url.startswith("sqlite"):
+        if _is_memory_sqlite(url):
+            return {}
+        return {
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": _env_int("DB_POOL_SIZE", 5),
+            "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+            "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+            "connect_args": {"timeout": _env_int("DB_BUSY_TIMEOUT_MS", 5000) / 1000},
+        }
+
+    options: Dict[str, Any] = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+    }
+    statement_timeout = _env_int("DB_STATEMENT_TIMEOUT_MS", 15000)
+    if url.startswith("postgresql") and statement_timeout > 0:
+        options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+
+def async_database_url(url: str) -> str:
+    """The async-driver spelling of DATABASE_URL (asyncpg / aiosqlite)."""
+    override = os.environ.get("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("postgresql", "postgresql+psycopg2", "postgresql+psycopg"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+def async_engine_options(url: str) -> Dict[str, Any]:
+    """Same profile as engine_options for create_async_engine."""
+    if url.startswith("sqlite"):
+        if _is_memory_sqlite(url):
+            return {}
+        return {
+            "pool_size": _env_int("DB_POOL_SIZE", 5),
+            "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+            "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+            "connect_args": {"timeout": _env_int("DB_BUSY_TIMEOUT_MS", 5000) / 1000},
+        }
+    options: Dict[str, Any] = {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+    }
+    statement_timeout = _env_int("DB_STATEMENT_TIMEOUT_MS", 15000)
+    if url.startswith("postgresql+asyncpg") and statement_timeout > 0:
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(statement_timeout)}
+        }
+    return options
+
+
+def configure_engine(engine) -> None:
+    """Attach per-connection setup that engine options cannot express."""
+    if engine.dialect.name != "sqlite" or _is_memory_sqlite(str(engine.url)):
+        return
+    pragmas = [
+        f"PRAGMA journal_mode={os.environ.get('DB_SQLITE_JOURNAL_MODE') or 'WAL'}",
+        f"PRAGMA synchronous={os.environ.get('DB_SQLITE_SYNCHRONOUS') or 'NORMAL'}",
+        f"PRAGMA busy_timeout={_env_int('DB_BUSY_TIMEOUT_MS', 5000)}",
+        f"PRAGMA mmap_size={_env_int('DB_SQLITE_MMAP_BYTES', 256 * 1024 * 1024)}",
+    ]
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def pool_metric_lines(engine) -> List[str]:
+    """Scrape-time pool gauges; the wait histogram is in the registry."""
+    pool = engine.pool
+    lines: List[str] = []
+    if not isinstance(pool, QueuePool):
+        return lines
+    in_use = pool.checkedout()
+    capacity = pool.size() + max(0, pool._max_overflow)
+    lines += gauge_lines(
+        "db_pool_connections_in_use", "Connections checked out of the pool.", [((), in_use)]
+    )
+    lines += gauge_lines(
+        "db_pool_connections_idle", "Connections idle in the pool.", [((), pool.checkedin())]
+    )
+    lines += gauge_lines(
+        "db_pool_capacity", "pool_size plus max_overflow.", [((), capacity)]
+    )
+    lines += gauge_lines(
+        "db_pool_saturation",
+        "Checked-out connections as a fraction of capacity.",
+        [((), in_use / capacity if capacity > 0 else 0)],
+    )
+    return lines
@@ -0,0 +1,209 @@
+"""Response encoding: pluggable JSON serializer and gzip/brotli compression.
+
+JSON_ENCODER
+    ``orjson`` (the default when the package is installed) or ``stdlib``.
+    The orjson provider writes compact UTF-8 with sorted keys; dates and
+    other non-native types still go through Flask's ``default`` hook, so
+    values serialize exactly as before.
+
+COMPRESS_RESPONSES (default 1)
+    Compresses buffered JSON, CSV and plain-text responses of at least
+    COMPRESS_MIN_BYTES (default 1024) with brotli when the client accepts
+    it and the ``brotli`` package is installed, otherwise gzip.
+    COMPRESS_GZIP_LEVEL (6) and COMPRESS_BROTLI_QUALITY (5) apply to
+    per-request bodies. Responses marked with ``cache_key`` (the ETags of
+    the shared, anonymous catalog bodies) are compressed once at the
+    highest level and the bytes kept in an LRU of COMPRESS_CACHE_ENTRIES
+    (512) entries. The native routes in asgi.py share the same Compressor.
+"""
+
+import gzip
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+from metrics import Counter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/csv", "text/plain", "text/html")
+
+compressed_bytes = Counter(
+    "http_response_compressed_bytes_total", "Response bytes before and after compression."
+)
+compression_cache_hits = Counter(
+    "http_response_compression_cache_total", "Precompressed catalog body lookups."
+)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider backed by orjson for the common call shapes."""
+
+    _options = 0
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._options = (
+            orjson.OPT_SORT_KEYS
+            | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+
+    def dumps(self, obj, **kwargs):
+        separators = kwargs.pop("separators", None)
+        if kwargs or separators not in (None, (",", ":")):
+            # indent (debug mode) and other json.dumps options.
+            if separators is not None:
+                kwargs["separators"] = separators
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+def json_provider_class(choice=None):
+    choice = (choice or os.environ.get("JSON_ENCODER") or "").strip().lower()
+    if choice == "stdlib" or orjson is None:
+        return DefaultJSONProvider
+    return OrjsonProvider
+
+
+def _accepted_encoding(accept_encodings):
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+class _CompressedCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+def compress(data, encoding, best=False, gzip_level=6, brotli_quality=5):
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else brotli_quality)
+    return gzip.compress(data, compresslevel=9 if best else gzip_level, mtime=0)
+
+
+class Compressor:
+    """The COMPRESS_* settings plus the cache of precompressed catalog bodies.
+
+    Shared by the Flask app and the native routes in asgi.py.
+    """
+
+    def __init__(self, min_bytes=1024, gzip_level=6, brotli_quality=5, cache_entries=512):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._cache = _CompressedCache(cache_entries)
+
+    def choose(self, accept_encodings):
+        """"br", "gzip" or None for a parsed Accept-Encoding header."""
+        return _accepted_encoding(accept_encodings)
+
+    def encode(self, data, encoding, cache_key=None):
+        """``data`` compressed with ``encoding``, or None below ``min_bytes``.
+
+        Bodies with a ``cache_key`` are compressed once at the highest level
+        and then served from the cache.
+        """
+        if len(data) < self.min_bytes:
+            return None
+        body = self._cache.get((cache_key, encoding)) if cache_key else None
+        if cache_key:
+            compression_cache_hits.inc(labels={"result": "hit" if body else "miss"})
+        if body is None:
+            body = compress(
+                data,
+                encoding,
+                best=bool(cache_key),
+                gzip_level=self.gzip_level,
+                brotli_quality=self.brotli_quality,
+            )
+            if cache_key:
+                self._cache.set((cache_key, encoding), body)
+        compressed_bytes.inc(len(data), labels={"stage": "identity"})
+        compressed_bytes.inc(len(body), labels={"stage": encoding})
+        return body
+
+
+def compressor_from_env():
+    """A Compressor configured from the environment, or None if disabled."""
+    if os.environ.get("COMPRESS_RESPONSES", "1") == "0":
+        return None
+    return Compressor(
+        min_bytes=int(os.environ.get("COMPRESS_MIN_BYTES") or 1024),
+        gzip_level=int(os.environ.get("COMPRESS_GZIP_LEVEL") or 6),
+        brotli_quality=int(os.environ.get("COMPRESS_BROTLI_QUALITY") or 5),
+        cache_entries=int(os.environ.get("COMPRESS_CACHE_ENTRIES") or 512),
+    )
+
+
+def init_app(app):
+    compressor = compressor_from_env()
+    app.extensions["compressor"] = compressor
+    if compressor is None:
+        return
+
+    @app.after_request
+    def _compress_response(response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        encoding = compressor.choose(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        body = compressor.encode(
+            response.get_data(), encoding, getattr(response, "cache_key", None)
+        )
+        if body is None:
+            return response
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # A different representation of the same entity.
+            response.set_etag(etag, weak=True)
+        return response
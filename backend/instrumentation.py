@@ -0,0 +1,278 @@
+"""Opt-in per-request instrumentation.
+
+REQUEST_INSTRUMENTATION=1
+    Records wall time, SQL statement count and time, rows fetched from the
+    database (entity and column queries alike) and JSON serialization time
+    for every request. The numbers are returned in a ``Server-Timing``
+    header and aggregated into per-route histograms served by /api/metrics.
+
+PROFILE_SLOW_REQUEST_MS=<ms>
+    Samples the stack of every in-flight request each
+    PROFILE_SAMPLE_INTERVAL_MS (default 5) and, for requests slower than
+    the threshold, writes the samples as collapsed stacks (one
+    ``frame;frame;frame count`` line each, the input format of
+    flamegraph.pl and speedscope) to PROFILE_OUTPUT_DIR (default
+    ``profiles``).
+
+Both are off by default and cost nothing when disabled.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from typing import Dict, Optional
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+from metrics import Counter, Histogram
+
+SQL_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Wall time per request, by route."
+)
+request_sql_duration = Histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQL per request, by route."
+)
+request_sql_statements = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request, by route.",
+    SQL_COUNT_BUCKETS,
+)
+request_json_duration = Histogram(
+    "http_request_json_duration_seconds", "JSON serialization time per request, by route."
+)
+request_rows = Counter(
+    "http_request_db_rows_total", "Rows fetched from the database by requests, by route."
+)
+slow_request_profiles = Counter(
+    "http_slow_request_profiles_total", "Slow requests whose stack samples were written."
+)
+
+
+class RequestStats:
+    __slots__ = ("started", "sql_count", "sql_time", "rows", "json_time", "_sql_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.json_time = 0.0
+        self._sql_started = 0.0
+
+
+def _current_stats() -> Optional[RequestStats]:
+    if not has_app_context():
+        return None
+    return g.get("request_stats")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Background thread sampling the stacks of registered request threads."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._samples: Dict[int, StackCounter] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int) -> None:
+        with self._lock:
+            self._samples[thread_id] = StackCounter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="request-stack-sampler", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id: int) -> StackCounter:
+        with self._lock:
+            return self._samples.pop(thread_id, StackCounter())
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                active = list(self._samples)
+            if not active:
+                self._wake.clear()
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id in active:
+                    frame = frames.get(thread_id)
+                    samples = self._samples.get(thread_id)
+                    if frame is not None and samples is not None:
+                        samples[collapse_stack(frame)] += 1
+            time.sleep(self.interval)
+
+
+def _wrap_json_provider(app) -> None:
+    provider_class = type(app.json)
+
+    class TimedJSONProvider(provider_class):
+        def dumps(self, obj, **kwargs):
+            stats = _current_stats()
+            if stats is None:
+                return super().dumps(obj, **kwargs)
+            start = time.perf_counter()
+            try:
+                return super().dumps(obj, **kwargs)
+            finally:
+                stats.json_time += time.perf_counter() - start
+
+    TimedJSONProvider.__name__ = f"Timed{provider_class.__name__}"
+    app.json = TimedJSONProvider(app)
+
+
+class _RowCountingCursor:
+    """DBAPI cursor proxy that adds every fetched row to the request stats."""
+
+    __slots__ = ("_cursor", "_stats")
+
+    def __init__(self, cursor, stats: RequestStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _attach_sql_listeners(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats()
+        if stats is not None:
+            stats._sql_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats()
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_time += time.perf_counter() - stats._sql_started
+            if context is not None and cursor.description is not None:
+                # The result is built from context.cursor after this hook, so
+                # rows are counted as they are fetched, whatever the query
+                # selects (entities, columns or tuples).
+                context.cursor = _RowCountingCursor(cursor, stats)
+
+
+def _route_label() -> str:
+    rule = request.url_rule
+    return rule.rule if rule is not None else "<unmatched>"
+
+
+def _write_profile(directory: str, route: str, elapsed: float, samples) -> None:
+    os.makedirs(directory, exist_ok=True)
+    slug = route.strip("/").replace("/", "_").replace("<", "").replace(">", "") or "root"
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{int(elapsed * 1000)}ms-{slug}-{os.getpid()}.folded"
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as handle:
+        for stack, count in samples.items():
+            handle.write(f"{stack} {count}\n")
+
+
+def init_app(app, db) -> None:
+    enabled = (os.environ.get("REQUEST_INSTRUMENTATION") or "").strip().lower() in (
+        "1",
+        "true",
+        "yes",
+        "on",
+    )
+    slow_ms = float(os.environ.get("PROFILE_SLOW_REQUEST_MS") or 0)
+    if not enabled and slow_ms <= 0:
+        return
+
+    sampler = None
+    profile_dir = os.environ.get("PROFILE_OUTPUT_DIR") or "profiles"
+    if slow_ms > 0:
+        interval_ms = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS") or 5)
+        sampler = StackSampler(interval_ms / 1000)
+
+    if enabled:
+        _wrap_json_provider(app)
+        with app.app_context():
+            _attach_sql_listeners(db.engine)
+
+    @app.before_request
+    def _start_request_stats():
+        g.request_stats = RequestStats()
+        if sampler is not None:
+            sampler.start(threading.get_ident())
+
+    @app.after_request
+    def _finish_request_stats(response):
+        stats = g.get("request_stats")
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        route = _route_label()
+
+        if sampler is not None:
+            samples = sampler.stop(threading.get_ident())
+            if elapsed * 1000 >= slow_ms and samples:
+                _write_profile(profile_dir, route, elapsed, samples)
+                slow_request_profiles.inc(labels={"route": route})
+
+        if enabled:
+            labels = {"route": route, "method": request.method}
+            request_duration.observe(elapsed, labels)
+            request_sql_duration.observe(stats.sql_time, labels)
+            request_sql_statements.observe(stats.sql_count, labels)
+            request_json_duration.observe(stats.json_time, labels)
+            request_rows.inc(stats.rows, labels)
+            response.headers.add(
+                "Server-Timing",
+                f"app;dur={elapsed * 1000:.2f}, "
+                f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.sql_count} queries", '
+                f'json;dur={stats.json_time * 1000:.2f}, '
+                f'rows;desc="{stats.rows} rows"',
+            )
+        return response
+
+    if sampler is not None:
+
+        @app.teardown_request
+        def _stop_sampling(_exc):
+            # Covers requests that raised before after_request ran.
+            sampler.stop(threading.get_ident())
@@ -0,0 +1,258 @@
+"""Background maintenance jobs: batched, time-boxed and run by one process.
+
+A job is a function taking a JobContext. It walks its rows in keyset
+batches (JobContext.keyset_batches) or calls JobContext.checkpoint after
+each unit of work it commits. Every checkpoint records progress, pauses
+briefly so request traffic can take the locks, and ends the run once it
+exceeds its time budget. Batch sizes shrink or grow so one batch takes
+about ``batch_seconds``, which keeps transactions and their locks short.
+
+Each job has a JSON state file in a shared directory, holding its last run,
+progress and resume cursor. It is flock'd while the job runs, so across all
+workers and CLI invocations a job runs in one process at a time. A run
+stopped by its time budget keeps its cursor and continues on the next tick.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, List, NamedTuple, Optional
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+job_runs = Counter("jobs_runs_total", "Background job runs by job and result.")
+job_rows = Counter("jobs_rows_total", "Rows processed by background jobs.")
+job_batch_duration = Histogram(
+    "jobs_batch_seconds", "Time between two checkpoints of a background job."
+)
+
+
+class Job(NamedTuple):
+    name: str
+    fn: Callable[["JobContext"], None]
+    interval: float
+    description: str = ""
+
+
+class JobSettings(NamedTuple):
+    batch_size: int = 500
+    min_batch_size: int = 10
+    max_batch_size: int = 5000
+    batch_seconds: float = 0.5
+    pause_seconds: float = 0.05
+    max_run_seconds: float = 300
+
+
+def settings_from_env() -> JobSettings:
+    """JOBS_BATCH_SIZE, JOBS_BATCH_SECONDS, JOBS_BATCH_PAUSE_MS, JOBS_MAX_RUN_SECONDS."""
+    defaults = JobSettings()
+    return JobSettings(
+        batch_size=int(os.environ.get("JOBS_BATCH_SIZE") or defaults.batch_size),
+        batch_seconds=float(
+            os.environ.get("JOBS_BATCH_SECONDS") or defaults.batch_seconds
+        ),
+        pause_seconds=float(
+            os.environ.get("JOBS_BATCH_PAUSE_MS") or defaults.pause_seconds * 1000
+        )
+        / 1000,
+        max_run_seconds=float(
+            os.environ.get("JOBS_MAX_RUN_SECONDS") or defaults.max_run_seconds
+        ),
+    )
+
+
+class JobTimeUp(Exception):
+    """Raised at a checkpoint once the run has used its time budget or the
+    scheduler is stopping."""
+
+
+class JobContext:
+    def __init__(
+        self,
+        name: str,
+        state: Dict[str, Any],
+        settings: JobSettings,
+        save_state: Callable[[Dict[str, Any]], None] = lambda state: None,
+        stop: Optional[threading.Event] = None,
+    ):
+        self.name = name
+        self.state = state
+        self.settings = settings
+        self.batch_size = settings.batch_size
+        self.stats: Dict[str, int] = {}
+        self._save_state = save_state
+        self._stop = stop or threading.Event()
+        self._started = time.monotonic()
+        self._last_checkpoint = self._started
+
+    def checkpoint(self, rows: int = 0, **counts: int) -> None:
+        """Record one committed batch; raises JobTimeUp past the time budget."""
+        now = time.monotonic()
+        job_batch_duration.observe(now - self._last_checkpoint, labels={"job": self.name})
+        job_rows.inc(rows, labels={"job": self.name})
+        self.stats["rows"] = self.stats.get("rows", 0) + rows
+        for key, value in counts.items():
+            self.stats[key] = self.stats.get(key, 0) + value
+        self.state["progress"] = dict(self.stats)
+        self._save_state(self.state)
+        logger.info("job %s: %s", self.name, self.stats)
+        if now - self._started >= self.settings.max_run_seconds:
+            raise JobTimeUp(self.name)
+        if self._stop.wait(self.settings.pause_seconds):
+            raise JobTimeUp(self.name)
+        self._last_checkpoint = time.monotonic()
+
+    def keyset_batches(
+        self, fetch_keys: Callable[[Optional[Hashable], int], List[Hashable]]
+    ) -> Iterator[List[Hashable]]:
+        """Yield ascending key batches from ``fetch_keys(after, limit)``.
+
+        Resumes after the cursor of an interrupted run. The caller commits
+        each batch before asking for the next one.
+        """
+        cursor = self.state.get("cursor")
+        while True:
+            keys = fetch_keys(cursor, self.batch_size)
+            if not keys:
+                self.state.pop("cursor", None)
+                return
+            started = time.monotonic()
+            yield keys
+            elapsed = time.monotonic() - started
+            cursor = self.state["cursor"] = keys[-1]
+            if elapsed > self.settings.batch_seconds:
+                self.batch_size = max(self.settings.min_batch_size, self.batch_size // 2)
+            elif elapsed < self.settings.batch_seconds / 4:
+                self.batch_size = min(self.settings.max_batch_size, self.batch_size * 2)
+            self.checkpoint(len(keys))
+
+
+def _read_state(handle) -> Dict[str, Any]:
+    handle.seek(0)
+    try:
+        return json.loads(handle.read() or "{}")
+    except ValueError:
+        return {}
+
+
+def _write_state(handle, state: Dict[str, Any]) -> None:
+    handle.seek(0)
+    handle.truncate()
+    handle.write(json.dumps(state, sort_keys=True, default=str))
+    handle.flush()
+
+
+def run_job(
+    job: Job,
+    directory: str,
+    run_in_context: Callable[[Callable[[], None]], None],
+    settings: JobSettings,
+    force: bool = False,
+    stop: Optional[threading.Event] = None,
+) -> Optional[Dict[str, Any]]:
+    """Run ``job`` if it is due and no other process is running it.
+
+    Returns the job's state after the run, or None if it was skipped.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{job.name}.json"), "a+", encoding="utf-8") as handle:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None
+        state = _read_state(handle)
+        if not force and time.time() - state.get("finished_at", 0) < job.interval:
+            return None
+
+        state.update(running=True, started_at=time.time(), progress={})
+        _write_state(handle, state)
+        context = JobContext(
+            job.name,
+            state,
+            settings,
+            save_state=lambda s: _write_state(handle, s),
+            stop=stop,
+        )
+        try:
+            run_in_context(lambda: job.fn(context))
+            result = "ok"
+        except JobTimeUp:
+            # finished_at stays put, so the next tick resumes from the cursor.
+            result = "incomplete"
+        except Exception as exc:
+            logger.exception("job %s failed", job.name)
+            result = "failed"
+            state["last_error"] = f"{exc.__class__.__name__}: {exc}"
+        if result != "incomplete":
+            state["finished_at"] = time.time()
+            state.pop("cursor", None)
+        if result == "ok":
+            state.pop("last_error", None)
+        state.update(
+            running=False,
+            last_result=result,
+            last_duration_seconds=round(time.time() - state["started_at"], 3),
+            progress=context.stats,
+        )
+        _write_state(handle, state)
+        job_runs.inc(labels={"job": job.name, "result": result})
+        return state
+
+
+def job_status(jobs: List[Job], directory: str) -> Dict[str, Dict[str, Any]]:
+    """Last known state of each job, as written by whichever process ran it."""
+    status = {}
+    for job in jobs:
+        try:
+            with open(os.path.join(directory, f"{job.name}.json"), encoding="utf-8") as handle:
+                status[job.name] = _read_state(handle)
+        except FileNotFoundError:
+            status[job.name] = {}
+        status[job.name]["interval_seconds"] = job.interval
+    return status
+
+
+class Scheduler:
+    """Thread that runs every due job once per tick."""
+
+    def __init__(
+        self,
+        jobs: List[Job],
+        directory: str,
+        run_in_context: Callable[[Callable[[], None]], None],
+        settings: JobSettings,
+        tick: float = 30,
+    ):
+        self.jobs = jobs
+        self.directory = directory
+        self.run_in_context = run_in_context
+        self.settings = settings
+        self.tick = tick
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_pending(self) -> None:
+        for job in self.jobs:
+            if self._stop.is_set():
+                return
+            run_job(job, self.directory, self.run_in_context, self.settings, stop=self._stop)
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(self.tick)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run_forever, name="jobs", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            # Running jobs stop at their next checkpoint.
+            self._thread.join(timeout=self.settings.batch_seconds * 10 + 5)
@@ -0,0 +1,182 @@
+"""In-process XP rankings.
+
+Each worker keeps a sorted index per scope (global and one per trail),
+updated as completions are recorded. The global index is loaded in the
+background at startup and per-trail ones on first use, with at most
+``max_trails`` of them kept. A periodic rebuild folds in writes made by
+other workers.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RankedEntry = Tuple[int, str, int]
+
+
+class RankingIndex:
+    """Members ordered by score (desc) with O(log n) rank lookups.
+
+    Ranks follow competition ranking: members with the same score share a
+    rank, and the next distinct score skips ahead ("1, 2, 2, 4").
+    """
+
+    def __init__(self, scores: Optional[Iterable[Tuple[str, int]]] = None):
+        self._scores: Dict[str, int] = {}
+        self._keys: List[Tuple[int, str]] = []
+        self._lock = threading.RLock()
+        if scores is not None:
+            self._scores = {member: int(score or 0) for member, score in scores}
+            self._keys = sorted(
+                (-score, member) for member, score in self._scores.items()
+            )
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def score(self, member: str) -> Optional[int]:
+        return self._scores.get(member)
+
+    def set(self, member: str, score: int) -> None:
+        with self._lock:
+            previous = self._scores.get(member)
+            if previous is not None:
+                index = bisect.bisect_left(self._keys, (-previous, member))
+                del self._keys[index]
+            self._scores[member] = score
+            bisect.insort(self._keys, (-score, member))
+
+    def add(self, member: str, delta: int) -> int:
+        with self._lock:
+            score = self._scores.get(member, 0) + delta
+            self.set(member, score)
+            return score
+
+    def rank(self, member: str) -> Optional[int]:
+        with self._lock:
+            score = self._scores.get(member)
+            if score is None:
+                return None
+            return bisect.bisect_left(self._keys, (-score, "")) + 1
+
+    def top(self, limit: int) -> List[RankedEntry]:
+        with self._lock:
+            return self._entries(0, limit)
+
+    def around(self, member: str, neighbors: int) -> List[RankedEntry]:
+        with self._lock:
+            score = self._scores.get(member)
+            if score is None:
+                return []
+            index = bisect.bisect_left(self._keys, (-score, member))
+            start = max(0, index - neighbors)
+            return self._entries(start, index + neighbors + 1)
+
+    def _entries(self, start: int, stop: int) -> List[RankedEntry]:
+        entries = []
+        for neg_score, member in self._keys[start:stop]:
+            rank = bisect.bisect_left(self._keys, (neg_score, "")) + 1
+            entries.append((rank, member, -neg_score))
+        return entries
+
+
+class Leaderboard:
+    """Global and per-trail RankingIndexes with loading and refresh.
+
+    ``load_global`` returns (user_id, xp) pairs and ``load_trail`` returns
+    (user_id, trail xp) pairs for one trail; both run inside whatever
+    context ``run_in_context`` provides (an app context for background
+    rebuilds).
+    """
+
+    GLOBAL = "__global__"
+
+    def __init__(
+        self,
+        load_global: Callable[[], Iterable[Tuple[str, int]]],
+        load_trail: Callable[[str], Iterable[Tuple[str, int]]],
+        refresh_seconds: float = 300,
+        run_in_context: Optional[Callable[[Callable[[], None]], None]] = None,
+        max_trails: int = 256,
+    ):
+        self._load_global = load_global
+        self._load_trail = load_trail
+        self._refresh_seconds = refresh_seconds
+        self._run_in_context = run_in_context or (lambda fn: fn())
+        self._max_trails = max_trails
+        # Least recently used first; the global index is never evicted.
+        self._indexes: "OrderedDict[str, RankingIndex]" = OrderedDict()
+        self._built_at: Dict[str, float] = {}
+        self._rebuilding: set = set()
+        self._lock = threading.Lock()
+
+    def index(self, trail_id: Optional[str] = None) -> RankingIndex:
+        """The index of ``trail_id`` (or the global one); callers validate
+        trail ids, since each distinct one loads and keeps an index."""
+        scope = trail_id or self.GLOBAL
+        with self._lock:
+            index = self._indexes.get(scope)
+            built_at = self._built_at.get(scope)
+            if index is not None:
+                self._indexes.move_to_end(scope)
+        if index is None or built_at is None:
+            return self._rebuild(scope)
+        if time.monotonic() - built_at > self._refresh_seconds:
+            self._rebuild_in_background(scope)
+        return index
+
+    def warm(self) -> None:
+        """Load the global index in the background."""
+        self._rebuild_in_background(self.GLOBAL)
+
+    def record(self, user_id: str, trail_id: str, xp: int) -> None:
+        """Apply an XP award to the indexes that are already loaded."""
+        with self._lock:
+            indexes = [self._indexes.get(scope) for scope in (self.GLOBAL, trail_id)]
+        for index in indexes:
+            if index is not None:
+                index.add(user_id, xp)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self._built_at.clear()
+
+    def _rebuild(self, scope: str) -> RankingIndex:
+        if scope == self.GLOBAL:
+            index = RankingIndex(self._load_global())
+        else:
+            index = RankingIndex(self._load_trail(scope))
+        with self._lock:
+            self._indexes[scope] = index
+            self._indexes.move_to_end(scope)
+            self._built_at[scope] = time.monotonic()
+            trails = [s for s in self._indexes if s != self.GLOBAL]
+            for stale in trails[: max(0, len(trails) - self._max_trails)]:
+                del self._indexes[stale]
+                self._built_at.pop(stale, None)
+        return index
+
+    def _rebuild_in_background(self, scope: str) -> None:
+        with self._lock:
+            if scope in self._rebuilding:
+                return
+            self._rebuilding.add(scope)
+
+        def run():
+            try:
+                self._run_in_context(lambda: self._rebuild(scope))
+            except Exception as exc:
+                # Before the first migration, for instance; the next read
+                # loads the index itself.
+                logger.warning("leaderboard rebuild of %s failed: %s", scope, exc)
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(scope)
+
+        threading.Thread(target=run, name=f"leaderboard-{scope}", daemon=True).start()
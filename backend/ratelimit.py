@@ -0,0 +1,204 @@
+"""Token-bucket rate limiting for the authentication endpoints.
+
+Buckets are identified by (rule, key), e.g. ("login_ip", "203.0.113.7").
+Each rule is written ``CAPACITY/SECONDS``: a burst of CAPACITY requests,
+refilled at CAPACITY per SECONDS.
+
+By default buckets live in a lock-striped in-process store, so each worker
+enforces its own share of the limit and no request pays a network round
+trip. Setting RATE_LIMIT_REDIS_URL (and installing the ``redis`` package)
+switches to a shared store that all workers consult; if it becomes
+unreachable, the in-process store takes over until it recovers.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from metrics import Counter
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+rate_limit_decisions = Counter(
+    "rate_limit_decisions_total", "Rate limiter decisions per rule and result."
+)
+
+
+class Rule(NamedTuple):
+    name: str
+    capacity: float
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_rule(name: str, spec: str) -> Optional[Rule]:
+    """``"20/60"`` -> Rule(name, 20, 60); ``"0"`` or ``"off"`` disables the rule."""
+    spec = (spec or "").strip().lower()
+    if spec in ("", "0", "off"):
+        return None
+    capacity, _, period = spec.partition("/")
+    return Rule(name, float(capacity), float(period or 1))
+
+
+class RateLimited(Exception):
+    def __init__(self, rule: str, retry_after: float):
+        super().__init__(rule)
+        self.rule = rule
+        self.retry_after = retry_after
+
+
+class LocalBucketStore:
+    """In-process buckets split across independently locked stripes.
+
+    Each stripe is an LRU capped at ``max_keys / stripes`` entries; evicting
+    a bucket only forgets how much of its burst has been used.
+    """
+
+    def __init__(self, stripes: int = 64, max_keys: int = 100_000):
+        self._stripes: List[Tuple[threading.Lock, "OrderedDict[str, List[float]]"]] = [
+            (threading.Lock(), OrderedDict()) for _ in range(stripes)
+        ]
+        self._stripe_max = max(1, max_keys // stripes)
+
+    def take(self, key: str, rule: Rule, cost: float = 1) -> float:
+        """Consume ``cost`` tokens; returns 0 if allowed, else seconds to wait."""
+        lock, buckets = self._stripes[zlib.crc32(key.encode("utf-8")) % len(self._stripes)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [rule.capacity, now]
+                if len(buckets) > self._stripe_max:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            return (cost - bucket[0]) / rule.rate
+
+
+# Same algorithm as LocalBucketStore.take, atomic on the server and keyed
+# on the server clock so workers with skewed clocks agree.
+_REDIS_TAKE = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    """Buckets shared by every worker, with a local store as stand-in."""
+
+    def __init__(
+        self, url: str, fallback: LocalBucketStore, prefix: str = "ratelimit:"
+    ):
+        self._client = redis.Redis.from_url(url, socket_timeout=0.25)
+        self._script = self._client.register_script(_REDIS_TAKE)
+        self._fallback = fallback
+        self._prefix = prefix
+        self._retry_at = 0.0
+
+    def take(self, key: str, rule: Rule, cost: float = 1) -> float:
+        if time.monotonic() >= self._retry_at:
+            try:
+                return float(
+                    self._script(
+                        keys=[self._prefix + key], args=[rule.capacity, rule.rate, cost]
+                    )
+                )
+            except redis.RedisError:
+                logger.warning("rate limit store unavailable; using local buckets")
+                self._retry_at = time.monotonic() + 5
+        return self._fallback.take(key, rule, cost)
+
+
+class RateLimiter:
+    def __init__(self, store, rules: Dict[str, Optional[Rule]]):
+        self.store = store
+        self.rules = {name: rule for name, rule in rules.items() if rule is not None}
+
+    def hit(self, rule_name: str, key: str) -> None:
+        """Consume one token from (rule, key) or raise RateLimited."""
+        rule = self.rules.get(rule_name)
+        if rule is None or not key:
+            return
+        wait = self.store.take(f"{rule_name}:{key}", rule)
+        if wait > 0:
+            rate_limit_decisions.inc(labels={"rule": rule_name, "result": "rejected"})
+            raise RateLimited(rule_name, wait)
+        rate_limit_decisions.inc(labels={"rule": rule_name, "result": "allowed"})
+
+
+def limiter_from_env() -> Optional[RateLimiter]:
+    """RATE_LIMIT_ENABLED=0 turns limiting off; rules default to:
+
+    RATE_LIMIT_LOGIN_PER_IP     30/60    login attempts per client address
+    RATE_LIMIT_LOGIN_PER_EMAIL  10/600   login attempts per account email
+    RATE_LIMIT_SIGNUP_PER_IP    10/3600  signups per client address
+
+    Behind a reverse proxy, set RATE_LIMIT_TRUSTED_PROXIES to the number of
+    proxy hops so the client address is taken from X-Forwarded-For.
+    """
+    if os.environ.get("RATE_LIMIT_ENABLED", "1") == "0":
+        return None
+    store = LocalBucketStore(
+        stripes=int(os.environ.get("RATE_LIMIT_STRIPES") or 64),
+        max_keys=int(os.environ.get("RATE_LIMIT_MAX_KEYS") or 100_000),
+    )
+    redis_url = os.environ.get("RATE_LIMIT_REDIS_URL")
+    if redis_url:
+        if redis is None:
+            logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed")
+        else:
+            store = RedisBucketStore(redis_url, fallback=store)
+    rules = {
+        "login_ip": os.environ.get("RATE_LIMIT_LOGIN_PER_IP") or "30/60",
+        "login_email": os.environ.get("RATE_LIMIT_LOGIN_PER_EMAIL") or "10/600",
+        "signup_ip": os.environ.get("RATE_LIMIT_SIGNUP_PER_IP") or "10/3600",
+    }
+    return RateLimiter(store, {name: parse_rule(name, spec) for name, spec in rules.items()})
+
+
+def client_address(request, trusted_proxies: int = 0) -> str:
+    """The caller's address, skipping ``trusted_proxies`` X-Forwarded-For hops."""
+    if trusted_proxies > 0:
+        # Each trusted proxy appends the address it received from.
+        route = request.access_route
+        if len(route) >= trusted_proxies:
+            return route[-trusted_proxies]
+    return request.remote_addr or ""
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
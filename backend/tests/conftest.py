@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# app.py builds its app at import time from the environment.
+_tmp = tempfile.mkdtemp(prefix="jornada-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp, "test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret-" + "x" * 32)
+os.environ["AUTH_MODE"] = "stateless"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    import app as app_module
+
+    with app_module.app.app_context():
+        app_module.migrate_schema()
+        app_module.seed_catalog()
+    return app_module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def signup(client):
+    def _signup(email, password="segredo123"):
+        response = client.post("/api/auth/signup", json={"email": email, "password": password})
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()["token"]
+
+    return _signup
@@ -0,0 +1,57 @@
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_logout_all_rejects_old_tokens_immediately(client, signup):
+    token = signup("revoke@example.com")
+    other_device = client.post(
+        "/api/auth/login", json={"email": "revoke@example.com", "password": "segredo123"}
+    ).get_json()["token"]
+    # Warm the cached auth state so revocation has to invalidate it.
+    assert client.get("/api/bootstrap", headers=_auth(other_device)).status_code == 200
+
+    assert client.post("/api/auth/logout-all", headers=_auth(token)).status_code == 200
+
+    assert client.get("/api/bootstrap", headers=_auth(other_device)).status_code == 401
+    assert client.get("/api/bootstrap", headers=_auth(token)).status_code == 401
+    fresh = client.post(
+        "/api/auth/login", json={"email": "revoke@example.com", "password": "segredo123"}
+    ).get_json()["token"]
+    assert client.get("/api/bootstrap", headers=_auth(fresh)).status_code == 200
+
+
+def test_revoke_tokens_command(app_module, client, signup):
+    token = signup("cli@example.com")
+    assert client.get("/api/bootstrap", headers=_auth(token)).status_code == 200
+
+    result = app_module.app.test_cli_runner().invoke(args=["revoke-tokens", "cli@example.com"])
+    assert result.exit_code == 0, result.output
+
+    assert client.get("/api/bootstrap", headers=_auth(token)).status_code == 401
+
+
+def test_admin_flag_comes_from_the_user_row(app_module, client, signup):
+    signup("first-admin@example.com")
+    token = signup("demoted@example.com")
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(email="demoted@example.com").one()
+        user.is_admin = True
+        app_module.db.session.commit()
+    # Signed while not an admin: the claim says adm=False, the row says True.
+    headers = _auth(token)
+    assert client.get("/api/admin/catalog/export", headers=headers).status_code == 200
+
+
+def test_bootstrap_for_a_deleted_user_is_a_json_401(app_module, client, signup):
+    token = signup("deleted@example.com")
+    # Caches the auth state, so the request gets past require_auth.
+    assert client.get("/api/bootstrap", headers=_auth(token)).status_code == 200
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(email="deleted@example.com").one()
+        app_module.UserSnapshot.query.filter_by(user_id=user.id).delete()
+        app_module.db.session.delete(user)
+        app_module.db.session.commit()
+
+    response = client.get("/api/bootstrap", headers=_auth(token))
+    assert response.status_code == 401
+    assert response.get_json() == {"error": "Não autorizado"}
@@ -0,0 +1,96 @@
+"""Query-count regression test for the catalog endpoints.
+
+Counts the SQL statements issued by GET /api/trails and
+GET /api/trails/<id>/videos (anonymous and authenticated) with a small
+and a large catalog, and fails if the count grows with the number of
+trails, modules or videos, i.e. if a per-row lazy load creeps back in.
+"""
+
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries(engine):
+    counter = {"count": 0}
+
+    def _before_cursor_execute(*_args, **_kwargs):
+        counter["count"] += 1
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+def _add_trails(app_module, start, count, modules=4, videos=5):
+    db = app_module.db
+    for index in range(start, start + count):
+        trail_id = f"qc-trail-{index}"
+        db.session.add(
+            app_module.Trail(
+                id=trail_id,
+                icon="📌",
+                title=f"Trail {index}",
+                format="qc",
+                duration_weeks_min=1,
+                duration_weeks_max=1,
+            )
+        )
+        for position in range(modules):
+            db.session.add(
+                app_module.TrailModule(
+                    trail_id=trail_id, name=f"Module {position}", position=position
+                )
+            )
+        for position in range(videos):
+            db.session.add(
+                app_module.VideoLesson(
+                    id=uuid.uuid4().hex,
+                    trail_id=trail_id,
+                    title=f"Video {position}",
+                    url="https://example.com",
+                    position=position,
+                )
+            )
+    db.session.commit()
+
+
+def _measure(client, engine, headers):
+    counts = {}
+    for label, request_headers in (("anonymous", None), ("authenticated", headers)):
+        with count_queries(engine) as queries:
+            assert client.get("/api/trails", headers=request_headers).status_code == 200
+        counts[f"list_trails:{label}"] = queries["count"]
+        with count_queries(engine) as queries:
+            response = client.get("/api/trails/qc-trail-0/videos", headers=request_headers)
+            assert response.status_code == 200
+        counts[f"list_trail_videos:{label}"] = queries["count"]
+    return counts
+
+
+@pytest.fixture
+def uncached_catalog(app_module, monkeypatch):
+    # Every request has to reach the database for its queries to count.
+    catalog_cache = app_module.app.extensions["catalog_cache"]
+    monkeypatch.setattr(catalog_cache, "ttl", 0)
+    catalog_cache.invalidate()
+
+
+def test_catalog_query_count_does_not_grow_with_the_catalog(
+    app_module, client, signup, uncached_catalog
+):
+    headers = {"Authorization": f"Bearer {signup('queries@example.com')}"}
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+        _add_trails(app_module, 0, 2)
+        small = _measure(client, engine, headers)
+        _add_trails(app_module, 2, 50, modules=8, videos=40)
+        large = _measure(client, engine, headers)
+
+    grown = {key: (small[key], large[key]) for key in small if large[key] > small[key]}
+    assert not grown, f"query count grows with catalog size: {grown}"
@@ -0,0 +1,31 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+
+def test_compaction_keeps_dashboard_for_users_without_latest_checkin(
+    app_module, client, signup
+):
+    token = signup("old-checkin@example.com")
+    old = datetime.utcnow() - timedelta(days=90)
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(email="old-checkin@example.com").one()
+        # Written before LatestCheckIn existed: raw rows only.
+        for days, name in ((0, "older"), (1, "newest")):
+            app_module.db.session.add(
+                app_module.DailyCheckIn(
+                    id=uuid.uuid4().hex,
+                    user_id=user.id,
+                    created_at=old + timedelta(days=days),
+                    data_json=json.dumps({"hero_name": name}),
+                    rolled_up=True,
+                )
+            )
+        app_module.db.session.commit()
+
+        stats = app_module.compact_checkins()
+        assert stats["latest_backfilled"] >= 1
+        assert stats["raw_deleted"] >= 2
+
+    response = client.get("/api/dashboard", headers={"Authorization": f"Bearer {token}"})
+    assert response.get_json()["hero_name"] == "newest"
@@ -0,0 +1,52 @@
+import threading
+import uuid
+
+
+def test_concurrent_completions_award_xp_once(app_module, client, signup):
+    token = signup("double-tap@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    video_id = uuid.uuid4().hex
+    with app_module.app.app_context():
+        app_module.db.session.add(
+            app_module.Trail(
+                id="double-tap",
+                icon="📌",
+                title="Double tap",
+                format="test",
+                duration_weeks_min=1,
+                duration_weeks_max=1,
+            )
+        )
+        app_module.db.session.add(
+            app_module.VideoLesson(
+                id=video_id,
+                trail_id="double-tap",
+                title="Video",
+                url="https://example.com",
+                position=0,
+            )
+        )
+        app_module.db.session.commit()
+
+    threads = 8
+    barrier = threading.Barrier(threads)
+    statuses = []
+
+    def complete():
+        thread_client = app_module.app.test_client()
+        barrier.wait()
+        response = thread_client.post(f"/api/videos/{video_id}/complete", headers=headers)
+        statuses.append(response.status_code)
+
+    workers = [threading.Thread(target=complete) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert statuses == [200] * threads
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(email="double-tap@example.com").one()
+        rows = app_module.VideoProgress.query.filter_by(user_id=user.id, video_id=video_id)
+        assert rows.count() == 1
+        assert user.xp == app_module.XP_PER_VIDEO
@@ -0,0 +1,18 @@
+import metrics
+
+
+def test_large_counter_values_render_exactly():
+    counter = metrics.Counter("test_large_total", "A counter past a million.")
+    try:
+        counter.inc(1234567)
+        counter.inc(0.5, labels={"kind": "fraction"})
+        lines = counter.render()
+    finally:
+        metrics.registry.remove(counter)
+    assert lines[2].endswith(" 1234567")
+    assert lines[3].endswith(" 0.5")
+
+
+def test_large_gauge_values_render_exactly():
+    lines = metrics.gauge_lines("test_bytes", "Bytes.", [((), 64 * 1024 * 1024 + 1)])
+    assert lines[-1].endswith(" 67108865")
@@ -0,0 +1,61 @@
+import json
+import os
+
+from writebehind import AppendLog, WriteBehind
+
+
+def _write_behind(directory, apply_batch, **kwargs):
+    return WriteBehind(
+        AppendLog(directory, fsync=False),
+        apply_batch,
+        run_in_context=lambda fn: fn(),
+        interval=3600,
+        **kwargs,
+    )
+
+
+def test_only_the_failing_record_is_quarantined(tmp_path):
+    applied = []
+
+    def apply_batch(records):
+        if any(r["id"] == "poison" for r in records):
+            raise RuntimeError("constraint violation")
+        wb.commit_applied(records, lambda: applied.extend(r["id"] for r in records))
+
+    wb = _write_behind(str(tmp_path), apply_batch, max_attempts=2)
+    wb.submit({"id": "ok-1", "user_id": "alice"}, key=("checkin",))
+    wb.submit({"id": "poison", "user_id": "bob"}, key=("checkin",))
+    wb.submit({"id": "ok-2", "user_id": "carol"}, key=("checkin",))
+
+    assert wb.flush() == 0
+    assert wb.flush() == 0
+    assert wb.pending_for("alice")
+    # Out of batch attempts: applied one record at a time.
+    assert wb.flush() == 2
+
+    assert applied == ["ok-1", "ok-2"]
+    assert not wb.pending_for("alice") and not wb.pending_for("carol")
+    quarantine = tmp_path / "quarantine"
+    (name,) = os.listdir(quarantine)
+    lines = (quarantine / name).read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["poison"]
+    assert name not in os.listdir(tmp_path)
+    wb.close()
+
+
+def test_records_leave_the_index_as_they_are_committed(tmp_path):
+    seen_during_commit = []
+
+    def apply_batch(records):
+        def commit():
+            # A reader can only look at the index before or after this.
+            seen_during_commit.append(wb._lock.locked())
+
+        wb.commit_applied(records, commit)
+        assert not wb.pending_for("alice")
+
+    wb = _write_behind(str(tmp_path), apply_batch)
+    wb.submit({"id": "c1", "user_id": "alice"}, key=("checkin",))
+    assert wb.flush() == 1
+    assert seen_during_commit == [True]
+    wb.close()
@@ -0,0 +1,337 @@
+"""Write-behind buffering: durable local append log plus batched flushing.
+
+Accepted writes are appended to a segment file in a local directory and
+fsync'd (concurrent appends share one fsync) before the request is
+acknowledged. A background thread rotates the segment every interval and
+applies its records to the database in one transaction, then deletes the
+segment. Segments left behind by a crashed or stopped process are picked
+up by whichever process locks them first, so records are applied at least
+once; the apply callback must be idempotent.
+
+Each process also keeps an in-memory index of its not-yet-flushed records
+per user, so handlers can merge them into reads. The apply callback
+commits through commit_applied(), which drops the records from the index
+in the same critical section, so a reader that reads the database before
+the index never counts a record twice.
+
+A segment whose apply keeps failing (``max_attempts`` tries in a row) is
+then applied one record at a time. Only the records that still fail are
+written to a file of the same name in the ``quarantine`` subdirectory and
+leave the index; moving that file back into the log directory retries
+them.
+"""
+
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+records_appended = Counter(
+    "write_behind_records_total", "Records accepted into the write-behind log."
+)
+flush_duration = Histogram(
+    "write_behind_flush_seconds", "Time to apply one write-behind segment."
+)
+flush_failures = Counter(
+    "write_behind_flush_failures_total", "Segments whose apply raised; retried later."
+)
+records_quarantined = Counter(
+    "write_behind_records_quarantined_total",
+    "Records set aside after failing on their own once their segment failed "
+    "max_attempts times in a row.",
+)
+
+
+class AppendLog:
+    """Segmented JSON-lines log owned by one process."""
+
+    def __init__(self, directory: str, fsync: bool = True):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self._prefix = f"{os.getpid()}-{int(time.time() * 1000)}"
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._segment = 0
+        self._written = 0
+        self._synced = 0
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self._segment += 1
+        self._path = os.path.join(self.directory, f"{self._prefix}-{self._segment:08d}.log")
+        self._file = open(self._path, "a+b")
+        # Held until the segment is applied, so no other live process
+        # replays it; the kernel drops it if this process dies.
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._dirty = False
+
+    def append(self, record: Dict[str, Any]) -> None:
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            self._file.write(line)
+            self._dirty = True
+            self._written += 1
+            seq = self._written
+        if self.fsync:
+            self._sync(seq)
+        records_appended.inc()
+
+    def _sync(self, seq: int) -> None:
+        # Group commit: whoever holds the sync lock flushes everything
+        # written so far; callers queued behind it usually find their
+        # record already synced.
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            with self._lock:
+                self._file.flush()
+                target = self._written
+            os.fsync(self._file.fileno())
+            self._synced = target
+
+    def rotate(self) -> Optional[Tuple[str, Any]]:
+        """Seal the active segment and start a new one.
+
+        Returns (path, locked file) for the sealed segment, or None if it
+        was empty.
+        """
+        with self._sync_lock, self._lock:
+            if not self._dirty:
+                return None
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._synced = self._written
+            sealed = (self._path, self._file)
+            self._open_segment()
+            return sealed
+
+    def close(self) -> None:
+        with self._sync_lock, self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            if not self._dirty:
+                os.remove(self._path)
+
+    def claimable_segments(self) -> Iterator[Tuple[str, Any]]:
+        """Yield (path, locked file) for segments no live process holds."""
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.log"))):
+            if path == self._path:
+                continue
+            try:
+                handle = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            if os.fstat(handle.fileno()).st_nlink == 0:
+                # Applied and deleted by another process after we opened it.
+                handle.close()
+                continue
+            yield path, handle
+
+
+def read_records(handle) -> List[Dict[str, Any]]:
+    records = []
+    handle.seek(0)
+    for line in handle:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # A torn final line from a crash mid-append was never acknowledged.
+            continue
+    return records
+
+
+class WriteBehind:
+    """Append log plus a flusher thread and a per-user pending index."""
+
+    def __init__(
+        self,
+        log: AppendLog,
+        apply_batch: Callable[[List[Dict[str, Any]]], None],
+        run_in_context: Callable[[Callable[[], None]], None],
+        interval: float = 0.2,
+        max_pending: int = 1000,
+        max_attempts: int = 5,
+    ):
+        self.log = log
+        self.apply_batch = apply_batch
+        self.run_in_context = run_in_context
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._attempts: Dict[str, int] = {}
+        self._pending: Dict[str, Dict[Hashable, Dict[str, Any]]] = {}
+        self._pending_count = 0
+        # Sealed segments this process still holds, including failed ones.
+        self._owned: List[Tuple[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, record: Dict[str, Any], key: Hashable) -> None:
+        """Durably log ``record`` and index it under (record user_id, key)."""
+        # Indexed before the append so a flush that applies the record can
+        # never run before it is indexed (and leave it pending forever).
+        with self._lock:
+            entries = self._pending.setdefault(record["user_id"], {})
+            previous = entries.get(key)
+            entries[key] = record
+            if previous is None:
+                self._pending_count += 1
+            if self._pending_count >= self.max_pending:
+                self._wake.set()
+        try:
+            self.log.append(record)
+        except Exception:
+            self._forget([record])
+            with self._lock:
+                if previous is not None:
+                    self._pending.setdefault(record["user_id"], {})[key] = previous
+                    self._pending_count += 1
+            raise
+
+    def pending_for(self, user_id: str) -> Dict[Hashable, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._pending.get(user_id) or {})
+
+    def commit_applied(
+        self, records: List[Dict[str, Any]], commit: Callable[[], None]
+    ) -> None:
+        """Run ``commit`` (which makes ``records`` visible in the database)
+        and drop them from the index while holding the index lock."""
+        with self._lock:
+            commit()
+            self._forget_locked(records)
+
+    def _forget(self, records: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._forget_locked(records)
+
+    def _forget_locked(self, records: List[Dict[str, Any]]) -> None:
+        for record in records:
+            entries = self._pending.get(record.get("user_id"))
+            if not entries:
+                continue
+            for key, pending in list(entries.items()):
+                if pending.get("id") == record.get("id"):
+                    del entries[key]
+                    self._pending_count -= 1
+            if not entries:
+                del self._pending[record["user_id"]]
+
+    def flush(self) -> int:
+        """Apply every closed segment; returns the number of records applied."""
+        with self._flush_lock:
+            sealed = self.log.rotate()
+            if sealed is not None:
+                self._owned.append(sealed)
+            segments = self._owned + list(self.log.claimable_segments())
+            self._owned = []
+            applied = 0
+            for path, handle in segments:
+                start = time.perf_counter()
+                if self._attempts.get(path, 0) >= self.max_attempts:
+                    applied += self._apply_each(path, handle)
+                    continue
+                try:
+                    records = read_records(handle)
+                    if records:
+                        self.run_in_context(lambda: self.apply_batch(records))
+                    os.remove(path)
+                except Exception:
+                    flush_failures.inc()
+                    logger.exception("write-behind flush of %s failed", path)
+                    self._attempts[path] = self._attempts.get(path, 0) + 1
+                    self._owned.append((path, handle))
+                    continue
+                self._attempts.pop(path, None)
+                handle.close()
+                flush_duration.observe(time.perf_counter() - start)
+                self._forget(records)
+                applied += len(records)
+            return applied
+
+    def _apply_each(self, path: str, handle) -> int:
+        """Apply a segment that keeps failing one record at a time.
+
+        Records that fail on their own are quarantined; the others, which
+        may belong to other users and were already acknowledged, are
+        applied. Returns the number of records applied.
+        """
+        failed = []
+        records = read_records(handle)
+        for record in records:
+            try:
+                self.run_in_context(lambda: self.apply_batch([record]))
+            except Exception:
+                logger.exception("write-behind record %s failed", record.get("id"))
+                failed.append(record)
+        try:
+            if failed:
+                self._quarantine(path, failed)
+            os.remove(path)
+        except OSError:
+            logger.exception("could not set aside write-behind segment %s", path)
+            self._owned.append((path, handle))
+            return len(records) - len(failed)
+        handle.close()
+        self._attempts.pop(path, None)
+        self._forget(records)
+        return len(records) - len(failed)
+
+    def _quarantine(self, path: str, records: List[Dict[str, Any]]) -> None:
+        """Durably write ``records`` to the quarantine file for ``path``."""
+        directory = os.path.join(self.log.directory, "quarantine")
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, os.path.basename(path))
+        with open(target + ".tmp", "wb") as out:
+            for record in records:
+                out.write((json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(target + ".tmp", target)
+        records_quarantined.inc(len(records))
+        logger.error(
+            "write-behind segment %s: %d record(s) failed %d times; moved to %s",
+            path,
+            len(records),
+            self.max_attempts,
+            target,
+        )
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=self.interval * 10 + 5)
+        self.flush()
+        self.log.close()
+        for _path, handle in self._owned:
+            # Unlocking leaves them to the next process that starts.
+            handle.close()
+        self._owned = []
@@ -1,9 +1,29 @@
-const CACHE_NAME = "jornada-heroi-cache-v1";
+const CACHE_VERSION = "v2";
+const SHELL_CACHE = `jornada-heroi-shell-${CACHE_VERSION}`;
+const ASSET_CACHE = `jornada-heroi-assets-${CACHE_VERSION}`;
+const CATALOG_CACHE = `jornada-heroi-catalog-${CACHE_VERSION}`;
+const USER_CACHE = `jornada-heroi-user-${CACHE_VERSION}`;
+const CACHES = [SHELL_CACHE, ASSET_CACHE, CATALOG_CACHE, USER_CACHE];
+
 const OFFLINE_URLS = ["/", "/index.html"];
 
+// Vite emits content-hashed files under /assets/, so they never change.
+const ASSET_MAX_ENTRIES = 120;
+const CATALOG_MAX_ENTRIES = 100;
+const USER_MAX_ENTRIES = 50;
+const USER_MAX_AGE_MS = 24 * 60 * 60 * 1000;
+const CACHED_AT_HEADER = "x-sw-cached-at";
+const SCOPE_PARAM = "__sw_scope";
+
+// Trail list and trail video lists; the backend answers them with ETags.
+const CATALOG_PATH = /^\/api\/trails(\/[^/]+\/videos)?$/;
+const UNCACHED_PATH = /^\/api\/(health|metrics|admin\/)/;
+// Writes after which every user's catalog copy may be out of date.
+const CATALOG_WRITE_PATH = /^\/api\/(admin\/|trails\/[^/]+\/videos$)/;
+
 self.addEventListener("install", (event) => {
   event.waitUntil(
-    caches.open(CACHE_NAME).then((cache) => {
+    caches.open(SHELL_CACHE).then((cache) => {
       return cache.addAll(OFFLINE_URLS);
     })
   );
@@ -14,33 +34,222 @@ self.addEventListener("activate", (event) => {
     caches.keys().then((keys) =>
       Promise.all(
         keys
-          .filter((key) => key !== CACHE_NAME)
+          .filter((key) => !CACHES.includes(key))
           .map((key) => caches.delete(key))
       )
     )
   );
 });
 
+self.addEventListener("message", (event) => {
+  if (event.data && event.data.type === "clear-user-cache") {
+    event.waitUntil(
+      Promise.all([caches.delete(USER_CACHE), caches.delete(CATALOG_CACHE)])
+    );
+  }
+});
+
 self.addEventListener("fetch", (event) => {
   const request = event.request;
+  const url = new URL(request.url);
+  const isApi = url.pathname.startsWith("/api/");
+
   if (request.method !== "GET") {
+    if (isApi) {
+      event.respondWith(forwardWrite(event, request, url));
+    }
     return;
   }
-  event.respondWith(
-    caches.match(request).then((cached) => {
-      if (cached) {
-        return cached;
-      }
-      return fetch(request)
-        .then((response) => {
-          const clone = response.clone();
-          caches.open(CACHE_NAME).then((cache) => {
-            cache.put(request, clone);
-          });
-          return response;
-        })
-        .catch(() => caches.match("/index.html"));
-    })
-  );
+  if (isApi) {
+    if (UNCACHED_PATH.test(url.pathname)) {
+      return;
+    }
+    if (CATALOG_PATH.test(url.pathname)) {
+      event.respondWith(staleWhileRevalidate(event, request));
+    } else {
+      event.respondWith(networkFirst(event, request));
+    }
+    return;
+  }
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+  if (request.mode === "navigate") {
+    event.respondWith(navigation(event, request));
+  } else if (url.pathname.startsWith("/assets/")) {
+    event.respondWith(cacheFirst(event, request));
+  } else {
+    event.respondWith(shellStaleWhileRevalidate(event, request));
+  }
 });
 
+async function userScope(request) {
+  const authorization = request.headers.get("authorization");
+  if (!authorization) {
+    return "anon";
+  }
+  const digest = await crypto.subtle.digest(
+    "SHA-256",
+    new TextEncoder().encode(authorization)
+  );
+  return Array.from(new Uint8Array(digest).slice(0, 12), (byte) =>
+    byte.toString(16).padStart(2, "0")
+  ).join("");
+}
+
+// Responses for different tokens must never be served to each other, so
+// API entries are stored under the URL plus a digest of the token.
+function scopedKey(request, scope) {
+  const url = new URL(request.url);
+  url.searchParams.set(SCOPE_PARAM, scope);
+  return url.toString();
+}
+
+async function putBounded(cache, key, response, maxEntries) {
+  // Delete first so the entry moves to the end of the insertion order,
+  // which is what trimming treats as most recently used.
+  await cache.delete(key);
+  await cache.put(key, response);
+  const keys = await cache.keys();
+  const excess = keys.length - maxEntries;
+  if (excess > 0) {
+    await Promise.all(keys.slice(0, excess).map((key) => cache.delete(key)));
+  }
+}
+
+async function withCachedAt(response) {
+  const headers = new Headers(response.headers);
+  headers.set(CACHED_AT_HEADER, String(Date.now()));
+  return new Response(await response.blob(), {
+    status: response.status,
+    statusText: response.statusText,
+    headers
+  });
+}
+
+async function purgeScope(scope, everyCatalogEntry) {
+  const catalog = await caches.open(CATALOG_CACHE);
+  const user = await caches.open(USER_CACHE);
+  for (const cache of [catalog, user]) {
+    const keys = await cache.keys();
+    await Promise.all(
+      keys
+        .filter(
+          (key) =>
+            (everyCatalogEntry && cache === catalog) ||
+            new URL(key.url).searchParams.get(SCOPE_PARAM) === scope
+        )
+        .map((key) => cache.delete(key))
+    );
+  }
+}
+
+async function forwardWrite(event, request, url) {
+  const scope = await userScope(request);
+  const response = await fetch(request);
+  if (response.ok) {
+    // Completions, enrollments and check-ins change XP and per-user flags.
+    event.waitUntil(purgeScope(scope, CATALOG_WRITE_PATH.test(url.pathname)));
+  }
+  return response;
+}
+
+async function staleWhileRevalidate(event, request) {
+  const cache = await caches.open(CATALOG_CACHE);
+  const key = scopedKey(request, await userScope(request));
+  const cached = await cache.match(key);
+  const revalidated = revalidate(cache, key, request, cached);
+  if (cached) {
+    event.waitUntil(revalidated.catch(() => undefined));
+    return cached;
+  }
+  return revalidated;
+}
+
+async function revalidate(cache, key, request, cached) {
+  const headers = new Headers(request.headers);
+  const etag = cached && cached.headers.get("etag");
+  if (etag) {
+    headers.set("if-none-match", etag);
+  }
+  const response = await fetch(new Request(request, { headers }));
+  if (response.status === 304 && cached) {
+    return cached;
+  }
+  if (response.ok) {
+    await putBounded(cache, key, response.clone(), CATALOG_MAX_ENTRIES);
+  }
+  return response;
+}
+
+async function networkFirst(event, request) {
+  const cache = await caches.open(USER_CACHE);
+  const key = scopedKey(request, await userScope(request));
+  let response;
+  try {
+    response = await fetch(request);
+  } catch (error) {
+    // Offline: fall back to the last copy, but never an old one.
+    const cached = await cache.match(key);
+    const cachedAt = cached ? Number(cached.headers.get(CACHED_AT_HEADER) || 0) : 0;
+    if (cached && Date.now() - cachedAt < USER_MAX_AGE_MS) {
+      return cached;
+    }
+    throw error;
+  }
+  if (response.ok) {
+    const copy = response.clone();
+    event.waitUntil(
+      withCachedAt(copy).then((stamped) =>
+        putBounded(cache, key, stamped, USER_MAX_ENTRIES)
+      )
+    );
+  }
+  return response;
+}
+
+async function cacheFirst(event, request) {
+  const cache = await caches.open(ASSET_CACHE);
+  const cached = await cache.match(request);
+  if (cached) {
+    return cached;
+  }
+  const response = await fetch(request);
+  if (response.ok) {
+    event.waitUntil(putBounded(cache, request, response.clone(), ASSET_MAX_ENTRIES));
+  }
+  return response;
+}
+
+async function navigation(event, request) {
+  const cache = await caches.open(SHELL_CACHE);
+  try {
+    const response = await fetch(request);
+    if (response.ok) {
+      event.waitUntil(cache.put("/index.html", response.clone()));
+    }
+    return response;
+  } catch (error) {
+    const cached = await cache.match("/index.html");
+    if (cached) {
+      return cached;
+    }
+    throw error;
+  }
+}
+
+async function shellStaleWhileRevalidate(event, request) {
+  const cache = await caches.open(SHELL_CACHE);
+  const cached = await cache.match(request);
+  const fetched = fetch(request).then((response) => {
+    if (response.ok) {
+      event.waitUntil(cache.put(request, response.clone()));
+    }
+    return response;
+  });
+  if (cached) {
+    event.waitUntil(fetched.catch(() => undefined));
+    return cached;
+  }
+  return fetched;
+}
@@ -29,6 +29,7 @@ export type Trail = {
   duration_weeks_min: number;
   duration_weeks_max: number;
   format: string;
+  video_count?: number;
   enrolled?: boolean;
 };
 
@@ -42,6 +43,7 @@ export type VideoLesson = {
   provider: string;
   url: string;
   duration_minutes: number;
+  position?: number;
   completed?: boolean;
 };
 
@@ -50,6 +52,12 @@ export type TrailVideosResponse = {
   videos: VideoLesson[];
 };
 
+export type TrailVideosPageResponse = TrailVideosResponse & {
+  next_cursor: string | null;
+};
+
+export const VIDEO_PAGE_SIZE = 50;
+
 const API_BASE_URL =
   import.meta.env.VITE_API_BASE_URL ?? "http://localhost:8000";
 
@@ -80,6 +88,20 @@ export type ProgressResponse = {
   per_trail: Record<string, { total_videos: number; completed_videos: number }>;
 };
 
+export type BootstrapTrailStats = {
+  total_videos: number;
+  completed_videos: number;
+  completed_bitmap: string;
+};
+
+export type BootstrapResponse = {
+  user: User;
+  enrolled_trails: string[];
+  completed_videos: number;
+  per_trail: Record<string, BootstrapTrailStats>;
+  trails: Trail[];
+};
+
 export function getAuthToken() {
   return localStorage.getItem(AUTH_TOKEN_STORAGE_KEY) ?? "";
 }
@@ -90,29 +112,25 @@ export function setAuthToken(token: string) {
 
 export function clearAuthToken() {
   localStorage.removeItem(AUTH_TOKEN_STORAGE_KEY);
+  navigator.serviceWorker?.controller?.postMessage({ type: "clear-user-cache" });
 }
 
-function cacheKey(path: string) {
-  const token = getAuthToken();
-  const scope = token ? "auth" : "anon";
-  return `api-cache:${scope}:${path}`;
-}
+const LEGACY_CACHE_PREFIX = "api-cache:";
 
-function readCache<T>(path: string): T | null {
+// Responses used to be mirrored into localStorage; the service worker
+// (public/sw.js) is now the only client-side cache.
+export function dropLegacyApiCache() {
   try {
-    const raw = localStorage.getItem(cacheKey(path));
-    if (!raw) {
-      return null;
+    for (let index = localStorage.length - 1; index >= 0; index -= 1) {
+      const key = localStorage.key(index);
+      // The old unscoped completion queue cannot be attributed to a user.
+      if (
+        key?.startsWith(LEGACY_CACHE_PREFIX) ||
+        key === LEGACY_PENDING_COMPLETIONS_STORAGE_KEY
+      ) {
+        localStorage.removeItem(key);
+      }
     }
-    return JSON.parse(raw) as T;
-  } catch {
-    return null;
-  }
-}
-
-function writeCache<T>(path: string, data: T) {
-  try {
-    localStorage.setItem(cacheKey(path), JSON.stringify(data));
   } catch {
     return;
   }
@@ -121,23 +139,13 @@ function writeCache<T>(path: string, data: T) {
 async function fetchJson<T>(path: string): Promise<T> {
   const url = `${API_BASE_URL}${path}`;
   const token = getAuthToken();
-  try {
-    const response = await fetch(url, {
-      headers: token ? { authorization: `Bearer ${token}` } : undefined
-    });
-    if (!response.ok) {
-      throw new Error(`Erro ao carregar ${path}`);
-    }
-    const data = (await response.json()) as T;
-    writeCache(path, data);
-    return data;
-  } catch (error) {
-    const cached = readCache<T>(path);
-    if (cached) {
-      return cached;
-    }
-    throw error;
+  const response = await fetch(url, {
+    headers: token ? { authorization: `Bearer ${token}` } : undefined
+  });
+  if (!response.ok) {
+    throw new Error(`Erro ao carregar ${path}`);
   }
+  return (await response.json()) as T;
 }
 
 async function postJson<TResponse>(
@@ -176,6 +184,16 @@ export function getTrailVideos(trailId: string) {
   return fetchJson<TrailVideosResponse>(`/api/trails/${trailId}/videos`);
 }
 
+export function getTrailVideosPage(trailId: string, cursor?: string | null) {
+  const params = new URLSearchParams({ limit: String(VIDEO_PAGE_SIZE) });
+  if (cursor) {
+    params.set("cursor", cursor);
+  }
+  return fetchJson<TrailVideosPageResponse>(
+    `/api/trails/${trailId}/videos?${params.toString()}`
+  );
+}
+
 export async function signup(payload: { email: string; password: string; name?: string }) {
   return postJson<AuthResponse>("/api/auth/signup", payload);
 }
@@ -210,14 +228,120 @@ export async function addTrailVideo(
   return data.video;
 }
 
+// Queued per user (the token's subject) so completions made offline by one
+// account are never sent with another account's token.
+const PENDING_COMPLETIONS_STORAGE_PREFIX = "pending-completions:";
+const LEGACY_PENDING_COMPLETIONS_STORAGE_KEY = "pending-completions";
+
+function tokenSubject(token: string) {
+  try {
+    const payload = token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/");
+    return String(JSON.parse(atob(payload)).sub ?? "");
+  } catch {
+    return "";
+  }
+}
+
+function pendingCompletionsKey() {
+  const subject = tokenSubject(getAuthToken());
+  return subject ? `${PENDING_COMPLETIONS_STORAGE_PREFIX}${subject}` : null;
+}
+
+export type PendingCompletion = {
+  video_id: string;
+  completed_at: string;
+};
+
+export type BatchCompletionResponse = {
+  status: string;
+  recorded: string[];
+  already_completed: string[];
+  unknown: string[];
+  user: User;
+};
+
+function readPendingCompletions(key: string): PendingCompletion[] {
+  try {
+    const raw = localStorage.getItem(key);
+    return raw ? (JSON.parse(raw) as PendingCompletion[]) : [];
+  } catch {
+    return [];
+  }
+}
+
+function writePendingCompletions(key: string, pending: PendingCompletion[]) {
+  try {
+    if (pending.length === 0) {
+      localStorage.removeItem(key);
+    } else {
+      localStorage.setItem(key, JSON.stringify(pending));
+    }
+  } catch {
+    return;
+  }
+}
+
+function queueCompletion(key: string, videoId: string) {
+  const pending = readPendingCompletions(key).filter((item) => item.video_id !== videoId);
+  pending.push({ video_id: videoId, completed_at: new Date().toISOString() });
+  writePendingCompletions(key, pending);
+}
+
+export function clearPendingCompletions() {
+  const key = pendingCompletionsKey();
+  try {
+    if (key) {
+      localStorage.removeItem(key);
+    }
+  } catch {
+    return;
+  }
+}
+
 export async function completeVideo(videoId: string) {
-  return postJson<{ status: string; user: User }>(
-    `/api/videos/${videoId}/complete`,
-    {},
+  try {
+    return await postJson<{ status: string; user?: User }>(
+      `/api/videos/${videoId}/complete`,
+      {},
+      { auth: true }
+    );
+  } catch (error) {
+    const key = pendingCompletionsKey();
+    if (navigator.onLine || !key) {
+      throw error;
+    }
+    queueCompletion(key, videoId);
+    return { status: "queued" };
+  }
+}
+
+export async function completeVideos(completions: PendingCompletion[]) {
+  return postJson<BatchCompletionResponse>(
+    "/api/videos/completions",
+    { completions },
     { auth: true }
   );
 }
 
+export async function flushPendingCompletions() {
+  const key = pendingCompletionsKey();
+  const pending = key ? readPendingCompletions(key) : [];
+  if (!key || pending.length === 0) {
+    return null;
+  }
+  const response = await completeVideos(pending);
+  const sent = new Set(pending.map((item) => item.video_id));
+  writePendingCompletions(
+    key,
+    readPendingCompletions(key).filter((item) => !sent.has(item.video_id))
+  );
+  return response;
+}
+
+export async function getBootstrap() {
+  return fetchJson<BootstrapResponse>("/api/bootstrap");
+}
+
 export async function getProgress() {
   return fetchJson<ProgressResponse>("/api/progress");
 }
@@ -1,11 +1,20 @@
-import React, { createContext, useContext, useEffect, useMemo, useState } from "react";
+import React, {
+  createContext,
+  useContext,
+  useEffect,
+  useMemo,
+  useRef,
+  useState
+} from "react";
 import {
   AuthResponse,
-  MeResponse,
+  BootstrapResponse,
   User,
   clearAuthToken,
+  clearPendingCompletions,
+  flushPendingCompletions,
   getAuthToken,
-  getMe,
+  getBootstrap,
   login as apiLogin,
   setAuthToken,
   signup as apiSignup
@@ -13,10 +22,13 @@ import {
 
 type AuthContextValue = {
   user: User | null;
+  // User, progress and trails from /api/bootstrap, loaded at launch.
+  bootstrap: BootstrapResponse | null;
   loading: boolean;
   login: (email: string, password: string) => Promise<void>;
   signup: (email: string, password: string, name?: string) => Promise<void>;
-  refresh: () => Promise<void>;
+  // Reloads the bootstrap unless it is younger than maxAgeMs.
+  refresh: (maxAgeMs?: number) => Promise<void>;
   logout: () => void;
 };
 
@@ -24,7 +36,15 @@ const AuthContext = createContext<AuthContextValue | null>(null);
 
 export function AuthProvider({ children }: { children: React.ReactNode }) {
   const [user, setUser] = useState<User | null>(null);
+  const [bootstrap, setBootstrap] = useState<BootstrapResponse | null>(null);
   const [loading, setLoading] = useState(true);
+  const loadedAt = useRef(0);
+
+  function applyBootstrap(response: BootstrapResponse) {
+    loadedAt.current = Date.now();
+    setBootstrap(response);
+    setUser(response.user);
+  }
 
   useEffect(() => {
     const token = getAuthToken();
@@ -32,10 +52,8 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
       setLoading(false);
       return;
     }
-    getMe()
-      .then((response: MeResponse) => {
-        setUser(response.user);
-      })
+    getBootstrap()
+      .then(applyBootstrap)
       .catch(() => {
         clearAuthToken();
         setUser(null);
@@ -43,43 +61,54 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
       .finally(() => setLoading(false));
   }, []);
 
-  async function refresh() {
+  async function refresh(maxAgeMs = 0) {
     const token = getAuthToken();
     if (!token) {
       setUser(null);
+      setBootstrap(null);
       return;
     }
-    const response: MeResponse = await getMe();
-    setUser(response.user);
+    if (maxAgeMs > 0 && Date.now() - loadedAt.current < maxAgeMs) {
+      return;
+    }
+    applyBootstrap(await getBootstrap());
   }
 
   async function login(email: string, password: string) {
     const response: AuthResponse = await apiLogin({ email, password });
     setAuthToken(response.token);
+    // Completions this account queued offline in an earlier session.
+    flushPendingCompletions().catch(() => undefined);
     setUser(response.user);
+    setBootstrap(null);
   }
 
   async function signup(email: string, password: string, name?: string) {
     const response: AuthResponse = await apiSignup({ email, password, name });
     setAuthToken(response.token);
     setUser(response.user);
+    setBootstrap(null);
   }
 
   function logout() {
+    // Before the token goes: the queue is looked up by its subject.
+    clearPendingCompletions();
     clearAuthToken();
     setUser(null);
+    setBootstrap(null);
   }
 
   const value = useMemo<AuthContextValue>(
     () => ({
       user,
+      bootstrap,
       loading,
       login,
       signup,
       refresh,
       logout
     }),
-    [user, loading]
+    [user, bootstrap, loading]
   );
 
   return <AuthContext.Provider value={value}>{children}</AuthContext.Provider>;
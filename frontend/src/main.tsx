@@ -2,6 +2,7 @@ import React from "react";
 import ReactDOM from "react-dom/client";
 import { BrowserRouter } from "react-router-dom";
 import App from "./App";
+import { dropLegacyApiCache, flushPendingCompletions } from "./api";
 import { AuthProvider } from "./auth";
 import "./styles.css";
 
@@ -25,3 +26,11 @@ if ("serviceWorker" in navigator) {
     navigator.serviceWorker.register("/sw.js").catch(() => undefined);
   });
 }
+
+function syncPendingCompletions() {
+  flushPendingCompletions().catch(() => undefined);
+}
+
+window.addEventListener("online", syncPendingCompletions);
+syncPendingCompletions();
+dropLegacyApiCache();
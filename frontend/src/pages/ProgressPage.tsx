@@ -1,10 +1,11 @@
 import { useEffect, useState } from "react";
-import { ProgressResponse, getProgress } from "../api";
 import { useAuth } from "../auth";
 
+// A bootstrap loaded this recently (e.g. at launch) is shown as is.
+const BOOTSTRAP_MAX_AGE_MS = 5000;
+
 function ProgressPage() {
-  const { user, loading: authLoading } = useAuth();
-  const [data, setData] = useState<ProgressResponse | null>(null);
+  const { user, bootstrap: data, loading: authLoading, refresh } = useAuth();
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -17,12 +18,7 @@ function ProgressPage() {
       return;
     }
     let active = true;
-    getProgress()
-      .then((response) => {
-        if (active) {
-          setData(response);
-        }
-      })
+    refresh(BOOTSTRAP_MAX_AGE_MS)
       .catch(() => {
         if (active) {
           setError("Não foi possível carregar seu progresso.");
@@ -36,9 +32,9 @@ function ProgressPage() {
     return () => {
       active = false;
     };
-  }, [user, authLoading]);
+  }, [user?.id, authLoading]);
 
-  if (authLoading || loading) {
+  if (authLoading || (loading && !data)) {
     return (
       <section className="page center">
         <div className="spinner" />
@@ -54,7 +50,7 @@ function ProgressPage() {
     );
   }
 
-  if (error || !data) {
+  if (!data) {
     return (
       <section className="page center">
         <p>{error ?? "Erro inesperado."}</p>
@@ -92,7 +88,9 @@ function ProgressPage() {
               : 0;
           return (
             <div key={trailId} className="progress-row">
-              <div className="progress-row-title">{trailId}</div>
+              <div className="progress-row-title">
+                {data.trails.find((trail) => trail.id === trailId)?.title ?? trailId}
+              </div>
               <div className="progress-row-bar">
                 <div className="progress-row-fill" style={{ width: `${pct}%` }} />
               </div>
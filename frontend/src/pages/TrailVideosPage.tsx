@@ -6,7 +6,7 @@ import {
   addTrailVideo,
   completeVideo,
   getTrails,
-  getTrailVideos
+  getTrailVideosPage
 } from "../api";
 import { useAuth } from "../auth";
 
@@ -37,13 +37,15 @@ function TrailVideosPage() {
   const [saving, setSaving] = useState(false);
   const [saveError, setSaveError] = useState<string | null>(null);
   const [completing, setCompleting] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (!trailId) {
       return;
     }
     let active = true;
-    Promise.all([getTrails(), getTrailVideos(trailId)])
+    Promise.all([getTrails(), getTrailVideosPage(trailId)])
       .then(([trailsResponse, videosResponse]) => {
         if (!active) {
           return;
@@ -53,6 +55,7 @@ function TrailVideosPage() {
           setTrail(foundTrail);
         }
         setVideos(videosResponse.videos);
+        setNextCursor(videosResponse.next_cursor);
         if (videosResponse.videos.length > 0) {
           setSelectedVideo(videosResponse.videos[0]);
         }
@@ -97,6 +100,25 @@ function TrailVideosPage() {
     }
   }
 
+  async function handleLoadMore() {
+    if (!trailId || !nextCursor) {
+      return;
+    }
+    setLoadingMore(true);
+    try {
+      const page = await getTrailVideosPage(trailId, nextCursor);
+      setVideos((current) => {
+        const known = new Set(current.map((v) => v.id));
+        return [...current, ...page.videos.filter((v) => !known.has(v.id))];
+      });
+      setNextCursor(page.next_cursor);
+    } catch {
+      setError("Não foi possível carregar mais aulas.");
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   async function handleCompleteSelected() {
     if (!selectedVideo) {
       return;
@@ -261,6 +283,16 @@ function TrailVideosPage() {
               </li>
             ))}
           </ul>
+          {nextCursor && (
+            <button
+              type="button"
+              className="btn btn-small"
+              disabled={loadingMore}
+              onClick={handleLoadMore}
+            >
+              {loadingMore ? "Carregando..." : "Carregar mais aulas"}
+            </button>
+          )}
         </aside>
       </div>
     </section>